@@ -3,6 +3,7 @@ Django settings for agentx project.
 """
 
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from datetime import timedelta
 import os
 
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'investments',
 ]
@@ -66,13 +68,60 @@ TEMPLATES = [
 WSGI_APPLICATION = 'agentx.wsgi.application'
 
 # Database
+# Profil SQLite appliqué à chaque nouvelle connexion : cache de 64 Mo et lecture par mmap.
+SQLITE_PRAGMAS = [
+    'PRAGMA cache_size=-65536',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+]
+# Production (SQLITE_WAL=1) : WAL pour que les lectures ne bloquent pas l'écrivain
+# (et inversement), synchronous=NORMAL (sûr en WAL). Le mode WAL est enregistré
+# dans le fichier de la base : il n'est pas activé par défaut pour ne pas
+# convertir la base de développement à la première commande manage.py.
+SQLITE_WAL_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+]
+if os.environ.get('SQLITE_WAL') == '1':
+    SQLITE_PRAGMAS = SQLITE_WAL_PRAGMAS + SQLITE_PRAGMAS
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Connexions persistantes, vérifiées avant réutilisation
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            # Attente maximale (secondes) du verrou d'écriture avant "database is locked"
+            'timeout': 20,
+            # Les transactions prennent le verrou d'écriture dès BEGIN : pas d'échec
+            # immédiat lors du passage lecture -> écriture. Corollaire : les blocs
+            # atomic() doivent rester courts (aucun appel RPC à l'intérieur).
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Réplique en lecture seule, activée par DATABASE_REPLICA_NAME. En local, deux
+# fichiers suffisent : DATABASE_REPLICA_NAME=db-replica.sqlite3, puis
+# `python manage.py sync_replica` pour copier la base principale.
+if os.environ.get('DATABASE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / os.environ['DATABASE_REPLICA_NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASE = 'replica'
+else:
+    REPLICA_DATABASE = None
+
+DATABASE_ROUTERS = ['investments.routers.PrimaryReplicaRouter']
+
+# Durée (secondes) pendant laquelle un utilisateur lit sur la base principale après une écriture
+REPLICA_STICKY_SECONDS = 10
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -114,7 +163,7 @@ AUTHENTICATION_BACKENDS = [
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'investments.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -127,7 +176,7 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=90),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    'UPDATE_LAST_LOGIN': False,  # Pas d'écriture en base à chaque connexion
     'AUTH_HEADER_TYPES': ('Bearer',),
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
@@ -135,10 +184,66 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Cache partagé par tous les processus (workers web, index_deposits,
+# process_withdrawals, accrue_earnings) : les invalidations et l'épinglage
+# sur la base principale doivent être vus partout. Un cache en mémoire locale
+# (LocMemCache) ne convient qu'à un processus unique.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / '.django_cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Durée de vie (secondes) des réponses mises en cache par utilisateur
+USER_CACHE_TIMEOUT = 300
+
+# Durée de vie (secondes) des utilisateurs en cache pour l'authentification JWT
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# Intervalle (secondes) de rechargement du filtre des jetons révoqués
+TOKEN_REVOCATION_REFRESH_INTERVAL = 30
+
+# Durée de conservation (secondes) des réponses associées à un Idempotency-Key
+IDEMPOTENCY_KEY_TTL = 24 * 3600
+# Au-delà (secondes), une requête restée « en cours » est considérée abandonnée
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# Simulation de liquidité (commande liquidity_report, dont la vue d'administration affiche le dernier rapport)
+LIQUIDITY_HORIZONS = [30, 90, 365]  # Jours
+LIQUIDITY_SCENARIOS = 500
+LIQUIDITY_DAILY_WITHDRAWAL_RATE = 0.02  # Probabilité quotidienne médiane de premier retrait
+
+# Lignes lues (et envoyées) par bloc lors des exports en flux de l'historique
+EXPORT_CHUNK_SIZE = 2000
+
+# Durée de vie (secondes) du catalogue des plans en cache dans chaque processus
+PLAN_CATALOG_TTL = 300
+
 # Blockchain Configuration
 INFURA_URL = 'https://mainnet.infura.io/v3/c9d83afa1a98474d9859c4495f1f46ea'
 CHAIN_ID = 1  # 1 pour Mainnet
 USDT_CONTRACT_ADDRESS = '0xdAC17F958D2ee523a2206206994597C13D831ec7'
 COMPANY_WALLET_ADDRESS = 'YOUR_COMPANY_WALLET_ADDRESS'
 COMPANY_WALLET_PRIVATE_KEY = 'YOUR_COMPANY_WALLET_PRIVATE_KEY'
+COMPANY_USDT_ADDRESS = COMPANY_WALLET_ADDRESS  # Adresse de réception des dépôts déclarés
+# SECURITY WARNING: la phrase mnémonique de développement est publique (Hardhat/anvil),
+# les fonds envoyés aux adresses qui en dérivent sont à la portée de tous.
+# Elle n'est acceptée qu'en DEBUG.
+HD_WALLET_MNEMONIC = os.environ.get('HD_WALLET_MNEMONIC')
+if not HD_WALLET_MNEMONIC:
+    if not DEBUG:
+        raise ImproperlyConfigured('La variable d\'environnement HD_WALLET_MNEMONIC doit être définie')
+    HD_WALLET_MNEMONIC = 'test test test test test test test test test test test junk'
+DEPOSIT_ADDRESS_POOL_SIZE = 1000  # Adresses libres à maintenir dans le pool
 USDT_ABI_PATH = os.path.join(BASE_DIR, 'investments', 'contracts', 'usdt_abi.json')
+BLOCKCHAIN_HTTP_POOL_SIZE = 20  # Connexions keep-alive maximum vers le noeud RPC
+BLOCKCHAIN_HTTP_TIMEOUT = 30  # Secondes
+BLOCKCHAIN_RPC_BATCH_SIZE = 200  # Appels par requête JSON-RPC groupée
+WITHDRAWAL_STUCK_TIMEOUT = 300  # Secondes sans être miné avant de re-signer un retrait avec un gas plus élevé
+WITHDRAWAL_GAS_BUMP_PERCENT = 15  # Hausse minimale du prix du gas d'un remplacement (10 % exigés par les noeuds)
+DEPOSIT_CONFIRMATIONS = 12  # Blocs de confirmation avant de créditer un dépôt indexé
+DEPOSIT_INDEXER_BATCH_BLOCKS = 2000  # Blocs par requête eth_getLogs
+VERIFICATION_CACHE_SIZE = 10000  # Vérifications de transactions conservées en mémoire
+VERIFICATION_CACHE_TTL = 3600  # Secondes
@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import InvestmentPlan, Investment, USDTWallet, USDTTransaction
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
+from .models import (
+    InvestmentPlan, Investment, USDTWallet, USDTTransaction, ReferralCommission, DepositAddress, LiquiditySnapshot
+)
+from .exports import export_response, EXPORT_FIELDS
 
 # Register your models here.
 
@@ -30,10 +36,37 @@ class InvestmentAdmin(admin.ModelAdmin):
     list_filter = ['status', 'currency', 'plan']
     search_fields = ['user__username', 'plan__name']
     raw_id_fields = ['user', 'plan']
+    change_list_template = 'admin/investments/investment/change_list.html'
+
+    def get_urls(self):
+        return [
+            path(
+                'liquidity/',
+                self.admin_site.admin_view(self.liquidity_view),
+                name='investments_investment_liquidity'
+            ),
+        ] + super().get_urls()
+
+    def liquidity_view(self, request):
+        """
+        Dernier rapport de liquidité enregistré par la commande liquidity_report :
+        la simulation et la lecture du solde on-chain sont trop lentes pour une requête
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        snapshot = LiquiditySnapshot.objects.order_by('-created_at').first()
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Liquidité',
+            'snapshot': snapshot,
+            'report': snapshot.report if snapshot else None,
+        }
+        return TemplateResponse(request, 'admin/investments/investment/liquidity.html', context)
 
 @admin.register(USDTWallet)
 class USDTWalletAdmin(admin.ModelAdmin):
-    list_display = ['user', 'address', 'balance', 'created_at']
+    list_display = ['user', 'address', 'derivation_index', 'balance', 'created_at']
     search_fields = ['user__username', 'address']
     raw_id_fields = ['user']
 
@@ -49,3 +82,25 @@ class USDTTransactionAdmin(admin.ModelAdmin):
     list_filter = ['transaction_type', 'status']
     search_fields = ['wallet__user__username', 'tx_hash']
     raw_id_fields = ['wallet']
+    actions = ['export_csv', 'export_ndjson']
+
+    export_fields = {'user_email': 'wallet__user__email', **EXPORT_FIELDS}
+
+    @admin.action(description='Exporter en CSV')
+    def export_csv(self, request, queryset):
+        return export_response(queryset, 'csv', self.export_fields)
+
+    @admin.action(description='Exporter en NDJSON')
+    def export_ndjson(self, request, queryset):
+        return export_response(queryset, 'ndjson', self.export_fields)
+
+@admin.register(ReferralCommission)
+class ReferralCommissionAdmin(admin.ModelAdmin):
+    list_display = ['referrer', 'referee', 'amount', 'created_at']
+    search_fields = ['referrer__user__email', 'referee__user__email']
+    raw_id_fields = ['referrer', 'referee', 'deposit', 'bonus_transaction']
+
+@admin.register(DepositAddress)
+class DepositAddressAdmin(admin.ModelAdmin):
+    list_display = ['index', 'address', 'claimed_at', 'created_at']
+    search_fields = ['address']
@@ -0,0 +1,202 @@
+"""
+Versions asynchrones des actions qui attendent le réseau : déclaration de
+dépôt, vérification du solde et demande de retrait.
+
+Servies sous ASGI, elles libèrent la boucle d'événements pendant les appels
+RPC : un seul processus garde des centaines de vérifications en vol. L'ORM
+asynchrone sert aux lectures simples ; les blocs transactionnels courts
+(crédit, réservation d'un retrait) passent par ``sync_to_async``, Django ne
+gérant pas les transactions en mode asynchrone. Sous WSGI, ces vues restent
+fonctionnelles mais sont exécutées une à une par requête.
+"""
+import json
+from decimal import Decimal
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, permissions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from . import idempotency
+from .authentication import CachedJWTAuthentication
+from .blockchain import get_async_blockchain_client
+from .deposits import credit_deposits
+from .ledger import ledger_balance
+from .models import USDTWallet
+from .routers import start_replica_reads, end_replica_reads
+from .serializers import USDTTransactionSerializer, WithdrawSerializer
+from .verification import averify_transaction
+from .withdrawals import reserve_withdrawal, WithdrawalRejected
+
+authentication = CachedJWTAuthentication()
+
+
+def _json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status_code,
+        content_type='application/json'
+    )
+
+
+def async_api_view(methods):
+    """
+    Équivalent minimal de ``@api_view`` pour une vue coroutine : méthodes
+    autorisées, authentification JWT, corps JSON dans ``request.data``,
+    lectures sur la réplique et en-tête Idempotency-Key pour les écritures.
+    """
+    def decorator(view_func):
+        @csrf_exempt
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return _json_response(
+                    {'detail': f'Méthode "{request.method}" non autorisée.'},
+                    status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+
+            try:
+                auth = await sync_to_async(authentication.authenticate)(request)
+            except exceptions.APIException as e:
+                return _json_response({'detail': e.detail}, e.status_code)
+            if auth is None:
+                return _json_response(
+                    {'detail': "Informations d'authentification non fournies."},
+                    status.HTTP_401_UNAUTHORIZED
+                )
+            request.user, request.auth = auth
+
+            try:
+                request.data = json.loads(request.body or b'{}')
+            except ValueError:
+                request.data = None
+            if not isinstance(request.data, dict):
+                return _json_response({'error': 'Corps JSON invalide'}, status.HTTP_400_BAD_REQUEST)
+
+            record = None
+            if request.method not in permissions.SAFE_METHODS:
+                record, response = await sync_to_async(idempotency.begin)(request)
+                if isinstance(response, Response):
+                    return _json_response(response.data, response.status_code)
+                if response is not None:
+                    return response
+
+            token = start_replica_reads(request)
+            try:
+                response = await view_func(request, *args, **kwargs)
+            except Exception:
+                end_replica_reads(request, HttpResponse(status=500), token)
+                if record is not None:
+                    await sync_to_async(idempotency.release)(record)
+                raise
+
+            end_replica_reads(request, response, token)
+            if record is not None:
+                await sync_to_async(idempotency.finish)(record, response.status_code, response.content)
+            return response
+
+        return wrapper
+    return decorator
+
+
+def _credit_deposit(wallet, amount, tx_hash):
+    usdt_transaction, = credit_deposits([(wallet, amount, tx_hash)])
+    return USDTTransactionSerializer(usdt_transaction).data
+
+
+@async_api_view(['POST'])
+async def deposit(request):
+    """
+    Déclarer un dépôt USDT (voir USDTTransactionViewSet.deposit)
+    """
+    wallet = await USDTWallet.objects.filter(user=request.user).afirst()
+    if wallet is None:
+        return _json_response({'error': 'Portefeuille USDT introuvable'}, status.HTTP_404_NOT_FOUND)
+
+    tx_hash = str(request.data.get('tx_hash') or '').strip().lower()
+    if not tx_hash:
+        return _json_response({'error': 'Transaction hash is required'}, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # Vérifier la transaction sur la blockchain sans bloquer de thread
+        tx_info = await averify_transaction(
+            get_async_blockchain_client(),
+            tx_hash,
+            settings.COMPANY_USDT_ADDRESS
+        )
+
+        if not tx_info['valid']:
+            return _json_response({'error': tx_info['error']}, status.HTTP_400_BAD_REQUEST)
+
+        # Vérifier que la transaction est destinée à notre adresse
+        if tx_info['to_address'].lower() != settings.COMPANY_USDT_ADDRESS.lower():
+            return _json_response({'error': 'Invalid destination address'}, status.HTTP_400_BAD_REQUEST)
+
+        amount = Decimal(str(tx_info['amount']))
+
+        try:
+            data = await sync_to_async(_credit_deposit)(wallet, amount, tx_hash)
+        except IntegrityError:
+            return _json_response(
+                {'error': 'Cette transaction a déjà été enregistrée'},
+                status.HTTP_400_BAD_REQUEST
+            )
+
+        return _json_response(data)
+
+    except Exception as e:
+        return _json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+
+@async_api_view(['GET'])
+async def check_balance(request):
+    """
+    Comparer le solde on-chain du portefeuille à son solde local
+    """
+    wallet = await USDTWallet.objects.filter(user=request.user).annotate(
+        ledger_balance=ledger_balance()
+    ).afirst()
+    if wallet is None:
+        return _json_response({'error': 'Portefeuille USDT introuvable'}, status.HTTP_404_NOT_FOUND)
+
+    try:
+        blockchain_balance = await get_async_blockchain_client().get_usdt_balance(wallet.address)
+    except Exception as e:
+        return _json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+    return _json_response({
+        'blockchain_balance': str(blockchain_balance),
+        'local_balance': str(wallet.balance)
+    })
+
+
+@async_api_view(['POST'])
+async def withdraw(request):
+    """
+    Retrait des bénéfices d'un investissement actif (voir InvestmentViewSet.withdraw)
+    """
+    serializer = WithdrawSerializer(data=request.data)
+    if not serializer.is_valid():
+        return _json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    amount = serializer.validated_data['amount']
+
+    try:
+        withdrawal = await sync_to_async(reserve_withdrawal)(
+            request.user,
+            amount,
+            serializer.validated_data['wallet_address']
+        )
+    except WithdrawalRejected as e:
+        return _json_response({'error': e.message}, e.status_code)
+
+    return _json_response({
+        'message': f'Retrait de {amount} USDT en cours de traitement',
+        'transaction_id': withdrawal.id,
+        'status': withdrawal.status
+    }, status.HTTP_202_ACCEPTED)
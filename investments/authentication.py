@@ -0,0 +1,145 @@
+"""
+Authentification JWT sans accès à la base sur le chemin courant.
+
+Les utilisateurs sont résolus depuis le cache (clé ``user_id``, durée de vie
+courte, invalidée à chaque sauvegarde du ``User``). Seuls les champs sans
+secret y sont stockés : le hash du mot de passe n'est jamais écrit dans le
+cache, partagé sur disque. Les jetons d'accès révoqués
+sont testés contre un filtre de Bloom des JTI de ``RevokedAccessToken``,
+reconstruit périodiquement : un jeton absent du filtre n'est pas révoqué, un
+jeton présent est confirmé en base (faux positifs possibles). La liste noire de
+simplejwt, qui reçoit chaque jeton de rafraîchissement après rotation, n'est
+pas chargée : ces jetons ne sont jamais présentés à l'authentification.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch, get_md5_hash_password
+
+from .models import RevokedAccessToken
+
+AUTH_USER_KEY = 'auth-user:{}:fields'
+# Champs de l'utilisateur conservés en cache ; les autres sont différés
+AUTH_USER_FIELDS = ('id', 'username', 'email', 'is_active', 'is_staff', 'is_superuser')
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Double hachage : k positions dérivées de deux valeurs de 64 bits
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevokedTokenFilter:
+    """Ensemble des JTI d'accès révoqués, rechargé depuis la base à intervalle régulier"""
+
+    def __init__(self, refresh_interval):
+        self.refresh_interval = refresh_interval
+        self._bloom = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._bloom is None or self._expires_at < time.monotonic():
+            with self._lock:
+                if self._bloom is None or self._expires_at < time.monotonic():
+                    jtis = list(
+                        RevokedAccessToken.objects.filter(
+                            expires_at__gt=timezone.now()
+                        ).values_list('jti', flat=True)
+                    )
+                    bloom = BloomFilter(len(jtis) + 1024)
+                    for jti in jtis:
+                        bloom.add(jti)
+                    self._bloom = bloom
+                    self._expires_at = time.monotonic() + self.refresh_interval
+        return self._bloom
+
+    def add(self, jti):
+        self._get().add(jti)
+
+    def is_revoked(self, jti):
+        if jti not in self._get():
+            return False
+        return RevokedAccessToken.objects.filter(jti=jti).exists()
+
+
+revoked_tokens = RevokedTokenFilter(settings.TOKEN_REVOCATION_REFRESH_INTERVAL)
+
+
+def revoke_token(token):
+    """
+    Révoque un jeton d'accès jusqu'à son expiration. Les jetons de
+    rafraîchissement passent par ``RefreshToken.blacklist()``.
+    """
+    jti = token[api_settings.JTI_CLAIM]
+    RevokedAccessToken.objects.get_or_create(
+        jti=jti,
+        defaults={'expires_at': datetime_from_epoch(token['exp'])}
+    )
+    revoked_tokens.add(jti)
+
+
+def invalidate_user(user_id):
+    cache.delete(AUTH_USER_KEY.format(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` avec utilisateurs en cache et révocation en mémoire"""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revoked_tokens.is_revoked(token[api_settings.JTI_CLAIM]):
+            raise InvalidToken('Ce jeton a été révoqué')
+        return token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        key = AUTH_USER_KEY.format(user_id)
+        cached = cache.get(key)
+        if cached is None:
+            user = super().get_user(validated_token)
+            cache.set(
+                key,
+                {field: getattr(user, field) for field in AUTH_USER_FIELDS},
+                settings.AUTH_USER_CACHE_TIMEOUT
+            )
+            return user
+
+        # Instance chargée partiellement : un autre champ (mot de passe compris)
+        # est lu en base à la demande, et save() n'écrit que les champs chargés
+        field_names = [f.attname for f in self.user_model._meta.concrete_fields if f.attname in cached]
+        user = self.user_model.from_db('default', field_names, [cached[name] for name in field_names])
+
+        # L'utilisateur en cache a déjà été validé ; seul le contrôle propre au jeton reste à faire
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed('Le mot de passe a été modifié', code='password_changed')
+        return user
@@ -1,122 +1,337 @@
-from web3 import Web3
+from web3 import Web3, AsyncWeb3
+from web3.exceptions import TransactionNotFound
 from decimal import Decimal
 from django.conf import settings
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from aiohttp import ClientTimeout
+import requests
+import threading
 import json
 
-class BlockchainClient:
-    def __init__(self):
-        self.w3 = Web3(Web3.HTTPProvider(settings.INFURA_URL))
+USDT_DECIMALS = Decimal('1000000')
+
+# keccak256("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = Web3.keccak(text='Transfer(address,address,uint256)')
+
+def _to_bytes(value):
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith('0x') else value)
+    return bytes(value)
+
+def decode_transfer_log(log):
+    """
+    Décode un log ERC-20 ``Transfer`` par lecture à offsets fixes.
+
+    Les adresses indexées occupent les 20 derniers octets des topics 1 et 2,
+    le montant est l'entier 256 bits big-endian contenu dans ``data``.
+
+    Returns:
+        dict | None: from_address, to_address (en minuscules), value (unités brutes)
+            ou None si le log n'est pas un Transfer
+    """
+    topics = log['topics']
+    if len(topics) != 3 or _to_bytes(topics[0]) != TRANSFER_TOPIC:
+        return None
+    return {
+        'from_address': '0x' + _to_bytes(topics[1])[12:].hex(),
+        'to_address': '0x' + _to_bytes(topics[2])[12:].hex(),
+        'value': int.from_bytes(_to_bytes(log['data'])[:32], 'big'),
+    }
+
+def _normalize_raw_receipt(raw_receipt):
+    """Adapte un reçu JSON-RPC brut (valeurs hexadécimales) au format attendu par parse_receipt"""
+    if raw_receipt is None:
+        return None
+    return {
+        'status': int(raw_receipt['status'], 16),
+        'logs': raw_receipt['logs'],
+    }
+
+@lru_cache(maxsize=None)
+def load_usdt_abi():
+    """Charge l'ABI du contrat USDT une seule fois par processus"""
+    with open(settings.USDT_ABI_PATH) as f:
+        return json.load(f)
+
+def build_http_session():
+    """Session HTTP keep-alive avec un pool de connexions vers le noeud RPC"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.BLOCKCHAIN_HTTP_POOL_SIZE
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class BaseBlockchainClient:
+    def __init__(self, w3):
+        self.w3 = w3
         self.company_wallet = settings.COMPANY_WALLET_ADDRESS
         self.company_private_key = settings.COMPANY_WALLET_PRIVATE_KEY
-        
-        # Charger l'ABI du contrat USDT
-        with open(settings.USDT_ABI_PATH) as f:
-            self.contract_abi = json.load(f)
-        
+        self.contract_abi = load_usdt_abi()
+
         # Initialiser le contrat USDT
         self.usdt_contract = self.w3.eth.contract(
             address=settings.USDT_CONTRACT_ADDRESS,
             abi=self.contract_abi
         )
+        self.usdt_address = settings.USDT_CONTRACT_ADDRESS.lower()
 
-    def send_usdt(self, to_address: str, amount: Decimal) -> str:
+    def parse_receipt(self, tx_receipt, to_address: str = None) -> dict:
         """
-        Envoie des USDT du wallet de la compagnie vers l'adresse spécifiée
-        
+        Extrait le transfert USDT d'un reçu de transaction à partir de ses logs Transfer.
+
+        Tous les transferts émis par le contrat USDT vers ``to_address`` sont
+        additionnés, quelle que soit la façon dont ils ont été déclenchés
+        (transfer, transferFrom, appel depuis un autre contrat). Sans
+        ``to_address``, le premier transfert USDT du reçu est retenu.
+        """
+        if tx_receipt is None:
+            return {
+                'valid': False,
+                'error': 'Transaction introuvable'
+            }
+
+        if not tx_receipt['status']:
+            return {
+                'valid': False,
+                'error': 'La transaction a échoué'
+            }
+
+        target = to_address.lower() if to_address else None
+        recipient = None
+        value = 0
+        for log in tx_receipt['logs']:
+            if log['address'].lower() != self.usdt_address:
+                continue
+            transfer = decode_transfer_log(log)
+            if transfer is None:
+                continue
+            if target is None:
+                target = transfer['to_address']
+            if transfer['to_address'] == target:
+                recipient = Web3.to_checksum_address(target)
+                value += transfer['value']
+
+        if recipient is None:
+            return {
+                'valid': False,
+                'error': 'Ce n\'est pas une transaction de transfert USDT'
+            }
+
+        return {
+            'valid': True,
+            'amount': Decimal(value) / USDT_DECIMALS,
+            'to_address': recipient,
+            'error': None
+        }
+
+class BlockchainClient(BaseBlockchainClient):
+    def __init__(self, w3=None):
+        if w3 is None:
+            w3 = Web3(Web3.HTTPProvider(
+                settings.INFURA_URL,
+                request_kwargs={'timeout': settings.BLOCKCHAIN_HTTP_TIMEOUT},
+                session=build_http_session()
+            ))
+        super().__init__(w3)
+
+    def get_usdt_balance(self, address: str) -> Decimal:
+        """
+        Retourne le solde USDT d'une adresse
+        """
+        balance = self.usdt_contract.functions.balanceOf(
+            Web3.to_checksum_address(address)
+        ).call()
+        return Decimal(balance) / USDT_DECIMALS
+
+    def sign_usdt_transfer(self, to_address: str, amount: Decimal, nonce: int, gas_price: int = None):
+        """
+        Construit et signe localement un transfert USDT, sans le diffuser
+
         Args:
             to_address: Adresse du portefeuille destinataire
             amount: Montant en USDT à envoyer
-            
+            nonce: Nonce attribué par le NonceManager
+            gas_price: Prix du gas en wei ; lu sur le noeud si absent
+
         Returns:
-            str: Hash de la transaction
+            tuple[str, str]: Hash de la transaction et transaction signée (hexadécimal)
         """
+        # Convertir le montant en unités USDT (6 décimales)
+        amount_wei = int(amount * USDT_DECIMALS)
+
+        # Préparer la transaction de transfert USDT
+        transfer_txn = self.usdt_contract.functions.transfer(
+            Web3.to_checksum_address(to_address),
+            amount_wei
+        ).build_transaction({
+            'chainId': settings.CHAIN_ID,
+            'gas': 100000,  # Limite de gas
+            'gasPrice': gas_price if gas_price is not None else self.w3.eth.gas_price,
+            'nonce': nonce,
+        })
+
+        # Signer la transaction
+        signed_txn = self.w3.eth.account.sign_transaction(
+            transfer_txn,
+            self.company_private_key
+        )
+        return self.w3.to_hex(signed_txn.hash), self.w3.to_hex(signed_txn.raw_transaction)
+
+    def send_raw_transaction(self, signed_transaction: str) -> str:
+        """Diffuse une transaction déjà signée et retourne son hash"""
+        return self.w3.to_hex(self.w3.eth.send_raw_transaction(signed_transaction))
+
+    def get_confirmed_nonce(self) -> int:
+        """Nombre de transactions du wallet de la compagnie incluses dans un bloc"""
+        return self.w3.eth.get_transaction_count(self.company_wallet, 'latest')
+
+    def is_transaction_known(self, tx_hash: str) -> bool:
+        """Indique si le noeud connaît la transaction (en attente ou minée)"""
         try:
-            # Convertir le montant en unités USDT (6 décimales)
-            amount_wei = int(amount * Decimal('1000000'))
-            
-            # Construire la transaction
-            nonce = self.w3.eth.get_transaction_count(self.company_wallet)
-            
-            # Préparer la transaction de transfert USDT
-            transfer_txn = self.usdt_contract.functions.transfer(
-                to_address,
-                amount_wei
-            ).build_transaction({
-                'chainId': settings.CHAIN_ID,
-                'gas': 100000,  # Limite de gas
-                'gasPrice': self.w3.eth.gas_price,
-                'nonce': nonce,
-            })
-            
-            # Signer la transaction
-            signed_txn = self.w3.eth.account.sign_transaction(
-                transfer_txn,
-                self.company_private_key
-            )
-            
-            # Envoyer la transaction
-            tx_hash = self.w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-            
-            # Attendre la confirmation de la transaction
-            tx_receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
-            
-            if tx_receipt['status'] == 1:  # Transaction réussie
-                return self.w3.to_hex(tx_hash)
-            else:
-                raise Exception("La transaction a échoué")
-                
-        except Exception as e:
-            raise Exception(f"Erreur lors de l'envoi des USDT: {str(e)}")
+            self.w3.eth.get_transaction(tx_hash)
+        except TransactionNotFound:
+            return False
+        return True
 
-    def verify_transaction(self, tx_hash: str) -> dict:
+    def get_transaction_status(self, tx_hash: str):
+        """
+        Retourne True si la transaction est confirmée avec succès, False si
+        elle a échoué et None si elle n'est pas encore minée
+        """
+        try:
+            tx_receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return None
+        return tx_receipt['status'] == 1
+
+    def get_transfer_logs(self, from_block: int, to_block: int) -> list:
+        """
+        Récupère les logs Transfer du contrat USDT sur une plage de blocs (eth_getLogs)
+        """
+        return self.w3.eth.get_logs({
+            'address': self.usdt_contract.address,
+            'topics': [TRANSFER_TOPIC],
+            'fromBlock': from_block,
+            'toBlock': to_block,
+        })
+
+    def verify_transaction(self, tx_hash: str, to_address: str = None) -> dict:
         """
         Vérifie une transaction USDT et retourne ses détails
         
         Args:
             tx_hash: Hash de la transaction à vérifier
+            to_address: Adresse dont on attend la réception des USDT
             
         Returns:
             dict: Détails de la transaction avec les clés :
                 - valid (bool): True si la transaction est valide
-                - amount (Decimal): Montant de la transaction
+                - amount (Decimal): Montant reçu par l'adresse
                 - to_address (str): Adresse du destinataire
                 - error (str): Message d'erreur si la transaction n'est pas valide
         """
-            # Récupérer les détails de la transaction
-        tx = self.w3.eth.get_transaction(tx_hash)
-        tx_receipt = self.w3.eth.get_transaction_receipt(tx_hash)
         try:
-            
-            if not tx_receipt['status']:
-                return {
-                    'valid': False,
-                    'error': 'La transaction a échoué'
-                }
-
-            # Décoder les données de la transaction
-            decoded_input = self.usdt_contract.decode_function_input(tx['input'])
-            print(decoded_input)
-            # Vérifier que c'est bien un transfert USDT
-            if decoded_input[0].fn_name != 'transfer':
-                return {
-                    'valid': False,
-                    'error': 'Ce n\'est pas une transaction de transfert USDT'
-                }
-            
-            # Extraire le montant et l'adresse de destination
-            amount = Decimal(decoded_input[1]['_value']) / Decimal('1000000')  
-            to_address = decoded_input[1]['_to']
+            tx_receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            tx_receipt = None
+        return self.parse_receipt(tx_receipt, to_address)
 
-            return {
-                'valid': True,
-                'amount': amount,
-                'to_address': to_address,
-                'error': None
-            }
+    def verify_transactions(self, tx_hashes, to_address: str = None, batch_size: int = None) -> dict:
+        """
+        Vérifie un ensemble de transactions via des requêtes JSON-RPC groupées
 
-        except Exception as e:
-            print(e)
-            return {
-                'valid': False,
-                'error': str(e)
-            }
+        Les appels eth_getTransactionReceipt sont regroupés par paquets de
+        ``batch_size`` dans une seule requête HTTP chacun.
+
+        Args:
+            tx_hashes: Hashs des transactions à vérifier
+            to_address: Adresse dont on attend la réception des USDT
+            batch_size: Nombre d'appels par requête groupée
+
+        Returns:
+            dict: tx_hash -> résultat au format de verify_transaction
+        """
+        batch_size = batch_size or settings.BLOCKCHAIN_RPC_BATCH_SIZE
+        tx_hashes = list(tx_hashes)
+        results = {}
+
+        for start in range(0, len(tx_hashes), batch_size):
+            chunk = tx_hashes[start:start + batch_size]
+            responses = self.w3.provider.make_batch_request([
+                ('eth_getTransactionReceipt', [tx_hash]) for tx_hash in chunk
+            ])
+            if not isinstance(responses, list):
+                raise Exception(f"Erreur RPC: {responses.get('error')}")
+
+            for tx_hash, response in zip(chunk, responses):
+                if 'error' in response:
+                    results[tx_hash] = {
+                        'valid': False,
+                        'error': str(response['error'].get('message', response['error']))
+                    }
+                    continue
+                results[tx_hash] = self.parse_receipt(
+                    _normalize_raw_receipt(response['result']),
+                    to_address
+                )
+
+        return results
+
+class AsyncBlockchainClient(BaseBlockchainClient):
+    """
+    Variante asyncio du client, pour les vues exécutées sous ASGI.
+
+    Le fournisseur asynchrone de web3 conserve une session aiohttp par
+    boucle d'événements : une seule instance peut donc servir toutes les
+    requêtes du processus.
+    """
+    def __init__(self, w3=None):
+        if w3 is None:
+            w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(
+                settings.INFURA_URL,
+                request_kwargs={'timeout': ClientTimeout(total=settings.BLOCKCHAIN_HTTP_TIMEOUT)}
+            ))
+        super().__init__(w3)
+
+    async def get_usdt_balance(self, address: str) -> Decimal:
+        """
+        Retourne le solde USDT d'une adresse
+        """
+        balance = await self.usdt_contract.functions.balanceOf(
+            Web3.to_checksum_address(address)
+        ).call()
+        return Decimal(balance) / USDT_DECIMALS
+
+    async def verify_transaction(self, tx_hash: str, to_address: str = None) -> dict:
+        """
+        Vérifie une transaction USDT et retourne ses détails (voir BlockchainClient.verify_transaction)
+        """
+        try:
+            tx_receipt = await self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            tx_receipt = None
+        return self.parse_receipt(tx_receipt, to_address)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _get_shared_client(client_class):
+    client = _clients.get(client_class)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(client_class)
+            if client is None:
+                client = _clients[client_class] = client_class()
+    return client
+
+def get_blockchain_client() -> BlockchainClient:
+    """Retourne le client blockchain partagé par tout le processus"""
+    return _get_shared_client(BlockchainClient)
+
+def get_async_blockchain_client() -> AsyncBlockchainClient:
+    """Retourne le client blockchain asynchrone partagé par tout le processus"""
+    return _get_shared_client(AsyncBlockchainClient)
@@ -0,0 +1,87 @@
+"""
+Catalogue des plans d'investissement mis en cache dans le processus.
+
+Les plans changent rarement : ils sont chargés et sérialisés une seule fois,
+avec un ETag fort calculé sur la représentation JSON. Toute sauvegarde ou
+suppression d'un ``InvestmentPlan`` incrémente la version du catalogue (voir
+le signal dans ``models.py``). Cette version est rangée dans le cache partagé :
+chaque processus la relit et recharge son catalogue dès qu'elle change. Une
+durée de vie bornée couvre les modifications faites hors de l'ORM.
+"""
+import copy
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import InvestmentPlan
+
+VERSION_KEY = 'plan-catalog:version'
+
+
+class PlanCatalog:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._loaded = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return cache.get(VERSION_KEY, 0)
+
+    def invalidate(self):
+        """Invalide le catalogue dans tous les processus"""
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            # Clé absente ou évincée : une nouvelle version toujours inédite
+            cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+    def _load(self):
+        from .serializers import InvestmentPlanSerializer
+
+        plans = list(InvestmentPlan.objects.all())
+        data = InvestmentPlanSerializer(plans, many=True).data
+        payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+        return {
+            'plans': {plan.pk: plan for plan in plans},
+            'data': data,
+            'data_by_id': {item['id']: item for item in data},
+            'etag': f'"{hashlib.sha256(payload).hexdigest()}"',
+        }
+
+    def get(self):
+        """Retourne le catalogue courant, rechargé si sa version ou sa durée de vie a expiré"""
+        version = self.version
+        loaded = self._loaded
+        if loaded is None or loaded['version'] != version or loaded['expires_at'] < time.monotonic():
+            with self._lock:
+                loaded = self._loaded
+                if loaded is None or loaded['version'] != version or loaded['expires_at'] < time.monotonic():
+                    loaded = self._load()
+                    loaded['version'] = version
+                    loaded['expires_at'] = time.monotonic() + self.ttl
+                    self._loaded = loaded
+        return loaded
+
+    def get_data(self, pk):
+        return self.get()['data_by_id'].get(pk)
+
+    def active_plans(self):
+        """Plans actifs, par niveau croissant"""
+        return sorted(
+            (plan for plan in self.get()['plans'].values() if plan.is_active),
+            key=lambda plan: plan.level
+        )
+
+    def get_plan(self, pk):
+        """Retourne une copie du plan ``pk`` ou None"""
+        plan = self.get()['plans'].get(pk)
+        return copy.copy(plan) if plan is not None else None
+
+
+plan_catalog = PlanCatalog(settings.PLAN_CATALOG_TTL)
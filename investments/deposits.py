@@ -0,0 +1,114 @@
+"""
+Crédit des dépôts USDT sur les portefeuilles, avec les commissions de
+parrainage associées. Utilisé par l'action ``deposit`` (un dépôt) comme par
+l'indexeur ``index_deposits`` (des lots entiers).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import USDTTransaction, UserProfile, ReferralCommission, BalanceEntry
+from .usercache import invalidate_users
+
+REFERRAL_COMMISSION_RATE = Decimal('0.05')
+
+
+def _deposit_transaction(wallet, amount, tx_hash, log_index=None):
+    return USDTTransaction(
+        wallet=wallet,
+        transaction_type='DEPOSIT',
+        amount=amount,
+        status='COMPLETED',
+        tx_hash=tx_hash,
+        log_index=log_index
+    )
+
+
+def credit_deposits(deposits):
+    """
+    Enregistre des dépôts confirmés et crédite les portefeuilles concernés.
+
+    Args:
+        deposits: Liste de tuples (wallet, amount, tx_hash[, log_index])
+
+    Returns:
+        list[USDTTransaction]: Transactions de dépôt créées, dans l'ordre des entrées
+    """
+    if not deposits:
+        return []
+
+    with transaction.atomic():
+        deposit_transactions = USDTTransaction.objects.bulk_create([
+            _deposit_transaction(*deposit) for deposit in deposits
+        ])
+        apply_deposits(deposit_transactions)
+
+    return deposit_transactions
+
+
+def apply_deposits(deposit_transactions):
+    """
+    Crédite les portefeuilles pour des transactions de dépôt COMPLETED et
+    verse les commissions de parrainage correspondantes.
+
+    Args:
+        deposit_transactions: Transactions DEPOSIT avec leur ``wallet`` chargé
+    """
+    with transaction.atomic():
+        # Gérer les commissions des utilisateurs parrainés
+        profiles = {
+            profile.user_id: profile
+            for profile in UserProfile.objects.filter(
+                user_id__in={deposit.wallet.user_id for deposit in deposit_transactions},
+                referred_by__isnull=False
+            ).select_related('user', 'referred_by__user__usdt_wallet')
+        }
+
+        commissions = []
+        for deposit in deposit_transactions:
+            profile = profiles.get(deposit.wallet.user_id)
+            if profile is None:
+                continue
+
+            referral_bonus = deposit.amount * REFERRAL_COMMISSION_RATE
+            referrer_wallet = profile.referred_by.user.usdt_wallet
+            commissions.append((profile, deposit, USDTTransaction(
+                wallet=referrer_wallet,
+                transaction_type='REFERRAL_BONUS',
+                amount=referral_bonus,
+                status='COMPLETED',
+                description=f"Commission de parrainage pour le dépôt de {profile.user.email}"
+            )))
+
+        if commissions:
+            USDTTransaction.objects.bulk_create([bonus for _, _, bonus in commissions])
+            ReferralCommission.objects.bulk_create([
+                ReferralCommission(
+                    referrer=profile.referred_by,
+                    referee=profile,
+                    deposit=deposit,
+                    bonus_transaction=bonus,
+                    amount=bonus.amount
+                )
+                for profile, deposit, bonus in commissions
+            ])
+
+            referral_earnings = defaultdict(Decimal)
+            for profile, _, bonus in commissions:
+                referral_earnings[profile.referred_by_id] += bonus.amount
+            for referrer_id, earnings in referral_earnings.items():
+                UserProfile.objects.filter(pk=referrer_id).update(
+                    total_referral_earnings=F('total_referral_earnings') + earnings
+                )
+
+        # Créditer les soldes par écritures dans le registre, sans modifier les portefeuilles
+        credited = list(deposit_transactions) + [bonus for _, _, bonus in commissions]
+        BalanceEntry.objects.bulk_create([
+            BalanceEntry(wallet_id=credit.wallet_id, amount=credit.amount, usdt_transaction=credit)
+            for credit in credited
+        ])
+
+        # bulk_create n'émet pas de signaux : invalider explicitement
+        invalidate_users({deposit.wallet.user_id for deposit in deposit_transactions})
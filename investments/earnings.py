@@ -0,0 +1,109 @@
+"""
+Moteur de calcul des gains accumulés des investissements.
+
+Les gains sont calculés par lots à partir de tableaux NumPy en arithmétique
+entière (centimes et millièmes de pourcent) afin de rester exacts, puis
+persistés sur ``Investment.accrued_earnings``. Les mêmes unités servent aux
+projections quotidiennes, calculées pour tous les plans en une seule opération.
+"""
+from decimal import Decimal, ROUND_DOWN
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+
+# Unités internes : montant en centimes (10^-2), taux en millièmes de
+# pourcent (10^-3 %), soit des gains exprimés en 10^-7 USDT.
+AMOUNT_SCALE = 100
+RATE_SCALE = 1000
+EARNINGS_EXPONENT = -7
+EARNINGS_QUANTUM = Decimal('0.000001')
+# Un centime vaut 10^5 unités de gains
+PRINCIPAL_UNITS = 10 ** 5
+
+MAX_PROJECTION_DAYS = 5 * 365
+
+
+def compute_accrued_earnings(amounts, daily_returns, start_dates, now):
+    """
+    Calcule les gains accumulés pour un lot d'investissements.
+
+    Args:
+        amounts: Montants investis (Decimal)
+        daily_returns: Rendements quotidiens en pourcentage (Decimal)
+        start_dates: Dates de début (datetime aware)
+        now: Date de référence du calcul
+
+    Returns:
+        list[Decimal]: Gains accumulés, dans le même ordre que les entrées
+    """
+    if not amounts:
+        return []
+
+    cents = np.array([int(a * AMOUNT_SCALE) for a in amounts], dtype=np.int64)
+    rates = np.array([int(r * RATE_SCALE) for r in daily_returns], dtype=np.int64)
+    starts = np.array([d.timestamp() for d in start_dates], dtype=np.float64)
+
+    # Seuls les jours complets écoulés génèrent des gains
+    days = np.floor((now.timestamp() - starts) / SECONDS_PER_DAY).astype(np.int64)
+    np.maximum(days, 0, out=days)
+
+    units = cents * rates * days
+
+    return [
+        Decimal(int(u)).scaleb(EARNINGS_EXPONENT).quantize(EARNINGS_QUANTUM, rounding=ROUND_DOWN)
+        for u in units
+    ]
+
+
+def _to_rates(daily_returns):
+    return np.array([int(r * RATE_SCALE) for r in daily_returns], dtype=np.int64)
+
+
+def _to_usdt(units):
+    # Troncature au micro-USDT, comme pour les gains persistés
+    return (units // 10) / 1e6
+
+
+def project_earnings(amount, daily_returns, days, elapsed_days=0,
+                     upgrade_day=None, upgrade_returns=None, additional_amount=Decimal('0')):
+    """
+    Projette jour par jour les gains et la valeur d'un montant sur plusieurs
+    scénarios à la fois (une ligne par scénario).
+
+    Le scénario ``i`` rapporte ``daily_returns[i]`` jusqu'au jour
+    ``upgrade_day``, puis ``upgrade_returns[i]`` sur le montant augmenté de
+    ``additional_amount``. Comme lors d'une vraie mise à niveau, les gains
+    accumulés repartent de zéro et ceux déjà acquis restent dans la valeur.
+
+    Args:
+        amount: Montant investi (Decimal)
+        daily_returns: Rendements quotidiens en pourcentage (Decimal)
+        days: Horizon de la projection, en jours à partir d'aujourd'hui
+        elapsed_days: Jours de gains déjà écoulés au jour 0
+        upgrade_day: Jour de la mise à niveau, ou None
+        upgrade_returns: Rendements après la mise à niveau (Decimal)
+        additional_amount: Montant ajouté lors de la mise à niveau (Decimal)
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Gains accumulés et valeur en USDT,
+            de forme (scénarios, days + 1)
+    """
+    day = np.arange(days + 1, dtype=np.int64)
+    cents = int(amount * AMOUNT_SCALE)
+    rates = _to_rates(daily_returns)[:, None]
+
+    earnings = cents * rates * (day + elapsed_days)
+    value = cents * PRINCIPAL_UNITS + earnings
+
+    if upgrade_day is not None:
+        upgraded_cents = cents + int(additional_amount * AMOUNT_SCALE)
+        upgrade_rates = _to_rates(upgrade_returns)[:, None]
+        kept = cents * rates * (upgrade_day + elapsed_days)
+        after = upgraded_cents * upgrade_rates * np.maximum(day - upgrade_day, 0)
+
+        upgraded = day >= upgrade_day
+        earnings = np.where(upgraded, after, earnings)
+        value = np.where(upgraded, upgraded_cents * PRINCIPAL_UNITS + kept + after, value)
+
+    return _to_usdt(earnings), _to_usdt(value)
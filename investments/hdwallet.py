@@ -0,0 +1,31 @@
+"""
+Dérivation déterministe (BIP32/BIP44) des adresses de dépôt.
+
+Chaque portefeuille reçoit l'adresse d'indice ``n`` du chemin
+``m/44'/60'/0'/0/n`` dérivé de la phrase mnémonique maître : la clé privée
+n'est jamais stockée mais peut toujours être recalculée à partir de l'indice.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from eth_account import Account
+from eth_account.hdaccount import seed_from_mnemonic, key_from_seed
+
+DERIVATION_PATH = "m/44'/60'/0'/0/{index}"
+
+
+@lru_cache(maxsize=1)
+def _master_seed(mnemonic):
+    # PBKDF2 coûteux : calculé une seule fois par processus
+    return seed_from_mnemonic(mnemonic, '')
+
+
+def derive_private_key(index):
+    """Clé privée du portefeuille d'indice ``index``"""
+    seed = _master_seed(settings.HD_WALLET_MNEMONIC)
+    return key_from_seed(seed, DERIVATION_PATH.format(index=index))
+
+
+def derive_address(index):
+    """Adresse Ethereum du portefeuille d'indice ``index``"""
+    return Account.from_key(derive_private_key(index)).address
@@ -0,0 +1,151 @@
+"""
+Prise en charge de l'en-tête ``Idempotency-Key`` sur les actions qui écrivent.
+
+La première requête portant une clé la réserve (enregistrement « en cours »),
+exécute la vue puis stocke sa réponse. Une nouvelle tentative avec la même
+clé renvoie la réponse enregistrée sans rien réexécuter. Seules les réponses
+2xx sont conservées : après une erreur, la clé est libérée et la requête peut
+être rejouée. La vue n'est pas enveloppée dans une transaction, pour ne pas
+garder le verrou d'écriture SQLite pendant les appels RPC.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def _request_hash(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _replay(record):
+    response = HttpResponse(
+        record.response_body,
+        status=record.status_code,
+        content_type='application/json'
+    )
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(user, key, request_hash):
+    """
+    Réserve la clé pour cette requête.
+
+    Returns:
+        tuple: (IdempotencyKey réservée, None) ou (None, réponse à renvoyer)
+    """
+    while True:
+        now = timezone.now()
+        # Une nouvelle tentative ne coûte qu'une lecture
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            try:
+                with transaction.atomic():
+                    return IdempotencyKey.objects.create(
+                        user=user,
+                        key=key,
+                        request_hash=request_hash,
+                        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+                    ), None
+            except IntegrityError:
+                # Requête concurrente avec la même clé : relire l'enregistrement
+                continue
+
+        abandoned = (
+            record.status_code is None
+            and record.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        )
+        if record.expires_at <= now or abandoned:
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+            continue
+
+        if record.request_hash != request_hash:
+            return None, Response(
+                {'error': "Cette clé d'idempotence a déjà été utilisée pour une autre requête"},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if record.status_code is None:
+            return None, Response(
+                {'error': 'Une requête avec cette clé est déjà en cours de traitement'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return None, _replay(record)
+
+
+def begin(request):
+    """
+    Réserve la clé d'idempotence de la requête, s'il y en a une.
+
+    Returns:
+        tuple: (IdempotencyKey réservée ou None, réponse à renvoyer ou None)
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return None, None
+    if not key or len(key) > IdempotencyKey._meta.get_field('key').max_length:
+        return None, Response(
+            {'error': "En-tête Idempotency-Key invalide"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return _claim(request.user, key, _request_hash(request))
+
+
+def finish(record, status_code, body):
+    """Enregistre la réponse (JSON rendu) d'une réussite, ou libère la clé après une erreur"""
+    if status.is_success(status_code):
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            status_code=status_code,
+            response_body=body.decode()
+        )
+    else:
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+
+def release(record):
+    IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+
+def idempotent(view_method):
+    """Décorateur de méthode de vue honorant l'en-tête ``Idempotency-Key``"""
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        record, response = begin(request)
+        if response is not None:
+            return response
+        if record is None:
+            return view_method(self, request, *args, **kwargs)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            release(record)
+            raise
+
+        body = JSONRenderer().render(response.data) if status.is_success(response.status_code) else b''
+        finish(record, response.status_code, body)
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys():
+    """Supprime les clés expirées. Returns: int: Nombre de clés supprimées"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,113 @@
+"""
+Indexeur des dépôts USDT.
+
+Les logs ``Transfer`` du contrat sont lus par plages de blocs (eth_getLogs)
+et comparés à un index en mémoire des adresses ``USDTWallet.address``. Les
+dépôts trouvés sont crédités par lot et le dernier bloc traité est enregistré
+dans la même transaction, de sorte qu'un redémarrage reprend exactement là
+où l'indexeur s'était arrêté.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from .blockchain import USDT_DECIMALS, decode_transfer_log
+from .deposits import credit_deposits
+from .models import IndexerCheckpoint, USDTWallet, USDTTransaction
+
+CHECKPOINT_NAME = 'usdt_deposits'
+
+
+def load_address_index():
+    """Index adresse (en minuscules) -> portefeuille"""
+    return {
+        wallet.address.lower(): wallet
+        for wallet in USDTWallet.objects.only('id', 'user_id', 'address')
+    }
+
+
+def _to_hex(value):
+    return value if isinstance(value, str) else '0x' + bytes(value).hex()
+
+
+def index_block_range(client, from_block, to_block, address_index):
+    """
+    Crédite les dépôts contenus dans une plage de blocs et avance le checkpoint.
+
+    Returns:
+        int: Nombre de dépôts crédités
+    """
+    deposits = []
+    for log in client.get_transfer_logs(from_block, to_block):
+        transfer = decode_transfer_log(log)
+        if transfer is None:
+            continue
+        wallet = address_index.get(transfer['to_address'])
+        if wallet is None or not transfer['value']:
+            continue
+        deposits.append((
+            wallet,
+            Decimal(transfer['value']) / USDT_DECIMALS,
+            _to_hex(log['transactionHash']),
+            log['logIndex']
+        ))
+
+    with transaction.atomic():
+        # Une transaction peut contenir plusieurs Transfer vers nos portefeuilles :
+        # chaque log est crédité une fois (le rejeu d'une plage est ignoré).
+        # Une transaction enregistrée en entier (dépôt déclaré manuellement,
+        # retrait de la compagnie vers un portefeuille) est ignorée.
+        recorded = set(
+            USDTTransaction.objects.filter(
+                tx_hash__in={deposit[2] for deposit in deposits}
+            ).values_list('tx_hash', 'log_index')
+        )
+        whole_transactions = {tx_hash for tx_hash, log_index in recorded if log_index is None}
+        new_deposits = []
+        for deposit in deposits:
+            key = (deposit[2], deposit[3])
+            if deposit[2] not in whole_transactions and key not in recorded:
+                recorded.add(key)
+                new_deposits.append(deposit)
+
+        credit_deposits(new_deposits)
+        IndexerCheckpoint.objects.update_or_create(
+            name=CHECKPOINT_NAME,
+            defaults={'last_block': to_block}
+        )
+
+    return len(new_deposits)
+
+
+def index_new_blocks(client, batch_blocks, confirmations, start_block=None):
+    """
+    Traite tous les blocs confirmés depuis le dernier checkpoint.
+
+    Args:
+        client: BlockchainClient (éventuellement branché sur une chaîne locale)
+        batch_blocks: Nombre de blocs par appel eth_getLogs
+        confirmations: Nombre de confirmations exigées avant de créditer
+        start_block: Bloc de départ en l'absence de checkpoint ; par défaut
+            l'indexeur démarre au dernier bloc confirmé
+
+    Returns:
+        tuple: (nombre de blocs traités, nombre de dépôts crédités)
+    """
+    head = client.w3.eth.block_number - confirmations
+    checkpoint = IndexerCheckpoint.objects.filter(name=CHECKPOINT_NAME).first()
+    if checkpoint is not None:
+        from_block = checkpoint.last_block + 1
+    elif start_block is not None:
+        from_block = start_block
+    else:
+        from_block = head
+
+    address_index = load_address_index()
+    block_count = deposit_count = 0
+    while from_block <= head:
+        to_block = min(from_block + batch_blocks - 1, head)
+        deposit_count += index_block_range(client, from_block, to_block, address_index)
+        block_count += to_block - from_block + 1
+        from_block = to_block + 1
+
+    return block_count, deposit_count
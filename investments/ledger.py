@@ -0,0 +1,140 @@
+"""
+Registre des soldes en ajout seul.
+
+Le solde d'un portefeuille vaut le dernier ``BalanceSnapshot`` plus la somme
+des ``BalanceEntry`` postérieures (identifiant supérieur à
+``last_entry_id``). Les écritures ne font qu'insérer des lignes : aucune
+ligne n'est verrouillée en lecture-modification-écriture, sauf le portefeuille
+lors d'un débit (voir ``locked_balance``). La commande
+``compact_balances`` consolide régulièrement les écritures en instantanés.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Max
+from django.db.models.functions import Coalesce
+
+from .models import BalanceEntry, BalanceSnapshot, USDTWallet
+
+ZERO = Decimal('0')
+
+
+def _sum_entries(entries):
+    return Coalesce(
+        Subquery(entries.order_by().values('wallet').annotate(total=Sum('amount')).values('total')),
+        ZERO,
+        output_field=DecimalField()
+    )
+
+
+def ledger_balance(wallet_ref='pk', upto_entry=None):
+    """
+    Expression calculant le solde d'un portefeuille en une seule requête.
+
+    Args:
+        wallet_ref: Chemin vers l'identifiant du portefeuille dans le queryset annoté
+        upto_entry: Ignorer les écritures d'identifiant supérieur
+    """
+    snapshots = BalanceSnapshot.objects.filter(wallet=OuterRef(wallet_ref))
+    if upto_entry is not None:
+        snapshots = snapshots.filter(last_entry_id__lte=upto_entry)
+    snapshots = snapshots.order_by('-last_entry_id')
+
+    # Les instantanés sont relus par rapport au portefeuille de l'écriture
+    entry_snapshots = BalanceSnapshot.objects.filter(wallet=OuterRef('wallet'))
+    if upto_entry is not None:
+        entry_snapshots = entry_snapshots.filter(last_entry_id__lte=upto_entry)
+    entry_snapshots = entry_snapshots.order_by('-last_entry_id')
+
+    entries = BalanceEntry.objects.filter(
+        wallet=OuterRef(wallet_ref),
+        id__gt=Coalesce(Subquery(entry_snapshots.values('last_entry_id')[:1]), 0)
+    )
+    if upto_entry is not None:
+        entries = entries.filter(id__lte=upto_entry)
+
+    return Coalesce(
+        Subquery(snapshots.values('balance')[:1]),
+        ZERO,
+        output_field=DecimalField()
+    ) + _sum_entries(entries)
+
+
+def locked_balance(wallet):
+    """
+    Verrouille le portefeuille jusqu'à la fin de la transaction en cours et
+    retourne son solde. À appeler dans le bloc atomic() qui insère un débit :
+    les débits d'un même portefeuille sont sérialisés et ne peuvent pas le
+    rendre négatif. Les crédits restent sans verrou, ils ne font qu'augmenter
+    le solde.
+    """
+    return (
+        USDTWallet.objects
+        .select_for_update()
+        .annotate(current_balance=ledger_balance())
+        .values_list('current_balance', flat=True)
+        .get(pk=wallet.pk)
+    )
+
+
+def balance_at(wallet, when):
+    """Solde d'un portefeuille à la date ``when``"""
+    snapshot = BalanceSnapshot.objects.filter(
+        wallet=wallet,
+        as_of__lte=when
+    ).order_by('-last_entry_id').first()
+
+    entries = BalanceEntry.objects.filter(wallet=wallet, created_at__lte=when)
+    balance = ZERO
+    if snapshot is not None:
+        entries = entries.filter(id__gt=snapshot.last_entry_id)
+        balance = snapshot.balance
+
+    return balance + (entries.aggregate(total=Sum('amount'))['total'] or ZERO)
+
+
+def compact_balances(upto_entry, chunk_size=1000):
+    """
+    Crée un instantané pour chaque portefeuille ayant des écritures non
+    consolidées d'identifiant inférieur ou égal à ``upto_entry``.
+
+    Returns:
+        int: Nombre d'instantanés créés
+    """
+    last_entries = BalanceEntry.objects.filter(wallet=OuterRef('pk'), id__lte=upto_entry).order_by('-id')
+    last_snapshot = BalanceSnapshot.objects.filter(wallet=OuterRef('pk')).order_by('-last_entry_id')
+
+    wallets = USDTWallet.objects.annotate(
+        snapshot_entry=Coalesce(Subquery(last_snapshot.values('last_entry_id')[:1]), 0),
+        last_entry=Subquery(last_entries.values('id')[:1]),
+        last_entry_at=Subquery(last_entries.values('created_at')[:1]),
+        compacted_balance=ledger_balance(upto_entry=upto_entry),
+    ).filter(last_entry__gt=0).order_by('pk').values(
+        'pk', 'snapshot_entry', 'last_entry', 'last_entry_at', 'compacted_balance'
+    )
+
+    created_count = 0
+    last_pk = 0
+    while True:
+        chunk = list(wallets.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1]['pk']
+
+        snapshots = BalanceSnapshot.objects.bulk_create([
+            BalanceSnapshot(
+                wallet_id=row['pk'],
+                balance=row['compacted_balance'],
+                last_entry_id=row['last_entry'],
+                as_of=row['last_entry_at']
+            )
+            for row in chunk
+            if row['last_entry'] > row['snapshot_entry']
+        ])
+        created_count += len(snapshots)
+
+    return created_count
+
+
+def last_entry_before(when):
+    """Identifiant de la dernière écriture créée avant ``when``"""
+    return BalanceEntry.objects.filter(created_at__lt=when).aggregate(last=Max('id'))['last']
@@ -0,0 +1,193 @@
+"""
+Projection des obligations de paiement des investissements actifs.
+
+Les investissements actifs sont chargés en colonnes NumPy. Les gains étant
+linéaires en temps, les gains payables d'un investissement au jour ``d``
+valent ``max(0, offset + accrual * d)`` (gains déjà acquis moins retraits,
+plus le gain quotidien) : la courbe cumulée de tout le portefeuille se
+calcule en O(N + jours) par ``bincount`` sur le jour où chaque position
+devient payable, sans matrice investissements x jours.
+
+Les scénarios Monte Carlo tirent pour chaque investisseur le jour de son
+premier retrait (loi géométrique), après lequel il retire ses gains au fil
+de l'eau ; les scénarios sont répartis sur un pool de processus.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from .blockchain import get_blockchain_client
+from .earnings import AMOUNT_SCALE, RATE_SCALE, SECONDS_PER_DAY
+from .models import Investment
+
+NEVER = np.iinfo(np.int64).max
+
+
+def load_positions(now=None, chunk_size=100000):
+    """
+    Charge les investissements actifs en colonnes.
+
+    Returns:
+        dict[str, np.ndarray]: ``principal``, ``accrual`` (gain quotidien) et
+            ``offset`` (gains acquis moins retraits), en USDT
+    """
+    now = now or timezone.now()
+    rows = (
+        Investment.objects
+        .filter(status='ACTIVE', start_date__isnull=False)
+        .annotate(
+            # Conversion en entiers côté base : pas de Decimal par ligne
+            cents=Cast(Round(F('amount_invested') * AMOUNT_SCALE), BigIntegerField()),
+            rate=Cast(Round(F('plan__daily_return') * RATE_SCALE), BigIntegerField()),
+            withdrawn_cents=Cast(Round(F('total_withdrawn') * AMOUNT_SCALE), BigIntegerField()),
+        )
+        .values_list('cents', 'rate', 'withdrawn_cents', 'start_date')
+        .iterator(chunk_size=chunk_size)
+    )
+
+    columns = ([], [], [], [])
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+    cents, rates, withdrawn, start_dates = columns
+
+    cents = np.array(cents, dtype=np.float64) / AMOUNT_SCALE
+    rates = np.array(rates, dtype=np.float64) / (RATE_SCALE * 100)
+    withdrawn = np.array(withdrawn, dtype=np.float64) / AMOUNT_SCALE
+    starts = np.array([d.timestamp() for d in start_dates], dtype=np.float64)
+
+    # Seuls les jours complets écoulés génèrent des gains (voir compute_accrued_earnings)
+    elapsed = np.maximum(np.floor((now.timestamp() - starts) / SECONDS_PER_DAY), 0)
+    accrual = cents * rates
+    return {
+        'principal': cents,
+        'accrual': accrual,
+        'offset': accrual * elapsed - withdrawn,
+    }
+
+
+def _payable_from(positions):
+    """Premier jour où les gains de chaque position dépassent ses retraits"""
+    accrual = positions['accrual']
+    offset = positions['offset']
+    days = np.zeros(len(accrual), dtype=np.int64)
+    behind = offset < 0
+    growing = behind & (accrual > 0)
+    days[growing] = np.ceil(-offset[growing] / accrual[growing])
+    days[behind & ~growing] = NEVER
+    return days
+
+
+def cumulative_payable(positions, start_days, horizon):
+    """
+    Courbe cumulée sur ``horizon`` jours des montants payés aux positions à
+    partir de leur jour de départ : ``offset + accrual * d`` pour ``d >= start``.
+    """
+    start_days = np.minimum(start_days, horizon + 1)
+    slope = np.bincount(start_days, weights=positions['accrual'], minlength=horizon + 2)
+    intercept = np.bincount(start_days, weights=positions['offset'], minlength=horizon + 2)
+    day = np.arange(horizon + 1)
+    return np.cumsum(intercept)[:horizon + 1] + np.cumsum(slope)[:horizon + 1] * day
+
+
+def project_obligations(positions, horizon):
+    """Gains payables cumulés si chaque investisseur retirait tout, chaque jour"""
+    return cumulative_payable(positions, _payable_from(positions), horizon)
+
+
+_worker_positions = None
+
+
+def _init_worker(positions):
+    global _worker_positions
+    _worker_positions = positions
+
+
+def _simulate_batch(seed, scenarios, horizon, daily_rate, volatility):
+    positions = _worker_positions
+    payable_from = _payable_from(positions)
+    rng = np.random.default_rng(seed)
+    curves = np.empty((scenarios, horizon + 1))
+    for s in range(scenarios):
+        # Intensité de retrait propre au scénario (marché calme ou panique)
+        rate = min(daily_rate * rng.lognormal(0, volatility), 1.0)
+        first_withdrawal = rng.geometric(rate, size=len(payable_from)) - 1
+        curves[s] = cumulative_payable(positions, np.maximum(payable_from, first_withdrawal), horizon)
+    return curves
+
+
+def simulate_withdrawals(positions, horizon, scenarios=1000, daily_rate=0.02,
+                         volatility=0.5, workers=None, seed=None):
+    """
+    Scénarios Monte Carlo de retraits cumulés.
+
+    Args:
+        daily_rate: Probabilité quotidienne médiane qu'un investisseur commence à retirer
+        volatility: Dispersion (log-normale) de cette probabilité entre scénarios
+        workers: Nombre de processus (par défaut, un par coeur)
+
+    Returns:
+        np.ndarray: Retraits cumulés en USDT, de forme (scénarios, horizon + 1)
+    """
+    if scenarios < 1:
+        raise ValueError('Le nombre de scénarios doit être au moins 1')
+    workers = min(workers or os.cpu_count() or 1, scenarios)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    batches = np.array_split(np.arange(scenarios), workers)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(positions,)) as executor:
+        futures = [
+            executor.submit(_simulate_batch, seed, len(batch), horizon, daily_rate, volatility)
+            for seed, batch in zip(seeds, batches)
+            if len(batch)
+        ]
+        return np.concatenate([future.result() for future in futures])
+
+
+def liquidity_report(positions, horizons, company_balance=None, **simulation):
+    """
+    Obligations et pression de retrait aux horizons demandés.
+
+    Returns:
+        dict: Totaux du portefeuille et une ligne par horizon
+    """
+    horizon = max(horizons)
+    obligations = project_obligations(positions, horizon)
+    simulated = simulate_withdrawals(positions, horizon, **simulation)
+
+    rows = []
+    for days in horizons:
+        outflows = simulated[:, days]
+        row = {
+            'days': days,
+            'payable': float(obligations[days]),
+            'expected_withdrawals': float(outflows.mean()),
+            'p95_withdrawals': float(np.percentile(outflows, 95)),
+            'p99_withdrawals': float(np.percentile(outflows, 99)),
+            'shortfall_probability': None,
+        }
+        if company_balance is not None:
+            row['shortfall_probability'] = float((outflows > company_balance).mean())
+        rows.append(row)
+
+    return {
+        'investments': len(positions['principal']),
+        'principal': float(positions['principal'].sum()),
+        'payable_now': float(obligations[0]),
+        'company_balance': company_balance,
+        'scenarios': len(simulated),
+        'horizons': rows,
+    }
+
+
+def fetch_company_balance():
+    """Solde USDT on-chain du portefeuille de la compagnie, ou None si le noeud est injoignable"""
+    try:
+        return float(get_blockchain_client().get_usdt_balance(settings.COMPANY_WALLET_ADDRESS))
+    except Exception:
+        return None
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from investments.models import Investment
+from investments.earnings import compute_accrued_earnings
+from investments.usercache import invalidate_all
+
+class Command(BaseCommand):
+    help = 'Met à jour les gains accumulés de tous les investissements actifs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Nombre d\'investissements traités par lot'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        now = timezone.now()
+        updated_count = 0
+        last_pk = 0
+
+        active_investments = (
+            Investment.objects
+            .filter(status='ACTIVE', start_date__isnull=False)
+            .select_related('plan')
+            .only('id', 'amount_invested', 'start_date', 'accrued_earnings', 'plan__daily_return')
+            .order_by('pk')
+        )
+
+        while True:
+            # Parcours par clé primaire pour éviter les OFFSET coûteux
+            chunk = list(active_investments.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+
+            earnings = compute_accrued_earnings(
+                [inv.amount_invested for inv in chunk],
+                [inv.plan.daily_return for inv in chunk],
+                [inv.start_date for inv in chunk],
+                now
+            )
+
+            for investment, accrued in zip(chunk, earnings):
+                investment.accrued_earnings = accrued
+                investment.last_earnings_update = now
+
+            with transaction.atomic():
+                # Un upgrade ou une clôture entre la lecture et l'écriture remet
+                # la période à zéro : ces lignes sont laissées telles quelles
+                current = dict(
+                    Investment.objects
+                    .select_for_update()
+                    .filter(pk__in=[inv.pk for inv in chunk], status='ACTIVE')
+                    .values_list('pk', 'start_date')
+                )
+                unchanged = [inv for inv in chunk if current.get(inv.pk) == inv.start_date]
+                Investment.objects.bulk_update(
+                    unchanged,
+                    ['accrued_earnings', 'last_earnings_update'],
+                    batch_size=chunk_size
+                )
+
+            updated_count += len(unchanged)
+            last_pk = chunk[-1].pk
+
+        if updated_count:
+            invalidate_all()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully accrued earnings for {updated_count} investments'
+            )
+        )
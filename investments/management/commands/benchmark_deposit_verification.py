@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from web3 import Web3, AsyncWeb3
+
+from investments.blockchain import TRANSFER_TOPIC, AsyncBlockchainClient, BlockchainClient, build_http_session
+
+# Adresse de réception fictive : le benchmark n'envoie rien au vrai noeud
+RECIPIENT = '0x' + '33' * 20
+
+
+def _receipt(tx_hash):
+    """Reçu JSON-RPC d'un transfert de 100 USDT vers RECIPIENT"""
+    recipient = RECIPIENT[2:].rjust(64, '0')
+    return {
+        'blockHash': '0x' + '11' * 32,
+        'blockNumber': '0x1',
+        'contractAddress': None,
+        'cumulativeGasUsed': '0x5208',
+        'effectiveGasPrice': '0x1',
+        'from': '0x' + '22' * 20,
+        'gasUsed': '0x5208',
+        'logs': [{
+            'address': settings.USDT_CONTRACT_ADDRESS.lower(),
+            'blockHash': '0x' + '11' * 32,
+            'blockNumber': '0x1',
+            'data': '0x' + hex(100 * 10 ** 6)[2:].rjust(64, '0'),
+            'logIndex': '0x0',
+            'removed': False,
+            'topics': ['0x' + TRANSFER_TOPIC.hex().removeprefix('0x'), '0x' + '22'.rjust(64, '0'), '0x' + recipient],
+            'transactionHash': tx_hash,
+            'transactionIndex': '0x0',
+        }],
+        'logsBloom': '0x' + '00' * 256,
+        'status': '0x1',
+        'to': settings.USDT_CONTRACT_ADDRESS.lower(),
+        'transactionHash': tx_hash,
+        'transactionIndex': '0x0',
+        'type': '0x2',
+    }
+
+
+class FakeRPCServer:
+    """Noeud JSON-RPC local répondant à eth_getTransactionReceipt avec une latence fixe"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.started = threading.Event()
+
+    async def handle(self, request):
+        payload = await request.json()
+        await asyncio.sleep(self.latency)
+        return web.json_response({
+            'jsonrpc': '2.0',
+            'id': payload['id'],
+            'result': _receipt(payload['params'][0]),
+        })
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_post('/', self.handle)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, '127.0.0.1', 0, backlog=4096)
+        self.loop.run_until_complete(site.start())
+        self.url = 'http://127.0.0.1:{}/'.format(site._server.sockets[0].getsockname()[1])
+        self.started.set()
+        self.loop.run_forever()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        self.started.wait()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare le débit de vérification de dépôts concurrents : threads '
+        'bloquants (WSGI) contre boucle d\'événements (ASGI)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Nombre de vérifications de dépôt à effectuer'
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.1,
+            help='Latence simulée du noeud RPC (secondes)'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=16,
+            help='Threads de requête du déploiement WSGI (workers x threads)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=500,
+            help='Requêtes en vol simultanées sous ASGI'
+        )
+
+    def handle(self, *args, **options):
+        server = FakeRPCServer(options['latency'])
+        server.start()
+        tx_hashes = ['0x' + f'{i:064x}' for i in range(options['requests'])]
+        try:
+            results = [
+                ('WSGI', self.run_threads(server.url, tx_hashes, options['threads'])),
+                ('ASGI', asyncio.run(self.run_event_loop(server.url, tx_hashes, options['concurrency']))),
+            ]
+        finally:
+            server.stop()
+
+        for label, (valid_count, elapsed) in results:
+            self.stdout.write(
+                f'{label}: {len(tx_hashes) / elapsed:8.1f} verifications/s '
+                f'({valid_count}/{len(tx_hashes)} valid in {elapsed:.2f}s)'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Successfully ran deposit verification benchmark'))
+
+    def run_threads(self, url, tx_hashes, threads):
+        # Une requête WSGI occupe son thread pendant toute l'attente RPC
+        session = build_http_session()
+        client = BlockchainClient(w3=Web3(Web3.HTTPProvider(url, session=session)))
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(
+                lambda tx_hash: client.verify_transaction(tx_hash, RECIPIENT),
+                tx_hashes
+            ))
+        return sum(result['valid'] for result in results), time.monotonic() - started
+
+    async def run_event_loop(self, url, tx_hashes, concurrency):
+        client = AsyncBlockchainClient(w3=AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(url)))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def verify(tx_hash):
+            async with semaphore:
+                return await client.verify_transaction(tx_hash, RECIPIENT)
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(verify(tx_hash) for tx_hash in tx_hashes))
+        elapsed = time.monotonic() - started
+        await client.w3.provider.disconnect()
+        return sum(result['valid'] for result in results), elapsed
@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# (pragmas, timeout, BEGIN) : configuration par défaut de Django contre le profil de production
+PROFILES = {
+    'default': ([], 5, 'BEGIN'),
+    'production': (
+        list(dict.fromkeys(settings.SQLITE_WAL_PRAGMAS + settings.SQLITE_PRAGMAS)),
+        settings.DATABASES['default']['OPTIONS']['timeout'],
+        'BEGIN ' + settings.DATABASES['default']['OPTIONS']['transaction_mode'],
+    ),
+}
+
+
+def _run_worker(path, profile, writes, start_event, results):
+    pragmas, timeout, begin = PROFILES[profile]
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    for pragma in pragmas:
+        conn.execute(pragma)
+
+    committed = locked = 0
+    start_event.wait()
+    for _ in range(writes):
+        try:
+            # Transaction d'écriture courte du type dépôt : lecture du solde puis écriture
+            conn.execute(begin)
+            conn.execute('SELECT COALESCE(SUM(amount), 0) FROM entry WHERE wallet_id = ?', (os.getpid(),)).fetchone()
+            conn.execute('INSERT INTO entry (wallet_id, amount) VALUES (?, ?)', (os.getpid(), 1))
+            conn.execute('COMMIT')
+            committed += 1
+        except sqlite3.OperationalError:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            locked += 1
+        # Lecture concurrente, comme les requêtes GET servies par le même worker
+        conn.execute('SELECT COUNT(*) FROM entry').fetchone()
+    conn.close()
+    results.put((committed, locked))
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit d'écritures SQLite concurrentes avec et sans le profil de production"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Nombre de processus écrivains simultanés'
+        )
+        parser.add_argument(
+            '--writes',
+            type=int,
+            default=500,
+            help="Nombre de transactions d'écriture par processus"
+        )
+
+    def handle(self, *args, **options):
+        for profile in PROFILES:
+            committed, locked, elapsed = self.run_profile(profile, options['workers'], options['writes'])
+            self.stdout.write(
+                f'{profile:>10}: {committed / elapsed:8.0f} writes/s, '
+                f'{committed} committed, {locked} "database is locked" in {elapsed:.2f}s'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Successfully ran SQLite write benchmark'))
+
+    def run_profile(self, profile, workers, writes):
+        # Base temporaire : la base de l'application n'est jamais touchée
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            conn = sqlite3.connect(path)
+            conn.execute('CREATE TABLE entry (id INTEGER PRIMARY KEY, wallet_id INTEGER, amount INTEGER)')
+            conn.execute('CREATE INDEX entry_wallet_idx ON entry (wallet_id)')
+            conn.commit()
+            conn.close()
+
+            start_event = multiprocessing.Event()
+            results = multiprocessing.Queue()
+            processes = [
+                multiprocessing.Process(target=_run_worker, args=(path, profile, writes, start_event, results))
+                for _ in range(workers)
+            ]
+            for process in processes:
+                process.start()
+
+            started = time.monotonic()
+            start_event.set()
+            totals = [results.get() for _ in processes]
+            elapsed = time.monotonic() - started
+            for process in processes:
+                process.join()
+
+        return sum(c for c, _ in totals), sum(l for _, l in totals), elapsed
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from investments.ledger import compact_balances, last_entry_before
+
+class Command(BaseCommand):
+    help = 'Consolide les écritures du registre des soldes en instantanés'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lag',
+            type=int,
+            default=60,
+            help='Ignorer les écritures des N dernières secondes (transactions encore ouvertes)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Nombre de portefeuilles traités par lot'
+        )
+
+    def handle(self, *args, **options):
+        upto_entry = last_entry_before(timezone.now() - timedelta(seconds=options['lag']))
+        created_count = 0
+        if upto_entry is not None:
+            created_count = compact_balances(upto_entry, chunk_size=options['chunk_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully created {created_count} balance snapshots'
+            )
+        )
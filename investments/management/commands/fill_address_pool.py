@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from investments.models import DepositAddress
+
+class Command(BaseCommand):
+    help = 'Pré-dérive des adresses de dépôt HD pour maintenir le pool d\'adresses libres'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            type=int,
+            default=settings.DEPOSIT_ADDRESS_POOL_SIZE,
+            help='Nombre d\'adresses libres à maintenir'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Nombre d\'adresses dérivées par insertion'
+        )
+
+    def handle(self, *args, **options):
+        free_count = DepositAddress.objects.filter(claimed_at__isnull=True).count()
+        missing = max(0, options['target'] - free_count)
+        created_count = 0
+
+        while created_count < missing:
+            batch = min(options['batch_size'], missing - created_count)
+            created_count += len(DepositAddress.objects.fill(batch))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully derived {created_count} deposit addresses'
+            )
+        )
@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from investments.blockchain import get_blockchain_client
+from investments.indexer import index_new_blocks
+
+class Command(BaseCommand):
+    help = 'Crédite les dépôts USDT en parcourant les logs Transfer par plages de blocs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Rattraper les blocs confirmés puis s\'arrêter'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=15,
+            help='Délai en secondes entre deux passages'
+        )
+        parser.add_argument(
+            '--batch-blocks',
+            type=int,
+            default=settings.DEPOSIT_INDEXER_BATCH_BLOCKS,
+            help='Nombre de blocs par requête eth_getLogs'
+        )
+        parser.add_argument(
+            '--confirmations',
+            type=int,
+            default=settings.DEPOSIT_CONFIRMATIONS,
+            help='Nombre de confirmations exigées avant de créditer un dépôt'
+        )
+        parser.add_argument(
+            '--start-block',
+            type=int,
+            default=None,
+            help='Bloc de départ si aucun checkpoint n\'existe'
+        )
+
+    def handle(self, *args, **options):
+        client = get_blockchain_client()
+
+        while True:
+            block_count, deposit_count = index_new_blocks(
+                client,
+                options['batch_blocks'],
+                options['confirmations'],
+                start_block=options['start_block']
+            )
+
+            if block_count:
+                self.stdout.write(
+                    f'{block_count} blocks scanned, {deposit_count} deposits credited'
+                )
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,93 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from investments.liquidity import load_positions, liquidity_report, fetch_company_balance
+from investments.models import LiquiditySnapshot
+
+class Command(BaseCommand):
+    help = 'Projette les gains payables des investissements actifs face au solde de la compagnie et enregistre le rapport'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizons',
+            type=int,
+            nargs='+',
+            default=settings.LIQUIDITY_HORIZONS,
+            help='Horizons de projection, en jours'
+        )
+        parser.add_argument(
+            '--scenarios',
+            type=int,
+            default=settings.LIQUIDITY_SCENARIOS,
+            help='Nombre de scénarios Monte Carlo'
+        )
+        parser.add_argument(
+            '--daily-rate',
+            type=float,
+            default=settings.LIQUIDITY_DAILY_WITHDRAWAL_RATE,
+            help='Probabilité quotidienne médiane qu\'un investisseur commence à retirer'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Nombre de processus de simulation (par défaut, un par coeur)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Graine aléatoire, pour des résultats reproductibles'
+        )
+        parser.add_argument(
+            '--company-balance',
+            type=float,
+            default=None,
+            help='Solde USDT de la compagnie (par défaut, lu sur la blockchain)'
+        )
+
+    def handle(self, *args, **options):
+        if options['scenarios'] < 1:
+            raise CommandError('--scenarios doit être au moins 1')
+
+        started = time.monotonic()
+        positions = load_positions()
+        loaded = time.monotonic()
+
+        company_balance = options['company_balance']
+        if company_balance is None:
+            company_balance = fetch_company_balance()
+
+        report = liquidity_report(
+            positions,
+            sorted(options['horizons']),
+            company_balance=company_balance,
+            scenarios=options['scenarios'],
+            daily_rate=options['daily_rate'],
+            workers=options['workers'],
+            seed=options['seed']
+        )
+        # Affiché par la vue d'administration, qui ne lance pas la simulation
+        LiquiditySnapshot.objects.create(report=report)
+
+        balance = f"{company_balance:,.2f} USDT" if company_balance is not None else 'unavailable'
+        self.stdout.write(
+            f"{report['investments']} active investments, principal {report['principal']:,.2f} USDT, "
+            f"payable now {report['payable_now']:,.2f} USDT, company wallet {balance}"
+        )
+        for row in report['horizons']:
+            shortfall = row['shortfall_probability']
+            self.stdout.write(
+                f"{row['days']:>5}d: payable {row['payable']:,.2f}, "
+                f"expected withdrawals {row['expected_withdrawals']:,.2f}, "
+                f"p95 {row['p95_withdrawals']:,.2f}, p99 {row['p99_withdrawals']:,.2f}, "
+                f"shortfall probability {'n/a' if shortfall is None else f'{shortfall:.1%}'}"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully simulated {report['scenarios']} scenarios "
+                f"(load {loaded - started:.2f}s, total {time.monotonic() - started:.2f}s)"
+            )
+        )
@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from investments.blockchain import get_blockchain_client
+from investments.nonces import NonceManager
+from investments.withdrawals import (
+    broadcast_pending_withdrawals,
+    confirm_broadcast_withdrawals,
+    reprice_stuck_withdrawals
+)
+
+class Command(BaseCommand):
+    help = 'Diffuse les retraits en attente et suit leur confirmation sur la blockchain'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Effectuer un seul passage puis s\'arrêter'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Délai en secondes entre deux passages'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Nombre de transferts diffusés en parallèle'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Nombre maximum de retraits diffusés par passage'
+        )
+
+    def handle(self, *args, **options):
+        client = get_blockchain_client()
+        nonce_manager = NonceManager(client.company_wallet)
+
+        while True:
+            nonce_manager.sync_with_chain(client)
+
+            broadcast_count = broadcast_pending_withdrawals(
+                client,
+                nonce_manager,
+                limit=options['batch_size'],
+                max_workers=options['workers']
+            )
+            finalized_count = confirm_broadcast_withdrawals(client)
+            repriced_count = reprice_stuck_withdrawals(client, settings.WITHDRAWAL_STUCK_TIMEOUT)
+
+            if broadcast_count or finalized_count or repriced_count:
+                self.stdout.write(
+                    f'{broadcast_count} withdrawals broadcast, {finalized_count} finalized, '
+                    f'{repriced_count} repriced'
+                )
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
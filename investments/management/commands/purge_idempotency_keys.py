@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from investments.idempotency import purge_expired_keys
+
+class Command(BaseCommand):
+    help = "Supprime les réponses Idempotency-Key expirées"
+
+    def handle(self, *args, **options):
+        deleted_count = purge_expired_keys()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully purged {deleted_count} expired idempotency keys'
+            )
+        )
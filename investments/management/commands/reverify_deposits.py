@@ -0,0 +1,94 @@
+import time
+from datetime import datetime, time as dt_time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from investments.blockchain import get_blockchain_client
+from investments.deposits import apply_deposits
+from investments.models import USDTTransaction
+
+class Command(BaseCommand):
+    help = 'Revérifie par lots les dépôts PENDING/FAILED d\'une période via des requêtes JSON-RPC groupées'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', required=True, help='Date de début (AAAA-MM-JJ)')
+        parser.add_argument('--until', required=True, help='Date de fin incluse (AAAA-MM-JJ)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.BLOCKCHAIN_RPC_BATCH_SIZE,
+            help='Nombre de hashs par requête JSON-RPC groupée'
+        )
+
+    def _parse_date(self, value, end_of_day=False):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Date invalide: {value}')
+        return timezone.make_aware(datetime.combine(day, dt_time.max if end_of_day else dt_time.min))
+
+    def handle(self, *args, **options):
+        since = self._parse_date(options['since'])
+        until = self._parse_date(options['until'], end_of_day=True)
+        batch_size = options['batch_size']
+
+        deposits = USDTTransaction.objects.filter(
+            transaction_type='DEPOSIT',
+            status__in=['PENDING', 'FAILED'],
+            tx_hash__isnull=False,
+            created_at__range=(since, until)
+        ).select_related('wallet').order_by('pk')
+
+        client = get_blockchain_client()
+        started = time.monotonic()
+        checked_count = completed_count = failed_count = 0
+        last_pk = 0
+
+        while True:
+            chunk = list(deposits.filter(pk__gt=last_pk)[:batch_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            results = client.verify_transactions(
+                [deposit.tx_hash for deposit in chunk],
+                settings.COMPANY_USDT_ADDRESS,
+                batch_size=batch_size
+            )
+            checked_count += len(chunk)
+
+            completed = []
+            with transaction.atomic():
+                for deposit in chunk:
+                    result = results[deposit.tx_hash]
+                    if result['valid']:
+                        # Mise à jour conditionnelle : un dépôt n'est crédité qu'une fois
+                        updated = USDTTransaction.objects.filter(
+                            pk=deposit.pk,
+                            status__in=['PENDING', 'FAILED']
+                        ).update(status='COMPLETED', amount=result['amount'], updated_at=timezone.now())
+                        if updated:
+                            deposit.status = 'COMPLETED'
+                            deposit.amount = result['amount']
+                            completed.append(deposit)
+                    elif result['error'] != 'Transaction introuvable' and deposit.status != 'FAILED':
+                        USDTTransaction.objects.filter(pk=deposit.pk).update(
+                            status='FAILED',
+                            description=result['error'],
+                            updated_at=timezone.now()
+                        )
+                        failed_count += 1
+
+                apply_deposits(completed)
+            completed_count += len(completed)
+
+        elapsed = time.monotonic() - started
+        throughput = checked_count / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Checked {checked_count} deposits in {elapsed:.2f}s ({throughput:.0f} tx/s): '
+                f'{completed_count} completed, {failed_count} failed'
+            )
+        )
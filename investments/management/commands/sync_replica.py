@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+class Command(BaseCommand):
+    help = 'Copie la base SQLite principale vers la réplique locale (réplication simulée)'
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASE:
+            raise CommandError('Aucune réplique configurée (DATABASE_REPLICA_NAME)')
+
+        primary = connections['default'].settings_dict
+        replica = connections[settings.REPLICA_DATABASE].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3' or replica['ENGINE'] != primary['ENGINE']:
+            raise CommandError('La copie de réplique ne prend en charge que SQLite')
+
+        # API de sauvegarde en ligne : copie cohérente même pendant des écritures
+        source = sqlite3.connect(primary['NAME'])
+        target = sqlite3.connect(replica['NAME'])
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully copied {primary['NAME']} to {replica['NAME']}"
+            )
+        )
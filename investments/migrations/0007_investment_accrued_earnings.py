@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:28
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.utils import timezone
+
+from investments.earnings import compute_accrued_earnings
+
+
+def backfill_accrued_earnings(apps, schema_editor):
+    # Sans cela, les investissements existants afficheraient 0 et refuseraient
+    # tout retrait jusqu'au premier passage de accrue_earnings
+    Investment = apps.get_model('investments', 'Investment')
+
+    now = timezone.now()
+    active = list(
+        Investment.objects
+        .filter(status='ACTIVE', start_date__isnull=False)
+        .select_related('plan')
+    )
+    earnings = compute_accrued_earnings(
+        [inv.amount_invested for inv in active],
+        [inv.plan.daily_return for inv in active],
+        [inv.start_date for inv in active],
+        now
+    )
+    for investment, accrued in zip(active, earnings):
+        investment.accrued_earnings = accrued
+        investment.last_earnings_update = now
+    Investment.objects.bulk_update(active, ['accrued_earnings', 'last_earnings_update'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0006_usdttransaction_description_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='investment',
+            name='accrued_earnings',
+            field=models.DecimalField(decimal_places=6, default=Decimal('0'), help_text='Gains accumulés depuis start_date, mis à jour par accrue_earnings', max_digits=20),
+        ),
+        migrations.RunPython(backfill_accrued_earnings, migrations.RunPython.noop),
+    ]
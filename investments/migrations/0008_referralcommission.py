@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+COMMISSION_PREFIX = "Commission de parrainage pour le dépôt de "
+
+
+def backfill_referral_commissions(apps, schema_editor):
+    USDTTransaction = apps.get_model('investments', 'USDTTransaction')
+    UserProfile = apps.get_model('investments', 'UserProfile')
+    ReferralCommission = apps.get_model('investments', 'ReferralCommission')
+
+    profiles_by_email = {
+        profile.user.email: profile
+        for profile in UserProfile.objects.select_related('user')
+    }
+    profiles_by_user = {profile.user_id: profile for profile in profiles_by_email.values()}
+
+    bonuses = USDTTransaction.objects.filter(
+        transaction_type='REFERRAL_BONUS',
+        description__startswith=COMMISSION_PREFIX
+    ).select_related('wallet')
+
+    commissions = []
+    for bonus in bonuses.iterator():
+        referee = profiles_by_email.get(bonus.description[len(COMMISSION_PREFIX):])
+        referrer = profiles_by_user.get(bonus.wallet.user_id)
+        if referee is None or referrer is None:
+            continue
+        commissions.append(ReferralCommission(
+            referrer=referrer,
+            referee=referee,
+            bonus_transaction=bonus,
+            amount=bonus.amount
+        ))
+
+    ReferralCommission.objects.bulk_create(commissions, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0007_investment_accrued_earnings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralCommission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('bonus_transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='investments.usdttransaction')),
+                ('deposit', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='referral_commission', to='investments.usdttransaction')),
+                ('referee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commissions_generated', to='investments.userprofile')),
+                ('referrer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commissions_earned', to='investments.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Commission de parrainage',
+                'verbose_name_plural': 'Commissions de parrainage',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['referrer', 'referee'], name='referral_comm_referrer_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_referral_commissions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_referral_tree(apps, schema_editor):
+    UserProfile = apps.get_model('investments', 'UserProfile')
+    ReferralTreePath = apps.get_model('investments', 'ReferralTreePath')
+
+    parents = dict(UserProfile.objects.values_list('id', 'referred_by_id'))
+
+    paths = []
+    for profile_id in parents:
+        ancestor_id = parents[profile_id]
+        depth = 1
+        seen = {profile_id}
+        # Remonter la chaîne des parrains en se protégeant des cycles
+        while ancestor_id is not None and ancestor_id not in seen:
+            paths.append(ReferralTreePath(
+                ancestor_id=ancestor_id,
+                descendant_id=profile_id,
+                depth=depth
+            ))
+            seen.add(ancestor_id)
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+
+    ReferralTreePath.objects.bulk_create(paths, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0008_referralcommission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralTreePath',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='downline_paths', to='investments.userprofile')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upline_paths', to='investments.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='referral_tree_ancestor_idx'), models.Index(fields=['descendant', 'depth'], name='referral_tree_descendant_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_referral_tree_path')],
+            },
+        ),
+        migrations.RunPython(build_referral_tree, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0009_referraltreepath'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usdttransaction',
+            name='investment',
+            field=models.ForeignKey(blank=True, help_text='Investissement dont les bénéfices sont retirés', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='withdrawals', to='investments.investment'),
+        ),
+        migrations.AddField(
+            model_name='usdttransaction',
+            name='to_address',
+            field=models.CharField(blank=True, help_text='Adresse de destination des retraits', max_length=42, null=True),
+        ),
+        migrations.AlterField(
+            model_name='usdttransaction',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('PROCESSING', 'Processing'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=10),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0010_usdttransaction_withdrawal_pipeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletNonce',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=42, unique=True)),
+                ('next_nonce', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='usdttransaction',
+            name='nonce',
+            field=models.PositiveBigIntegerField(blank=True, help_text='Nonce attribué au transfert sortant', null=True),
+        ),
+        migrations.CreateModel(
+            name='ReleasedNonce',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=42)),
+                ('nonce', models.PositiveBigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('address', 'nonce'), name='unique_released_nonce')],
+            },
+        ),
+    ]
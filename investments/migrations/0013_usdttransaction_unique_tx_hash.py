@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:35
+
+import sys
+
+from django.db import migrations, models
+
+
+def normalize_tx_hashes(apps, schema_editor):
+    # Les vues enregistrent désormais les hashs en minuscules : les anciens
+    # hashs sont normalisés pour que la contrainte couvre aussi leurs variantes
+    # de casse. Les doublons existants ne sont pas supprimés : le plus ancien
+    # garde le hash, les suivants sont annotés et signalés pour vérification.
+    USDTTransaction = apps.get_model('investments', 'USDTTransaction')
+
+    owners = {}
+    duplicates = []
+    rows = (
+        USDTTransaction.objects
+        .filter(tx_hash__isnull=False)
+        .order_by('created_at', 'pk')
+        .values_list('pk', 'tx_hash', 'description')
+    )
+    for pk, tx_hash, description in rows.iterator():
+        normalized = tx_hash.strip().lower() or None
+        if normalized is not None and normalized in owners:
+            note = f"[Doublon de la transaction {owners[normalized]} ({normalized})]"
+            USDTTransaction.objects.filter(pk=pk).update(
+                tx_hash=None,
+                description=f"{description} {note}" if description else note
+            )
+            duplicates.append((pk, owners[normalized], normalized))
+            continue
+
+        if normalized is not None:
+            owners[normalized] = pk
+        if normalized != tx_hash:
+            USDTTransaction.objects.filter(pk=pk).update(tx_hash=normalized)
+
+    if duplicates:
+        sys.stdout.write(f"\n  {len(duplicates)} transaction(s) with a duplicate tx_hash, hash cleared:\n")
+        for pk, original_pk, tx_hash in duplicates:
+            sys.stdout.write(f"    #{pk} duplicates #{original_pk} ({tx_hash})\n")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0012_indexercheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_tx_hashes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='usdttransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('tx_hash__isnull', False)), fields=('tx_hash',), name='unique_usdt_transaction_tx_hash'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0013_usdttransaction_unique_tx_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usdtwallet',
+            name='derivation_index',
+            field=models.PositiveBigIntegerField(blank=True, help_text="Indice de dérivation HD de l'adresse", null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='DepositAddress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveBigIntegerField(help_text='Indice de dérivation BIP44', unique=True)),
+                ('address', models.CharField(max_length=42, unique=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Adresse de dépôt',
+                'verbose_name_plural': 'Adresses de dépôt',
+                'indexes': [models.Index(condition=models.Q(('claimed_at__isnull', True)), fields=['index'], name='deposit_address_free_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def snapshot_existing_balances(apps, schema_editor):
+    USDTWallet = apps.get_model('investments', 'USDTWallet')
+    BalanceSnapshot = apps.get_model('investments', 'BalanceSnapshot')
+
+    now = timezone.now()
+    BalanceSnapshot.objects.bulk_create([
+        BalanceSnapshot(wallet_id=wallet_id, balance=balance, last_entry_id=0, as_of=now)
+        for wallet_id, balance in USDTWallet.objects.exclude(balance=0).values_list('id', 'balance')
+    ], batch_size=500)
+
+
+def restore_wallet_balances(apps, schema_editor):
+    USDTWallet = apps.get_model('investments', 'USDTWallet')
+    BalanceEntry = apps.get_model('investments', 'BalanceEntry')
+    BalanceSnapshot = apps.get_model('investments', 'BalanceSnapshot')
+
+    for wallet in USDTWallet.objects.all():
+        snapshot = BalanceSnapshot.objects.filter(wallet=wallet).order_by('-last_entry_id').first()
+        entries = BalanceEntry.objects.filter(wallet=wallet)
+        balance = 0
+        if snapshot is not None:
+            entries = entries.filter(id__gt=snapshot.last_entry_id)
+            balance = snapshot.balance
+        balance += entries.aggregate(total=models.Sum('amount'))['total'] or 0
+        USDTWallet.objects.filter(pk=wallet.pk).update(balance=balance)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0014_deposit_address_pool'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('usdt_transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='balance_entries', to='investments.usdttransaction')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_entries', to='investments.usdtwallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', 'id'], name='balance_entry_wallet_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('last_entry_id', models.PositiveBigIntegerField(default=0)),
+                ('as_of', models.DateTimeField(help_text='Date de la dernière écriture incluse')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='investments.usdtwallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', '-last_entry_id'], name='balance_snapshot_wallet_idx'), models.Index(fields=['wallet', '-as_of'], name='balance_snapshot_as_of_idx')],
+            },
+        ),
+        migrations.RunPython(snapshot_existing_balances, restore_wallet_balances),
+        migrations.RemoveField(
+            model_name='usdtwallet',
+            name='balance',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0015_balance_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='investment',
+            index=models.Index(models.F('user'), models.OrderBy(models.F('created_at'), descending=True), models.OrderBy(models.F('id'), descending=True), name='investment_user_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usdttransaction',
+            index=models.Index(models.F('wallet'), models.OrderBy(models.F('created_at'), descending=True), models.OrderBy(models.F('id'), descending=True), name='usdt_tx_wallet_history_idx'),
+        ),
+    ]
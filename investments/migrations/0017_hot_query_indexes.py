@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0016_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='investment',
+            index=models.Index(fields=['user', 'status'], name='investment_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='investment',
+            index=models.Index(fields=['status', 'id'], name='investment_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usdttransaction',
+            index=models.Index(fields=['wallet', 'transaction_type'], name='usdt_tx_wallet_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usdttransaction',
+            index=models.Index(fields=['transaction_type', 'status', 'created_at'], name='usdt_tx_type_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['referred_by', 'user'], name='profile_referred_by_idx'),
+        ),
+        # EmailBackend recherche les utilisateurs par email, colonne non indexée par django.contrib.auth
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email);',
+            'DROP INDEX IF EXISTS auth_user_email_idx;'
+        ),
+    ]
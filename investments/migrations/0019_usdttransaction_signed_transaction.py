@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0018_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usdttransaction',
+            name='signed_transaction',
+            field=models.TextField(blank=True, help_text="Transfert sortant signé, rediffusé s'il n'a pas atteint le noeud", null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0019_usdttransaction_signed_transaction'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='usdttransaction',
+            name='unique_usdt_transaction_tx_hash',
+        ),
+        migrations.AddField(
+            model_name='usdttransaction',
+            name='log_index',
+            field=models.PositiveIntegerField(blank=True, help_text='Position du log Transfer dans le bloc, pour les dépôts indexés', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='usdttransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('log_index__isnull', True), ('tx_hash__isnull', False)), fields=('tx_hash',), name='unique_usdt_transaction_tx_hash'),
+        ),
+        migrations.AddConstraint(
+            model_name='usdttransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('log_index__isnull', False)), fields=('tx_hash', 'log_index'), name='unique_usdt_transaction_tx_log'),
+        ),
+    ]
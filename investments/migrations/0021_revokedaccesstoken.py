@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:15
+
+import base64
+import json
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def _token_type(token):
+    # Lecture de la charge utile sans vérification : le jeton vient de la base
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload)).get('token_type')
+    except (IndexError, ValueError):
+        return None
+
+
+def copy_revoked_access_tokens(apps, schema_editor):
+    # Les jetons d'accès déjà révoqués (déconnexions) restent refusés
+    BlacklistedToken = apps.get_model('token_blacklist', 'BlacklistedToken')
+    RevokedAccessToken = apps.get_model('investments', 'RevokedAccessToken')
+
+    rows = (
+        BlacklistedToken.objects
+        .filter(token__expires_at__gt=timezone.now())
+        .values_list('token__jti', 'token__token', 'token__expires_at')
+    )
+    RevokedAccessToken.objects.bulk_create(
+        [
+            RevokedAccessToken(jti=jti, expires_at=expires_at)
+            for jti, token, expires_at in rows.iterator()
+            if _token_type(token) == 'access'
+        ],
+        batch_size=500,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0020_usdttransaction_log_index'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedAccessToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(max_length=255, unique=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(copy_revoked_access_tokens, migrations.RunPython.noop),
+    ]
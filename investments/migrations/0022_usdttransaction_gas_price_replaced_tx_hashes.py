@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0021_revokedaccesstoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usdttransaction',
+            name='gas_price',
+            field=models.PositiveBigIntegerField(blank=True, help_text='Prix du gas (wei) du transfert sortant signé', null=True),
+        ),
+        migrations.AddField(
+            model_name='usdttransaction',
+            name='replaced_tx_hashes',
+            field=models.JSONField(blank=True, default=list, help_text="Hashs des signatures précédentes au même nonce, remplacées faute d'être minées"),
+        ),
+    ]
@@ -1,14 +1,12 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
 from decimal import Decimal
 from django.utils import timezone
-from web3 import Web3
-import secrets
-import eth_account
 import uuid
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from .earnings import compute_accrued_earnings
 
 # Create your models here.
 
@@ -71,39 +69,150 @@ class UserProfile(models.Model):
         return f"Profile de {self.user.email}"
 
     class Meta:
+        indexes = [
+            models.Index(fields=['referred_by', 'user'], name='profile_referred_by_idx'),
+        ]
         verbose_name = "Profil Utilisateur"
         verbose_name_plural = "Profils Utilisateurs"
 
+class ReferralTreePathManager(models.Manager):
+    def attach(self, profile, referrer):
+        """
+        Rattache un nouveau filleul sous son parrain dans l'arbre de parrainage.
+
+        Le filleul hérite de tous les ancêtres du parrain avec une profondeur
+        augmentée de 1, plus le parrain lui-même à la profondeur 1.
+        """
+        ancestors = self.filter(descendant=referrer).values_list('ancestor_id', 'depth')
+        paths = [self.model(ancestor=referrer, descendant=profile, depth=1)]
+        paths.extend(
+            self.model(ancestor_id=ancestor_id, descendant=profile, depth=depth + 1)
+            for ancestor_id, depth in ancestors
+        )
+        return self.bulk_create(paths)
+
+class ReferralTreePath(models.Model):
+    """Table de fermeture (ancêtre, descendant, profondeur) de l'arbre de parrainage"""
+    ancestor = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='downline_paths')
+    descendant = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='upline_paths')
+    depth = models.PositiveIntegerField()
+
+    objects = ReferralTreePathManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ancestor', 'descendant'],
+                name='unique_referral_tree_path'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['ancestor', 'depth'], name='referral_tree_ancestor_idx'),
+            models.Index(fields=['descendant', 'depth'], name='referral_tree_descendant_idx'),
+        ]
+
+class DepositAddressManager(models.Manager):
+    def fill(self, count):
+        """
+        Dérive ``count`` nouvelles adresses à la suite des indices existants.
+
+        Returns:
+            list[DepositAddress]: Adresses ajoutées au pool
+        """
+        from .hdwallet import derive_address
+
+        last_index = self.aggregate(last=models.Max('index'))['last']
+        first_index = 0 if last_index is None else last_index + 1
+        return self.bulk_create([
+            self.model(index=index, address=derive_address(index))
+            for index in range(first_index, first_index + count)
+        ])
+
+    def claim(self):
+        """
+        Réserve la prochaine adresse libre du pool, sans calcul cryptographique.
+        Si le pool est vide, une adresse est dérivée à la volée.
+        """
+        while True:
+            candidate = self.filter(claimed_at__isnull=True).order_by('index').first()
+            if candidate is None:
+                try:
+                    with transaction.atomic():
+                        candidate, = self.fill(1)
+                except IntegrityError:
+                    # Un autre processus a dérivé le même indice
+                    continue
+
+            claimed = self.filter(
+                pk=candidate.pk,
+                claimed_at__isnull=True
+            ).update(claimed_at=timezone.now())
+            if claimed:
+                return candidate
+
+class DepositAddress(models.Model):
+    """Adresse de dépôt pré-dérivée, en attente d'attribution à un portefeuille"""
+    index = models.PositiveBigIntegerField(unique=True, help_text='Indice de dérivation BIP44')
+    address = models.CharField(max_length=42, unique=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = DepositAddressManager()
+
+    def __str__(self):
+        return f"{self.address} (#{self.index})"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['index'],
+                condition=models.Q(claimed_at__isnull=True),
+                name='deposit_address_free_idx'
+            ),
+        ]
+        verbose_name = "Adresse de dépôt"
+        verbose_name_plural = "Adresses de dépôt"
+
 class USDTWallet(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='usdt_wallet')
     address = models.CharField(max_length=42, unique=True, blank=True)
-    balance = models.DecimalField(
-        max_digits=20,
-        decimal_places=6,
-        default=Decimal('0'),
-        validators=[MinValueValidator(0)]
+    derivation_index = models.PositiveBigIntegerField(
+        unique=True,
+        null=True,
+        blank=True,
+        help_text='Indice de dérivation HD de l\'adresse'
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def generate_unique_address(self):
-        """Génère une adresse Ethereum unique"""
-        import secrets
-        import eth_account
-
-        while True:
-            # Générer une clé privée aléatoire
-            private_key = secrets.token_hex(32)
-            account = eth_account.Account.from_key(private_key)
-            address = account.address
-            
-            # Vérifier si l'adresse existe déjà
-            if not USDTWallet.objects.filter(address=address).exists():
-                return address
+    @property
+    def balance(self):
+        """
+        Solde courant : dernier instantané + somme des écritures plus récentes.
+        Utilise l'annotation ``ledger_balance`` si le queryset l'a fournie.
+        """
+        if getattr(self, 'ledger_balance', None) is None:
+            from .ledger import ledger_balance
+            self.ledger_balance = USDTWallet.objects.filter(pk=self.pk).annotate(
+                ledger_balance=ledger_balance()
+            ).values_list('ledger_balance', flat=True).get()
+        return self.ledger_balance
+
+    def record_entry(self, amount, usdt_transaction=None):
+        """Ajoute une écriture (positive ou négative) au registre du portefeuille"""
+        entry = BalanceEntry.objects.create(
+            wallet=self,
+            amount=amount,
+            usdt_transaction=usdt_transaction
+        )
+        self.ledger_balance = None
+        return entry
 
     def save(self, *args, **kwargs):
         if not self.address:
-            self.address = self.generate_unique_address()
+            deposit_address = DepositAddress.objects.claim()
+            self.address = deposit_address.address
+            self.derivation_index = deposit_address.index
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -125,6 +234,7 @@ class USDTTransaction(models.Model):
 
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
         ('COMPLETED', 'Completed'),
         ('FAILED', 'Failed'),
     ]
@@ -135,6 +245,45 @@ class USDTTransaction(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
     description = models.TextField(blank=True, null=True)
     tx_hash = models.CharField(max_length=100, blank=True, null=True)
+    log_index = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Position du log Transfer dans le bloc, pour les dépôts indexés'
+    )
+    to_address = models.CharField(
+        max_length=42,
+        blank=True,
+        null=True,
+        help_text='Adresse de destination des retraits'
+    )
+    investment = models.ForeignKey(
+        'Investment',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='withdrawals',
+        help_text='Investissement dont les bénéfices sont retirés'
+    )
+    nonce = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        help_text='Nonce attribué au transfert sortant'
+    )
+    signed_transaction = models.TextField(
+        null=True,
+        blank=True,
+        help_text='Transfert sortant signé, rediffusé s\'il n\'a pas atteint le noeud'
+    )
+    gas_price = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        help_text='Prix du gas (wei) du transfert sortant signé'
+    )
+    replaced_tx_hashes = models.JSONField(
+        default=list,
+        blank=True,
+        help_text='Hashs des signatures précédentes au même nonce, remplacées faute d\'être minées'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -143,6 +292,176 @@ class USDTTransaction(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                'wallet',
+                models.F('created_at').desc(),
+                models.F('id').desc(),
+                name='usdt_tx_wallet_history_idx'
+            ),
+            models.Index(fields=['wallet', 'transaction_type'], name='usdt_tx_wallet_type_idx'),
+            models.Index(
+                fields=['transaction_type', 'status', 'created_at'],
+                name='usdt_tx_type_status_idx'
+            ),
+        ]
+        constraints = [
+            # Une transaction blockchain ne peut être enregistrée qu'une seule fois
+            models.UniqueConstraint(
+                fields=['tx_hash'],
+                condition=models.Q(tx_hash__isnull=False, log_index__isnull=True),
+                name='unique_usdt_transaction_tx_hash'
+            ),
+            # ... ou, pour les dépôts indexés, une fois par log Transfer
+            models.UniqueConstraint(
+                fields=['tx_hash', 'log_index'],
+                condition=models.Q(log_index__isnull=False),
+                name='unique_usdt_transaction_tx_log'
+            )
+        ]
+
+class BalanceEntry(models.Model):
+    """Écriture du registre des soldes : les soldes ne sont jamais modifiés en place"""
+    wallet = models.ForeignKey(USDTWallet, on_delete=models.CASCADE, related_name='balance_entries')
+    amount = models.DecimalField(max_digits=20, decimal_places=6)
+    usdt_transaction = models.ForeignKey(
+        USDTTransaction,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='balance_entries'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.amount:+} USDT sur {self.wallet}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'id'], name='balance_entry_wallet_idx'),
+        ]
+
+class BalanceSnapshot(models.Model):
+    """Solde d'un portefeuille après application de toutes les écritures jusqu'à last_entry_id"""
+    wallet = models.ForeignKey(USDTWallet, on_delete=models.CASCADE, related_name='balance_snapshots')
+    balance = models.DecimalField(max_digits=20, decimal_places=6)
+    last_entry_id = models.PositiveBigIntegerField(default=0)
+    as_of = models.DateTimeField(help_text='Date de la dernière écriture incluse')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.wallet}: {self.balance} USDT au {self.as_of}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', '-last_entry_id'], name='balance_snapshot_wallet_idx'),
+            models.Index(fields=['wallet', '-as_of'], name='balance_snapshot_as_of_idx'),
+        ]
+
+class WalletNonce(models.Model):
+    """Prochain nonce à attribuer pour un wallet émetteur de la compagnie"""
+    address = models.CharField(max_length=42, unique=True)
+    next_nonce = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.address} (nonce {self.next_nonce})"
+
+class ReleasedNonce(models.Model):
+    """Nonce attribué puis jamais consommé, à réutiliser en priorité"""
+    address = models.CharField(max_length=42)
+    nonce = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['address', 'nonce'],
+                name='unique_released_nonce'
+            )
+        ]
+
+class IndexerCheckpoint(models.Model):
+    """Dernier bloc entièrement traité par un indexeur de la blockchain"""
+    name = models.CharField(max_length=50, unique=True)
+    last_block = models.PositiveBigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_block}"
+
+class LiquiditySnapshot(models.Model):
+    """Rapport de liquidité calculé par la commande liquidity_report, affiché dans l'administration"""
+    report = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Liquidité au {self.created_at:%Y-%m-%d %H:%M}"
+
+class IdempotencyKey(models.Model):
+    """Réponse enregistrée d'une requête portant un en-tête Idempotency-Key"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # None tant que la requête est en cours
+    response_body = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.key}"
+
+class RevokedAccessToken(models.Model):
+    """
+    Jeton d'accès révoqué avant son expiration (déconnexion).
+
+    Tenu à part de la liste noire de simplejwt, qui reçoit aussi chaque jeton de
+    rafraîchissement après rotation : seuls ces JTI peuvent être présentés à
+    l'authentification.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.jti
+
+class ReferralCommission(models.Model):
+    """Commission versée à un parrain pour un dépôt de son filleul"""
+    referrer = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='commissions_earned')
+    referee = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='commissions_generated')
+    deposit = models.OneToOneField(
+        USDTTransaction,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='referral_commission'
+    )
+    bonus_transaction = models.OneToOneField(
+        USDTTransaction,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='+'
+    )
+    amount = models.DecimalField(max_digits=20, decimal_places=6)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Commission de {self.amount} USDT pour {self.referrer.user.email}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['referrer', 'referee'], name='referral_comm_referrer_idx'),
+        ]
+        verbose_name = "Commission de parrainage"
+        verbose_name_plural = "Commissions de parrainage"
 
 class Investment(models.Model):
     STATUS_CHOICES = [
@@ -182,6 +501,12 @@ class Investment(models.Model):
         default='PENDING'
     )
     start_date = models.DateTimeField(null=True, blank=True)
+    accrued_earnings = models.DecimalField(
+        max_digits=20,
+        decimal_places=6,
+        default=Decimal('0'),
+        help_text='Gains accumulés depuis start_date, mis à jour par accrue_earnings'
+    )
     last_earnings_update = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -202,6 +527,16 @@ class Investment(models.Model):
     )
     
     class Meta:
+        indexes = [
+            models.Index(
+                'user',
+                models.F('created_at').desc(),
+                models.F('id').desc(),
+                name='investment_user_history_idx'
+            ),
+            models.Index(fields=['user', 'status'], name='investment_user_status_idx'),
+            models.Index(fields=['status', 'id'], name='investment_status_idx'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user'],
@@ -214,15 +549,24 @@ class Investment(models.Model):
         return f"{self.user.username} - {self.plan.name} ({self.status})"
 
     def calculate_earnings(self):
+        """Retourne les gains accumulés lors du dernier passage de accrue_earnings"""
         if self.status != 'ACTIVE' or not self.start_date:
             return Decimal('0')
-        
-        now = timezone.now()
-        days = (now - self.start_date).days
-        daily_return = self.plan.daily_return / Decimal('100')
-        total_earnings = self.amount_invested * daily_return * days
-        
-        return total_earnings
+
+        return self.accrued_earnings
+
+    def compute_current_earnings(self, now=None):
+        """Recalcule les gains accumulés à l'instant, sans attendre accrue_earnings"""
+        if self.status != 'ACTIVE' or not self.start_date:
+            return Decimal('0')
+
+        earnings, = compute_accrued_earnings(
+            [self.amount_invested],
+            [self.plan.daily_return],
+            [self.start_date],
+            now or timezone.now()
+        )
+        return earnings
 
     def get_available_earnings(self):
         """Calcule les bénéfices disponibles pour le retrait"""
@@ -300,3 +644,32 @@ def save_user_profile(sender, instance, **kwargs):
             instance.profile.save()
     except Exception:
         pass
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_auth_user_cache(sender, instance, **kwargs):
+    """Signal pour retirer l'utilisateur du cache d'authentification"""
+    from .authentication import invalidate_user
+    invalidate_user(instance.pk)
+
+@receiver([post_save, post_delete], sender=InvestmentPlan)
+def invalidate_plan_catalog(sender, **kwargs):
+    """Signal pour invalider le catalogue des plans en cache"""
+    from .catalog import plan_catalog
+    from .usercache import invalidate_all
+    # Après le commit : une requête concurrente rechargerait sinon les anciennes
+    # lignes et les mettrait en cache sous la nouvelle version
+    transaction.on_commit(plan_catalog.invalidate)
+    # Les réponses par utilisateur incluent le détail des plans
+    invalidate_all()
+
+@receiver([post_save, post_delete], sender=Investment)
+def invalidate_investment_user_cache(sender, instance, **kwargs):
+    """Signal pour invalider les réponses en cache de l'investisseur"""
+    from .usercache import invalidate_users
+    invalidate_users([instance.user_id])
+
+@receiver([post_save, post_delete], sender=USDTTransaction)
+def invalidate_transaction_user_cache(sender, instance, **kwargs):
+    """Signal pour invalider les réponses en cache du titulaire du portefeuille"""
+    from .usercache import invalidate_users
+    invalidate_users([instance.wallet.user_id])
@@ -0,0 +1,89 @@
+"""
+Attribution locale des nonces du wallet de la compagnie.
+
+Les nonces sont distribués à partir d'un compteur en base : l'incrément est
+un UPDATE exécuté dans une transaction, ce qui le rend atomique entre threads
+et entre processus (verrou de ligne, ou verrou d'écriture sous SQLite). Les
+nonces attribués mais jamais diffusés sont remis dans ``ReleasedNonce`` et
+réutilisés en priorité afin de ne pas laisser de trou bloquant les
+transactions suivantes.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import WalletNonce, ReleasedNonce, USDTTransaction
+
+
+class NonceManager:
+    def __init__(self, address):
+        self.address = address
+
+    def _counter(self):
+        """
+        Verrouille le compteur jusqu'à la fin de la transaction en cours :
+        attributions et resynchronisations sont ainsi sérialisées.
+        """
+        WalletNonce.objects.get_or_create(address=self.address)
+        return WalletNonce.objects.select_for_update().get(address=self.address)
+
+    def allocate(self):
+        """
+        Attribue le prochain nonce disponible.
+
+        À appeler dans la transaction qui enregistre le nonce sur le retrait :
+        sinon sync_with_chain pourrait le voir comme un trou et le redistribuer.
+        """
+        with transaction.atomic():
+            self._counter()
+
+            # Réutiliser d'abord le plus petit nonce libéré
+            released = ReleasedNonce.objects.filter(address=self.address).order_by('nonce').first()
+            while released is not None:
+                deleted, _ = ReleasedNonce.objects.filter(pk=released.pk).delete()
+                if deleted:
+                    return released.nonce
+                released = ReleasedNonce.objects.filter(address=self.address).order_by('nonce').first()
+
+            WalletNonce.objects.filter(address=self.address).update(next_nonce=F('next_nonce') + 1)
+            return WalletNonce.objects.get(address=self.address).next_nonce - 1
+
+    def sync_with_chain(self, client):
+        """
+        Resynchronise le compteur avec la blockchain.
+
+        - si des transactions ont été envoyées hors de ce gestionnaire, le
+          compteur est avancé jusqu'au nonce du noeud ;
+        - les nonces libérés déjà consommés sont supprimés ;
+        - les nonces situés entre le nonce du noeud et le compteur qui ne sont
+          portés par aucun retrait en cours sont considérés comme des trous
+          et remis en circulation.
+        """
+        chain_nonce = client.w3.eth.get_transaction_count(self.address, 'pending')
+
+        with transaction.atomic():
+            self._counter()
+            WalletNonce.objects.filter(
+                address=self.address,
+                next_nonce__lt=chain_nonce
+            ).update(next_nonce=chain_nonce)
+            ReleasedNonce.objects.filter(address=self.address, nonce__lt=chain_nonce).delete()
+
+            next_nonce = WalletNonce.objects.get(address=self.address).next_nonce
+            in_use = set(
+                USDTTransaction.objects.filter(
+                    transaction_type='WITHDRAWAL',
+                    status__in=['PENDING', 'PROCESSING'],
+                    nonce__gte=chain_nonce,
+                    nonce__lt=next_nonce
+                ).values_list('nonce', flat=True)
+            )
+            released = set(
+                ReleasedNonce.objects.filter(address=self.address).values_list('nonce', flat=True)
+            )
+            gaps = set(range(chain_nonce, next_nonce)) - in_use - released
+            ReleasedNonce.objects.bulk_create(
+                [ReleasedNonce(address=self.address, nonce=nonce) for nonce in sorted(gaps)],
+                ignore_conflicts=True
+            )
+
+        return chain_nonce
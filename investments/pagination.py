@@ -0,0 +1,24 @@
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+
+class ReferralPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_page_metadata(self):
+        """Métadonnées de pagination à fusionner dans une réponse existante"""
+        return {
+            'count': self.page.paginator.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+
+class HistoryCursorPagination(CursorPagination):
+    """
+    Pagination par curseur sur (created_at, id) : le coût d'une page profonde
+    est identique à celui de la première grâce aux index composites.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
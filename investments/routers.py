@@ -0,0 +1,116 @@
+"""
+Routage des lectures vers une réplique de la base.
+
+Les actions en lecture seule (GET, HEAD, OPTIONS) des vues de l'API lisent
+sur l'alias ``settings.REPLICA_DATABASE`` lorsqu'il est configuré ; toutes
+les écritures vont sur ``default``. Après une écriture réussie, l'utilisateur
+est épinglé sur la base principale pendant ``REPLICA_STICKY_SECONDS`` afin de
+relire ses propres écritures malgré le retard de réplication. L'épinglage est
+stocké dans le cache par défaut, qui doit donc être partagé entre les workers.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import permissions, status
+
+PIN_KEY = 'replica-pin:{}'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def pin_to_primary(user_id):
+    """Force les lectures de l'utilisateur sur la base principale pendant un court délai"""
+    if settings.REPLICA_DATABASE and user_id is not None:
+        cache.set(PIN_KEY.format(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def start_replica_reads(request):
+    """
+    Active la lecture sur la réplique pour une requête en lecture seule d'un
+    utilisateur non épinglé.
+
+    Returns:
+        Token à passer à ``end_replica_reads``, ou None
+    """
+    if (
+        not settings.REPLICA_DATABASE
+        or request.method not in permissions.SAFE_METHODS
+        or (request.user.is_authenticated and cache.get(PIN_KEY.format(request.user.pk)))
+    ):
+        return None
+    return _use_replica.set(True)
+
+
+def end_replica_reads(request, response, token):
+    if token is not None:
+        _use_replica.reset(token)
+    elif (
+        request.method not in permissions.SAFE_METHODS
+        and status.is_success(response.status_code)
+        and request.user.is_authenticated
+    ):
+        pin_to_primary(request.user.pk)
+
+
+@contextmanager
+def primary_reads():
+    """
+    Lectures sur la base principale dans le bloc, même au sein d'une requête
+    routée vers la réplique (construction des réponses mises en cache).
+    """
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return settings.REPLICA_DATABASE
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplique est une copie de la base principale
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+class ReplicaReadMixin:
+    """Mixin de vue DRF : lectures sur la réplique, épinglage après une écriture"""
+
+    def initial(self, request, *args, **kwargs):
+        # L'authentification et les permissions lisent toujours la base principale
+        super().initial(request, *args, **kwargs)
+        self._replica_token = start_replica_reads(request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        end_replica_reads(request, response, getattr(self, '_replica_token', None))
+        self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def read_from_replica(view_func):
+    """Équivalent de ``ReplicaReadMixin`` pour les vues ``@api_view``"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        token = start_replica_reads(request)
+        try:
+            response = view_func(request, *args, **kwargs)
+        except Exception:
+            if token is not None:
+                _use_replica.reset(token)
+            raise
+        end_replica_reads(request, response, token)
+        return response
+
+    return wrapper
@@ -7,9 +7,14 @@ from .models import (
     UserProfile
 )
 from django.contrib.auth.models import User
-from django.db.models import Sum
+from django.db.models import Sum, Q, Prefetch, DecimalField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 from rest_framework.validators import UniqueValidator
+from .ledger import ledger_balance
+from .catalog import plan_catalog
+from .earnings import MAX_PROJECTION_DAYS
+from web3 import Web3
 
 class InvestmentPlanSerializer(serializers.ModelSerializer):
     class Meta:
@@ -28,6 +33,8 @@ class InvestmentPlanSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 class USDTWalletSerializer(serializers.ModelSerializer):
+    balance = serializers.DecimalField(max_digits=20, decimal_places=6, read_only=True)
+
     class Meta:
         model = USDTWallet
         fields = [
@@ -49,16 +56,38 @@ class USDTTransactionSerializer(serializers.ModelSerializer):
             'transaction_type',
             'amount',
             'tx_hash',
+            'to_address',
             'status',
             'created_at',
             'updated_at'
         ]
-        read_only_fields = ['wallet', 'status', 'created_at', 'updated_at']
+        read_only_fields = ['wallet', 'status', 'to_address', 'created_at', 'updated_at']
+
+class CatalogPlanField(serializers.PrimaryKeyRelatedField):
+    """Résout un identifiant de plan depuis le catalogue en cache plutôt qu'en base"""
+
+    def __init__(self, active_only=False, **kwargs):
+        self.active_only = active_only
+        kwargs.setdefault('queryset', InvestmentPlan.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+        plan = plan_catalog.get_plan(pk)
+        if plan is None or (self.active_only and not plan.is_active):
+            self.fail('does_not_exist', pk_value=data)
+        return plan
 
 class InvestmentSerializer(serializers.ModelSerializer):
     plan = InvestmentPlanSerializer(read_only=True)
-    plan_id = serializers.PrimaryKeyRelatedField(
-        queryset=InvestmentPlan.objects.filter(is_active=True),
+    plan_id = CatalogPlanField(
+        active_only=True,
         source='plan',
         write_only=True
     )
@@ -216,7 +245,18 @@ class WithdrawSerializer(serializers.Serializer):
             raise serializers.ValidationError("Le montant doit être supérieur à 0")
         return value
 
+    def validate_wallet_address(self, value):
+        if not Web3.is_address(value):
+            raise serializers.ValidationError("Adresse de portefeuille invalide")
+        return Web3.to_checksum_address(value)
+
 class UserDetailSerializer(serializers.ModelSerializer):
+    """
+    Résumé du portefeuille de l'utilisateur.
+
+    Attend une instance issue de ``get_queryset()`` : le wallet, les
+    investissements (avec leur plan) et les totaux y sont déjà chargés.
+    """
     wallet = serializers.SerializerMethodField()
     investments = serializers.SerializerMethodField()
     total_invested = serializers.SerializerMethodField()
@@ -229,15 +269,33 @@ class UserDetailSerializer(serializers.ModelSerializer):
                  'date_joined', 'wallet', 'investments', 'total_invested',
                  'total_earnings', 'total_withdrawn')
 
+    @staticmethod
+    def get_queryset():
+        return User.objects.select_related('usdt_wallet').prefetch_related(
+            Prefetch('investments', queryset=Investment.objects.select_related('plan'))
+        ).annotate(
+            invested_sum=Coalesce(Sum('investments__amount_invested'), Decimal('0'), output_field=DecimalField()),
+            earnings_sum=Coalesce(
+                Sum('investments__accrued_earnings', filter=Q(investments__status='ACTIVE')),
+                Decimal('0'),
+                output_field=DecimalField()
+            ),
+            withdrawn_sum=Coalesce(Sum('investments__total_withdrawn'), Decimal('0'), output_field=DecimalField()),
+            wallet_balance=ledger_balance('usdt_wallet'),
+        )
+
     def get_wallet(self, obj):
-        wallet, created = USDTWallet.objects.get_or_create(user=obj)
+        try:
+            wallet = obj.usdt_wallet
+            wallet.ledger_balance = obj.wallet_balance
+        except USDTWallet.DoesNotExist:
+            wallet = USDTWallet.objects.create(user=obj)
         return {
             'address': wallet.address,
             'balance': wallet.balance
         }
 
     def get_investments(self, obj):
-        investments = Investment.objects.filter(user=obj)
         return [{
             'id': inv.id,
             'plan': inv.plan.name,
@@ -248,21 +306,23 @@ class UserDetailSerializer(serializers.ModelSerializer):
             'current_earnings': inv.calculate_earnings(),
             'available_earnings': inv.get_available_earnings(),
             'total_withdrawn': inv.total_withdrawn
-        } for inv in investments]
+        } for inv in obj.investments.all()]
 
     def get_total_invested(self, obj):
-        return Investment.objects.filter(user=obj).aggregate(
-            total=Sum('amount_invested'))['total'] or Decimal('0')
+        return obj.invested_sum
 
     def get_total_earnings(self, obj):
-        active_investments = Investment.objects.filter(user=obj, status='ACTIVE')
-        return sum(inv.calculate_earnings() for inv in active_investments)
+        return obj.earnings_sum
 
     def get_total_withdrawn(self, obj):
-        return Investment.objects.filter(user=obj).aggregate(
-            total=Sum('total_withdrawn'))['total'] or Decimal('0')
+        return obj.withdrawn_sum
 
 class ReferralUserSerializer(serializers.ModelSerializer):
+    """
+    Filleul d'un parrain, avec ses dépôts et la commission générée.
+
+    Attend une instance issue de ``get_queryset(referrer)``.
+    """
     total_deposits = serializers.SerializerMethodField()
     commission_earned = serializers.SerializerMethodField()
 
@@ -270,32 +330,38 @@ class ReferralUserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('email', 'date_joined', 'total_deposits', 'commission_earned')
 
-    def get_total_deposits(self, obj):
-        return USDTTransaction.objects.filter(
-            wallet__user=obj,
+    @staticmethod
+    def get_queryset(referrer):
+        deposits = USDTTransaction.objects.filter(
+            wallet__user=OuterRef('pk'),
             transaction_type='DEPOSIT'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+        ).order_by().values('wallet__user').annotate(total=Sum('amount')).values('total')
+
+        return User.objects.filter(profile__referred_by=referrer).annotate(
+            deposits_sum=Coalesce(Subquery(deposits), Decimal('0'), output_field=DecimalField()),
+            commission_sum=Coalesce(
+                Sum(
+                    'profile__commissions_generated__amount',
+                    filter=Q(profile__commissions_generated__referrer=referrer)
+                ),
+                Decimal('0'),
+                output_field=DecimalField()
+            ),
+        ).order_by('-date_joined', '-pk')
+
+    def get_total_deposits(self, obj):
+        return obj.deposits_sum
 
     def get_commission_earned(self, obj):
-        return USDTTransaction.objects.filter(
-            wallet__user=obj.profile.referred_by.user,
-            transaction_type='REFERRAL_BONUS',
-            description__contains=obj.email
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+        return obj.commission_sum
 
 class ReferralProfileSerializer(serializers.ModelSerializer):
-    referrals = serializers.SerializerMethodField()
-
     class Meta:
         model = UserProfile
-        fields = ('referral_code', 'total_referral_earnings', 'referrals')
-
-    def get_referrals(self, obj):
-        referred_users = User.objects.filter(profile__referred_by=obj)
-        return ReferralUserSerializer(referred_users, many=True).data
+        fields = ('referral_code', 'total_referral_earnings')
 
 class InvestmentUpgradeSerializer(serializers.Serializer):
-    new_plan = serializers.PrimaryKeyRelatedField(queryset=InvestmentPlan.objects.all())
+    new_plan = CatalogPlanField()
     additional_amount = serializers.DecimalField(max_digits=20, decimal_places=6, required=False, default=0)
 
     def validate(self, data):
@@ -329,3 +395,36 @@ class InvestmentUpgradeSerializer(serializers.Serializer):
                 )
 
         return data
+
+class ProjectionSerializer(serializers.Serializer):
+    """Paramètres d'une projection des gains (chaîne de requête)"""
+    days = serializers.IntegerField(min_value=1, max_value=MAX_PROJECTION_DAYS, default=365)
+    upgrade_day = serializers.IntegerField(min_value=0, required=False)
+    # Mêmes bornes que Investment.amount_invested : les projections restent
+    # dans les limites de l'arithmétique entière sur 64 bits
+    additional_amount = serializers.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=0,
+        default=Decimal('0')
+    )
+
+    def validate(self, data):
+        if data.get('upgrade_day') is not None and data['upgrade_day'] > data['days']:
+            raise serializers.ValidationError(
+                "Le jour de mise à niveau doit être compris dans l'horizon de projection"
+            )
+        return data
+
+class PlanProjectionSerializer(ProjectionSerializer):
+    """Projection d'un investissement hypothétique"""
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    plan = CatalogPlanField(active_only=True, required=False)
+
+    def validate(self, data):
+        data = super().validate(data)
+        if data.get('upgrade_day') is not None and data.get('plan') is None:
+            raise serializers.ValidationError(
+                "Le plan de départ est requis pour simuler une mise à niveau"
+            )
+        return data
@@ -1,3 +1,1238 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import re
+import sqlite3
+import threading
+import time
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db import router
+from django.db.models import QuerySet
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import Permission, User
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+import numpy as np
+from web3 import Web3
+from .models import (
+    InvestmentPlan, Investment, USDTWallet, USDTTransaction, UserProfile, ReferralTreePath, IndexerCheckpoint,
+    DepositAddress, BalanceEntry, RevokedAccessToken, LiquiditySnapshot, ReferralCommission
+)
+from . import blockchain, usercache
+from .authentication import AUTH_USER_KEY, revoked_tokens
+from .blockchain import (
+    TRANSFER_TOPIC, BlockchainClient, decode_transfer_log, get_blockchain_client, get_async_blockchain_client
+)
+from .catalog import PlanCatalog, plan_catalog
+from .deposits import REFERRAL_COMMISSION_RATE, credit_deposits
+from .exports import stream_csv
+from .earnings import compute_accrued_earnings
+from .hdwallet import derive_address
+from .routers import start_replica_reads, end_replica_reads
+from .indexer import CHECKPOINT_NAME, index_new_blocks
+from .ledger import ledger_balance, balance_at, compact_balances
+from .nonces import NonceManager
+from .pagination import HistoryCursorPagination
+from .verification import VerificationCache, verification_cache, verify_transaction
+from .withdrawals import (
+    reserve_withdrawal, broadcast_pending_withdrawals, confirm_broadcast_withdrawals, reprice_stuck_withdrawals
+)
+from .liquidity import load_positions, project_obligations, simulate_withdrawals
 
-# Create your tests here.
+class UserDetailViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice@example.com', email='alice@example.com')
+        self.wallet = USDTWallet.objects.create(user=self.user)
+        self.wallet.record_entry(Decimal('500'))
+        self.plan = InvestmentPlan.objects.get(level=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def create_investments(self, count):
+        for _ in range(count):
+            Investment.objects.create(
+                user=self.user,
+                plan=self.plan,
+                amount_invested=Decimal('100'),
+                total_withdrawn=Decimal('1'),
+                status='COMPLETED',
+                start_date=timezone.now()
+            )
+
+    def test_query_budget_does_not_depend_on_investment_count(self):
+        self.create_investments(1)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('user-detail'))
+
+        self.create_investments(10)
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('user-detail'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['investments']), 11)
+        self.assertEqual(response.data['total_invested'], Decimal('1100'))
+        self.assertEqual(response.data['total_withdrawn'], Decimal('11'))
+        self.assertEqual(response.data['wallet']['balance'], Decimal('500'))
+
+    def test_repeat_polls_are_served_from_cache_until_a_write(self):
+        self.client.get(reverse('user-detail'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('user-detail'))
+        self.assertEqual(response.data['total_invested'], Decimal('0'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_investments(1)
+
+        response = self.client.get(reverse('user-detail'))
+        self.assertEqual(response.data['total_invested'], Decimal('100'))
+
+    def test_referee_deposit_invalidates_referrer_cache(self):
+        referee = User.objects.create_user(username='dave@example.com', email='dave@example.com')
+        referee.profile.referred_by = self.user.profile
+        referee.profile.save()
+        referee_wallet = USDTWallet.objects.create(user=referee)
+
+        url = '/api/profile/referrals/'
+        response = self.client.get(url)
+        self.assertEqual(response.data['referrals'][0]['total_deposits'], Decimal('0'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            credit_deposits([(referee_wallet, Decimal('200'), '0x' + 'ab' * 32)])
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['referrals'][0]['total_deposits'], Decimal('200'))
+        self.assertEqual(response.data['referrals'][0]['commission_earned'], Decimal('10'))
+
+class ReferralCommissionTests(TestCase):
+    def setUp(self):
+        self.referrer = User.objects.create_user(username='olga@example.com', email='olga@example.com')
+        USDTWallet.objects.create(user=self.referrer)
+        self.referees = []
+        for name in ('pia', 'quinn', 'rosa'):
+            referee = User.objects.create_user(username=f'{name}@example.com', email=f'{name}@example.com')
+            referee.profile.referred_by = self.referrer.profile
+            referee.profile.save()
+            USDTWallet.objects.create(user=referee)
+            self.referees.append(referee)
+        cache.clear()
+
+    def test_deposit_writes_one_commission(self):
+        referee = self.referees[0]
+        outsider = User.objects.create_user(username='sam@example.com', email='sam@example.com')
+        deposit, _ = credit_deposits([
+            (referee.usdt_wallet, Decimal('200'), '0x' + '01' * 32),
+            (USDTWallet.objects.create(user=outsider), Decimal('300'), '0x' + '02' * 32),
+        ])
+
+        commission = ReferralCommission.objects.get()
+        self.assertEqual(commission.referrer, self.referrer.profile)
+        self.assertEqual(commission.referee, referee.profile)
+        self.assertEqual(commission.deposit, deposit)
+        self.assertEqual(commission.amount, Decimal('200') * REFERRAL_COMMISSION_RATE)
+        self.assertEqual(commission.amount, Decimal('10'))
+        self.assertEqual(commission.bonus_transaction.transaction_type, 'REFERRAL_BONUS')
+        self.assertEqual(commission.bonus_transaction.wallet, self.referrer.usdt_wallet)
+        self.assertEqual(commission.bonus_transaction.amount, Decimal('10'))
+
+        self.referrer.profile.refresh_from_db()
+        self.assertEqual(self.referrer.profile.total_referral_earnings, Decimal('10'))
+        self.assertEqual(ledger_balances(self.referrer.usdt_wallet), (Decimal('10'),))
+
+    def test_referrals_endpoint_paginates_and_totals_from_commissions(self):
+        pia, quinn, rosa = self.referees
+        credit_deposits([
+            (pia.usdt_wallet, Decimal('100'), '0x' + '03' * 32),
+            (pia.usdt_wallet, Decimal('60'), '0x' + '04' * 32),
+            (rosa.usdt_wallet, Decimal('40'), '0x' + '05' * 32),
+        ])
+        # Commission saisie à la main : le total vient bien de la table des commissions
+        ReferralCommission.objects.create(referrer=self.referrer.profile, referee=quinn.profile, amount=Decimal('7'))
+        # Commission d'un autre parrain pour le même filleul : non comptée
+        other = User.objects.create_user(username='tom@example.com', email='tom@example.com')
+        ReferralCommission.objects.create(referrer=other.profile, referee=pia.profile, amount=Decimal('99'))
+
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.referrer.pk))
+        first = client.get('/api/profile/referrals/', {'page_size': 2})
+        second = client.get('/api/profile/referrals/', {'page_size': 2, 'page': 2})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['count'], 3)
+        self.assertIsNotNone(first.data['next'])
+        self.assertIsNone(second.data['next'])
+
+        rows = {
+            row['email']: (row['total_deposits'], row['commission_earned'])
+            for row in first.data['referrals'] + second.data['referrals']
+        }
+        self.assertEqual(rows, {
+            'pia@example.com': (Decimal('160'), Decimal('8')),
+            'quinn@example.com': (Decimal('0'), Decimal('7')),
+            'rosa@example.com': (Decimal('40'), Decimal('2')),
+        })
+        self.assertEqual(Decimal(first.data['total_referral_earnings']), Decimal('10'))
+
+class ReferralTreeTests(TestCase):
+    def make_profile(self, name, referrer=None, deposit=None):
+        user = User.objects.create_user(username=f'{name}@example.com', email=f'{name}@example.com')
+        if referrer is not None:
+            ReferralTreePath.objects.attach(user.profile, referrer)
+        if deposit is not None:
+            wallet = USDTWallet.objects.create(user=user)
+            USDTTransaction.objects.create(
+                wallet=wallet, transaction_type='DEPOSIT', amount=Decimal(deposit), status='COMPLETED'
+            )
+        return user.profile
+
+    def test_attach_and_downline_levels(self):
+        root = self.make_profile('root')
+        left = self.make_profile('left', root)
+        right = self.make_profile('right', root, deposit='50')
+        middle = self.make_profile('middle', left, deposit='100')
+        leaf = self.make_profile('leaf', middle)
+        self.make_profile('pending', leaf, deposit='7')
+
+        self.assertEqual(
+            dict(ReferralTreePath.objects.filter(descendant=leaf).values_list('ancestor', 'depth')),
+            {middle.pk: 1, left.pk: 2, root.pk: 3}
+        )
+        self.assertEqual(
+            sorted(ReferralTreePath.objects.filter(ancestor=root).values_list('depth', flat=True)),
+            [1, 1, 2, 3, 4]
+        )
+
+        client = APIClient()
+        client.force_authenticate(root.user)
+        response = client.get('/api/profile/downline/', {'depth': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(level['depth'], level['members'], Decimal(level['volume'])) for level in response.data['levels']],
+            [(1, 2, Decimal('50')), (2, 1, Decimal('100')), (3, 1, Decimal('0'))]
+        )
+        self.assertEqual(response.data['total_members'], 4)
+
+class SharedBlockchainClientTests(TestCase):
+    def test_one_client_per_process_across_threads(self):
+        with mock.patch.dict(blockchain._clients, clear=True):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                clients = list(executor.map(lambda _: get_blockchain_client(), range(16)))
+
+            self.assertEqual(len({id(client) for client in clients}), 1)
+            self.assertIs(get_blockchain_client(), clients[0])
+            self.assertIsNot(get_async_blockchain_client(), clients[0])
+
+HARDHAT_MNEMONIC = 'test test test test test test test test test test test junk'
+
+@override_settings(HD_WALLET_MNEMONIC=HARDHAT_MNEMONIC)
+class DepositAddressPoolTests(TestCase):
+    def test_derive_address_is_deterministic(self):
+        self.assertEqual(derive_address(0), '0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266')
+        self.assertEqual(derive_address(1), '0x70997970C51812dc3A010C7d01b50e0d17dc79C8')
+        self.assertEqual(derive_address(1), derive_address(1))
+
+    def test_claim_never_hands_out_a_row_twice(self):
+        DepositAddress.objects.fill(3)
+        first = QuerySet.first
+        raced = []
+
+        def first_then_race(queryset):
+            candidate = first(queryset)
+            if queryset.model is DepositAddress and candidate is not None and not raced:
+                # Un autre appelant réclame la même adresse entre la lecture et la mise à jour
+                raced.append(DepositAddress.objects.filter(pk=candidate.pk).update(claimed_at=timezone.now()))
+            return candidate
+
+        with mock.patch.object(QuerySet, 'first', first_then_race):
+            claimed = DepositAddress.objects.claim()
+
+        self.assertEqual(claimed.index, 1)
+        self.assertEqual([DepositAddress.objects.claim().index for _ in range(2)], [2, 3])
+        self.assertEqual(DepositAddress.objects.filter(claimed_at__isnull=True).count(), 0)
+
+    def test_empty_pool_derives_an_address_on_the_fly(self):
+        self.assertFalse(DepositAddress.objects.exists())
+        wallet = USDTWallet.objects.create(
+            user=User.objects.create_user(username='nina@example.com', email='nina@example.com')
+        )
+        self.assertEqual((wallet.derivation_index, wallet.address), (0, derive_address(0)))
+        self.assertIsNotNone(DepositAddress.objects.get(index=0).claimed_at)
+        self.assertEqual(DepositAddress.objects.fill(1)[0].index, 1)
+
+class BalanceLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='olga@example.com', email='olga@example.com')
+        self.wallet = USDTWallet.objects.create(user=self.user)
+
+    def entry(self, amount, when):
+        entry = self.wallet.record_entry(Decimal(amount))
+        BalanceEntry.objects.filter(pk=entry.pk).update(created_at=when)
+        return entry
+
+    def balance(self):
+        return USDTWallet.objects.get(pk=self.wallet.pk).balance
+
+    def test_compaction_and_balance_at(self):
+        now = timezone.now()
+        self.entry('100', now - timedelta(days=3))
+        second = self.entry('-30', now - timedelta(days=2))
+
+        self.assertEqual(compact_balances(second.pk), 1)
+        self.assertEqual(compact_balances(second.pk), 0)
+        self.entry('5', now - timedelta(days=1))
+
+        self.assertEqual(self.balance(), Decimal('75'))
+        self.assertEqual(balance_at(self.wallet, now - timedelta(days=2, hours=12)), Decimal('100'))
+        self.assertEqual(balance_at(self.wallet, now - timedelta(days=1, hours=12)), Decimal('70'))
+        self.assertEqual(balance_at(self.wallet, now), Decimal('75'))
+
+        self.assertEqual(compact_balances(BalanceEntry.objects.latest('pk').pk), 1)
+        self.assertEqual(self.balance(), Decimal('75'))
+        self.assertEqual(balance_at(self.wallet, now - timedelta(days=1, hours=12)), Decimal('70'))
+
+    def test_debit_rechecks_the_balance_inside_the_transaction(self):
+        self.wallet.record_entry(Decimal('50'))
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        # Le solde lu lors de la validation est périmé (débit concurrent)
+        with mock.patch.object(USDTWallet, 'balance', Decimal('1000')):
+            response = client.post('/api/my-investments/', {
+                'plan_id': InvestmentPlan.objects.get(level=1).pk, 'amount_invested': '100'
+            }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.balance(), Decimal('50'))
+        self.assertFalse(Investment.objects.filter(user=self.user).exists())
+
+class HistoryPaginationTests(TestCase):
+    def test_cursor_pages_are_newest_first_with_ties_broken_by_id(self):
+        user = User.objects.create_user(username='paul@example.com', email='paul@example.com')
+        wallet = USDTWallet.objects.create(user=user)
+        now = timezone.now()
+        ids = []
+        for age in (5, 4, 3, 3, 1):
+            tx = USDTTransaction.objects.create(wallet=wallet, transaction_type='DEPOSIT', amount=Decimal('1'))
+            USDTTransaction.objects.filter(pk=tx.pk).update(created_at=now - timedelta(hours=age))
+            ids.append(tx.pk)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        pages = []
+        response = client.get('/api/transactions/', {'page_size': 2})
+        while True:
+            pages.append([item['id'] for item in response.data['results']])
+            if not response.data['next']:
+                break
+            response = client.get(response.data['next'])
+
+        self.assertEqual(pages, [[ids[4], ids[3]], [ids[2], ids[1]], [ids[0]]])
+
+        request = Request(APIRequestFactory().get('/api/transactions/', {'page_size': 1000}))
+        self.assertEqual(HistoryCursorPagination().get_page_size(request), HistoryCursorPagination.max_page_size)
+
+class PlanCatalogTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='carol@example.com', email='carol@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        plan_catalog.invalidate()
+
+    def test_list_is_served_from_cache_with_etag(self):
+        response = self.client.get('/api/plans/')
+        etag = response['ETag']
+        self.assertEqual(response.status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/plans/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        plan = InvestmentPlan.objects.get(level=1)
+        plan.name = 'Plan renommé'
+        with self.captureOnCommitCallbacks(execute=True):
+            plan.save()
+            # Avant le commit, le catalogue en cache reste servi
+            response = self.client.get('/api/plans/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/api/plans/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Plan renommé', [item['name'] for item in response.data])
+
+    def test_invalidation_reaches_other_processes(self):
+        etag = self.client.get('/api/plans/')['ETag']
+        InvestmentPlan.objects.filter(level=1).update(name='Plan renommé ailleurs')
+
+        # Catalogue d'un autre worker, invalidé après sa propre écriture
+        PlanCatalog(ttl=300).invalidate()
+
+        response = self.client.get('/api/plans/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Plan renommé ailleurs', [item['name'] for item in response.data])
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frank@example.com', email='frank@example.com')
+        self.wallet = USDTWallet.objects.create(user=self.user)
+        self.wallet.record_entry(Decimal('500'))
+        self.plan = InvestmentPlan.objects.get(level=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def invest(self, key, amount):
+        return self.client.post(
+            '/api/my-investments/',
+            {'plan_id': self.plan.pk, 'amount_invested': amount},
+            format='json',
+            HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_first_response_without_writing(self):
+        amount = str(self.plan.minimum_investment)
+        first = self.invest('retry-1', amount)
+        self.assertEqual(first.status_code, 201)
+
+        with self.assertNumQueries(1):
+            retry = self.invest('retry-1', amount)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Investment.objects.filter(user=self.user).count(), 1)
+
+        self.assertEqual(self.invest('retry-1', '300').status_code, 422)
+
+class EarningsAccrualTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='gina@example.com', email='gina@example.com')
+        USDTWallet.objects.create(user=self.user)
+        self.plan = InvestmentPlan.objects.get(level=1)
+        self.now = timezone.now()
+
+    def test_engine_is_exact_and_counts_whole_days(self):
+        earnings = compute_accrued_earnings(
+            [Decimal('1234.56'), Decimal('1234.56'), Decimal('100')],
+            [Decimal('0.333'), Decimal('0.333'), Decimal('0.05')],
+            [self.now - timedelta(days=10, hours=23), self.now - timedelta(hours=23), self.now + timedelta(days=1)],
+            self.now
+        )
+        self.assertEqual(earnings, [Decimal('41.110848'), Decimal('0'), Decimal('0')])
+
+    def test_accrue_earnings_command_stores_earnings(self):
+        investment = Investment.objects.create(
+            user=self.user, plan=self.plan, amount_invested=Decimal('1000'),
+            status='ACTIVE', start_date=self.now - timedelta(days=3, hours=1)
+        )
+        call_command('accrue_earnings', stdout=io.StringIO())
+
+        investment.refresh_from_db()
+        self.assertEqual(investment.accrued_earnings, Decimal('1.5'))
+
+    def test_accrual_skips_investment_upgraded_during_the_run(self):
+        investment = Investment.objects.create(
+            user=self.user, plan=self.plan, amount_invested=Decimal('1000'),
+            status='ACTIVE', start_date=self.now - timedelta(days=5, hours=1)
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        def upgrade_then_compute(*args):
+            response = client.post(
+                f'/api/my-investments/{investment.pk}/upgrade/',
+                {'new_plan': InvestmentPlan.objects.get(level=2).pk},
+                format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            return compute_accrued_earnings(*args)
+
+        with mock.patch(
+            'investments.management.commands.accrue_earnings.compute_accrued_earnings',
+            side_effect=upgrade_then_compute
+        ):
+            call_command('accrue_earnings', stdout=io.StringIO())
+
+        investment.refresh_from_db()
+        self.assertEqual(investment.accrued_earnings, Decimal('0'))
+        self.assertEqual(investment.current_value, Decimal('1002.50'))
+
+    def test_upgrade_keeps_earnings_since_last_accrual(self):
+        investment = Investment.objects.create(
+            user=self.user, plan=self.plan, amount_invested=Decimal('1000'),
+            status='ACTIVE', start_date=self.now - timedelta(days=5, hours=1)
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(
+            f'/api/my-investments/{investment.pk}/upgrade/',
+            {'new_plan': InvestmentPlan.objects.get(level=2).pk},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        investment.refresh_from_db()
+        self.assertEqual(investment.current_value, Decimal('1002.50'))
+        self.assertEqual(investment.accrued_earnings, Decimal('0'))
+
+class EarningsProjectionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ivan@example.com', email='ivan@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        plan_catalog.invalidate()
+
+    def test_projection_compares_every_active_plan(self):
+        response = self.client.get('/api/plans/projection/', {'amount': '1000', 'days': 730})
+        self.assertEqual(response.status_code, 200)
+
+        plans = InvestmentPlan.objects.filter(is_active=True).order_by('level')
+        self.assertEqual([p['plan_id'] for p in response.data['projections']], [plan.id for plan in plans])
+        for plan, projection in zip(plans, response.data['projections']):
+            self.assertEqual(len(projection['earnings']), 731)
+            expected = Decimal('1000') * plan.daily_return / 100 * 730
+            self.assertAlmostEqual(projection['earnings'][730], float(expected), places=6)
+            self.assertAlmostEqual(projection['value'][730], float(1000 + expected), places=6)
+
+    def test_upgrade_resets_earnings_and_keeps_them_in_value(self):
+        base = InvestmentPlan.objects.filter(is_active=True).order_by('level').first()
+        response = self.client.get('/api/plans/projection/', {
+            'amount': '1000', 'plan': base.id, 'days': 100, 'upgrade_day': 40, 'additional_amount': '500'
+        })
+        self.assertEqual(response.status_code, 200)
+
+        target = InvestmentPlan.objects.get(pk=response.data['projections'][0]['plan_id'])
+        self.assertGreater(target.level, base.level)
+        projection = response.data['projections'][0]
+        kept = Decimal('1000') * base.daily_return / 100 * 40
+        after = Decimal('1500') * target.daily_return / 100 * 60
+        self.assertAlmostEqual(projection['earnings'][39], float(Decimal('1000') * base.daily_return / 100 * 39), places=6)
+        self.assertEqual(projection['earnings'][40], 0)
+        self.assertAlmostEqual(projection['earnings'][100], float(after), places=6)
+        self.assertAlmostEqual(projection['value'][100], float(1500 + kept + after), places=6)
+
+    def test_amounts_are_capped_to_stay_within_int64(self):
+        response = self.client.get('/api/plans/projection/', {
+            'amount': '1000', 'days': 1825, 'upgrade_day': 0, 'additional_amount': '100000000000'
+        })
+        self.assertEqual(response.status_code, 400)
+
+        base = InvestmentPlan.objects.filter(is_active=True).order_by('level').first()
+        response = self.client.get('/api/plans/projection/', {
+            'amount': '99999999.99', 'plan': base.id, 'days': 1825, 'upgrade_day': 1825,
+            'additional_amount': '99999999.99'
+        })
+        self.assertEqual(response.status_code, 200)
+        projection = response.data['projections'][0]
+        expected = Decimal('99999999.99') * base.daily_return / 100 * 1825
+        self.assertAlmostEqual(projection['value'][1824], float(Decimal('99999999.99') + expected * 1824 / 1825), places=2)
+        self.assertAlmostEqual(projection['value'][1825], float(Decimal('199999999.98') + expected), places=2)
+
+class LiquidityProjectionTests(TestCase):
+    POSITIONS = [(10, '0'), (3, '40'), (0, '0'), (1, '500')]
+
+    def setUp(self):
+        self.plan = InvestmentPlan.objects.filter(is_active=True).first()
+        self.now = timezone.now()
+        for i, (days, withdrawn) in enumerate(self.POSITIONS):
+            user = User.objects.create_user(username=f'liq{i}@example.com', email=f'liq{i}@example.com')
+            Investment.objects.create(
+                user=user, plan=self.plan, amount_invested=Decimal('1000'), current_value=Decimal('1000'),
+                total_withdrawn=Decimal(withdrawn), status='ACTIVE',
+                start_date=self.now - timedelta(days=days, hours=1),
+            )
+
+    def test_obligations_match_per_investment_sum(self):
+        positions = load_positions(now=self.now)
+        curve = project_obligations(positions, 60)
+
+        daily = float(Decimal('1000') * self.plan.daily_return / 100)
+        for day in (0, 1, 30, 60):
+            expected = sum(
+                max(0.0, daily * (elapsed + day) - float(withdrawn))
+                for elapsed, withdrawn in self.POSITIONS
+            )
+            self.assertAlmostEqual(curve[day], expected, places=6)
+
+    def test_simulation_is_reproducible_and_bounded_by_obligations(self):
+        positions = load_positions(now=self.now)
+        obligations = project_obligations(positions, 30)
+
+        simulated = simulate_withdrawals(positions, 30, scenarios=6, workers=2, seed=7)
+        self.assertEqual(simulated.shape, (6, 31))
+        np.testing.assert_array_equal(simulated, simulate_withdrawals(positions, 30, scenarios=6, workers=2, seed=7))
+        self.assertTrue((np.diff(simulated, axis=1) >= 0).all())
+        self.assertTrue((simulated <= obligations + 1e-9).all())
+
+        # Tous les investisseurs retirent dès le premier jour
+        everyone = simulate_withdrawals(positions, 30, scenarios=2, daily_rate=1.0, volatility=0, workers=1, seed=7)
+        np.testing.assert_allclose(everyone, np.tile(obligations, (2, 1)))
+
+        with self.assertRaises(ValueError):
+            simulate_withdrawals(positions, 30, scenarios=0)
+
+    def test_command_saves_the_report_shown_in_admin(self):
+        admin_client = APIClient()
+        staff = User.objects.create_user(username='staff@example.com', email='staff@example.com', is_staff=True)
+        admin_client.force_login(staff)
+        url = reverse('admin:investments_investment_liquidity')
+        self.assertEqual(admin_client.get(url).status_code, 403)
+
+        staff.user_permissions.add(Permission.objects.get(codename='view_investment'))
+        response = admin_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Aucun rapport de liquidité')
+
+        with self.assertRaises(CommandError):
+            call_command('liquidity_report', '--scenarios', '0', stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command(
+            'liquidity_report', '--horizons', '30', '--scenarios', '4', '--workers', '1', '--seed', '3',
+            '--company-balance', '0', stdout=out
+        )
+        self.assertIn('Successfully simulated 4 scenarios', out.getvalue())
+        report = LiquiditySnapshot.objects.get().report
+        self.assertEqual(report['investments'], 4)
+        self.assertEqual(report['horizons'][0]['days'], 30)
+
+        response = admin_client.get(url)
+        self.assertContains(response, '4 investissements actifs')
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class TransactionExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='judy@example.com', email='judy@example.com')
+        wallet = USDTWallet.objects.create(user=self.user)
+        for amount in ('10', '20', '30'):
+            USDTTransaction.objects.create(wallet=wallet, transaction_type='DEPOSIT', amount=Decimal(amount))
+        other = User.objects.create_user(username='ken@example.com', email='ken@example.com')
+        USDTTransaction.objects.create(
+            wallet=USDTWallet.objects.create(user=other), transaction_type='DEPOSIT', amount=Decimal('99')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_csv_export_streams_only_own_transactions(self):
+        response = self.client.get('/api/transactions/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([Decimal(row['amount']) for row in rows], [Decimal('30'), Decimal('20'), Decimal('10')])
+
+    def test_ndjson_export_and_unknown_format(self):
+        response = self.client.get('/api/transactions/export/', {'export_format': 'ndjson'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['amount'] for line in lines], ['30.000000', '20.000000', '10.000000'])
+
+        response = self.client.get('/api/transactions/export/', {'export_format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Verrous de lecture propres à SQLite')
+class TransactionExportLockTests(TransactionTestCase):
+    def test_writes_proceed_while_an_export_is_partly_consumed(self):
+        wallet = USDTWallet.objects.create(
+            user=User.objects.create_user(username='lou@example.com', email='lou@example.com')
+        )
+        for amount in range(1, 6):
+            USDTTransaction.objects.create(wallet=wallet, transaction_type='DEPOSIT', amount=Decimal(amount))
+
+        stream = stream_csv(USDTTransaction.objects.filter(wallet=wallet), chunk_size=2)
+        lines = next(stream) + next(stream)
+
+        # Écriture depuis une autre connexion, comme un autre worker
+        other = sqlite3.connect(connection.settings_dict['NAME'], uri=True, timeout=0, isolation_level=None)
+        try:
+            other.execute('BEGIN IMMEDIATE')
+            other.execute(
+                "UPDATE investments_usdttransaction SET description = 'vérifié' WHERE wallet_id = ?", (wallet.pk,)
+            )
+            other.execute('COMMIT')
+        finally:
+            other.close()
+
+        lines += ''.join(stream)
+        rows = list(csv.DictReader(io.StringIO(lines)))
+        self.assertEqual([Decimal(row['amount']) for row in rows], [Decimal(n) for n in (5, 4, 3, 2, 1)])
+
+def transfer_log(tx_hash, log_index, to_address, value, from_address='0x' + '99' * 20):
+    return {
+        'transactionHash': tx_hash,
+        'logIndex': log_index,
+        'topics': [
+            TRANSFER_TOPIC,
+            '0x' + from_address[2:].rjust(64, '0'),
+            '0x' + to_address[2:].lower().rjust(64, '0'),
+        ],
+        'data': '0x' + value.to_bytes(32, 'big').hex(),
+    }
+
+class FakeIndexerClient:
+    def __init__(self, logs_by_block, head):
+        self.logs_by_block = logs_by_block
+        self.w3 = mock.Mock(**{'eth.block_number': head})
+
+    def get_transfer_logs(self, from_block, to_block):
+        return [log for block in range(from_block, to_block + 1) for log in self.logs_by_block.get(block, [])]
+
+def ledger_balances(*wallets):
+    return tuple(USDTWallet.objects.get(pk=wallet.pk).balance for wallet in wallets)
+
+class DepositIndexerTests(TestCase):
+    def setUp(self):
+        self.alice = USDTWallet.objects.create(
+            user=User.objects.create_user(username='lea@example.com', email='lea@example.com')
+        )
+        self.bob = USDTWallet.objects.create(
+            user=User.objects.create_user(username='max@example.com', email='max@example.com')
+        )
+
+    def test_every_transfer_log_of_a_transaction_is_credited_once(self):
+        batch, single = '0x' + 'aa' * 32, '0x' + 'bb' * 32
+        client = FakeIndexerClient({
+            10: [
+                transfer_log(batch, 0, self.alice.address, 5_000_000),
+                transfer_log(batch, 1, self.bob.address, 7_000_000),
+                transfer_log(batch, 2, self.bob.address, 1_500_000),
+                transfer_log(batch, 3, '0x' + '44' * 20, 9_000_000),
+            ],
+            12: [transfer_log(single, 0, self.alice.address, 2_000_000)],
+        }, head=14)
+
+        self.assertEqual(index_new_blocks(client, batch_blocks=2, confirmations=2, start_block=10), (3, 4))
+        self.assertEqual(ledger_balances(self.alice, self.bob), (Decimal('7'), Decimal('8.5')))
+        self.assertEqual(IndexerCheckpoint.objects.get(name=CHECKPOINT_NAME).last_block, 12)
+
+        # Rejeu de la plage : rien n'est crédité deux fois
+        IndexerCheckpoint.objects.filter(name=CHECKPOINT_NAME).update(last_block=9)
+        self.assertEqual(index_new_blocks(client, batch_blocks=5, confirmations=2), (3, 0))
+        self.assertEqual(ledger_balances(self.alice, self.bob), (Decimal('7'), Decimal('8.5')))
+
+    def test_transaction_already_recorded_as_a_whole_is_skipped(self):
+        declared = '0x' + 'cc' * 32
+        credit_deposits([(self.alice, Decimal('3'), declared)])
+        client = FakeIndexerClient({5: [transfer_log(declared, 4, self.alice.address, 3_000_000)]}, head=5)
+
+        self.assertEqual(index_new_blocks(client, batch_blocks=10, confirmations=0, start_block=5), (1, 0))
+        self.assertEqual(ledger_balances(self.alice), (Decimal('3'),))
+
+class CountingEvent(threading.Event):
+    """Event qui compte les appelants en attente"""
+    waiting = 0
+    counter_lock = threading.Lock()
+
+    def wait(self, timeout=None):
+        with CountingEvent.counter_lock:
+            CountingEvent.waiting += 1
+        return super().wait(timeout)
+
+class FakeVerifyingClient:
+    def __init__(self, result=None, error=None):
+        self.result = result or {'valid': True, 'amount': Decimal('5'), 'to_address': None, 'error': None}
+        self.error = error
+        self.calls = 0
+
+    def verify_transaction(self, tx_hash, to_address=None):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.result
+
+class VerificationCacheTests(TestCase):
+    VALID = {'valid': True, 'error': None}
+
+    def setUp(self):
+        verification_cache.clear()
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = VerificationCache(maxsize=2, ttl=60)
+        calls = []
+
+        def verify(key):
+            calls.append(key)
+            return self.VALID
+
+        for key in ('a', 'b', 'a', 'c', 'a', 'b'):
+            cache.get_or_verify(key, lambda key=key: verify(key), lambda result: True)
+        self.assertEqual(calls, ['a', 'b', 'c', 'b'])
+
+    def test_entries_expire_after_ttl(self):
+        cache = VerificationCache(maxsize=10, ttl=60)
+        client = FakeVerifyingClient()
+        clock = mock.Mock(**{'monotonic.return_value': 1000})
+        with mock.patch('investments.verification.time', clock):
+            for now in (1000, 1059, 1061):
+                clock.monotonic.return_value = now
+                cache.get_or_verify('a', lambda: client.verify_transaction('a'), lambda result: True)
+        self.assertEqual(client.calls, 2)
+
+    def test_unconfirmed_transaction_is_not_cached(self):
+        tx_hash = '0x' + 'aa' * 32
+        pending = FakeVerifyingClient({'valid': False, 'error': 'Transaction introuvable'})
+        verify_transaction(pending, tx_hash)
+        verify_transaction(pending, tx_hash)
+        self.assertEqual(pending.calls, 2)
+
+        confirmed = FakeVerifyingClient()
+        verify_transaction(confirmed, tx_hash)
+        verify_transaction(confirmed, tx_hash.upper().replace('0X', '0x'))
+        self.assertEqual(confirmed.calls, 1)
+
+    def run_concurrently(self, client, callers=8):
+        """Lance ``callers`` vérifications du même hash, libérées une fois tous les suiveurs en attente"""
+        release = threading.Event()
+
+        def verify():
+            release.wait(5)
+            return client.verify_transaction('0x' + 'bb' * 32)
+
+        def call():
+            try:
+                return verification_cache.get_or_verify('key', verify, lambda result: True)
+            except Exception as e:
+                return e
+
+        CountingEvent.waiting = 0
+        with mock.patch('investments.verification.threading', mock.Mock(Event=CountingEvent)):
+            with ThreadPoolExecutor(max_workers=callers) as executor:
+                futures = [executor.submit(call) for _ in range(callers)]
+                deadline = time.monotonic() + 5
+                while CountingEvent.waiting < callers - 1 and time.monotonic() < deadline:
+                    time.sleep(0.001)
+                release.set()
+                return [future.result() for future in futures]
+
+    def test_concurrent_threads_share_one_call(self):
+        client = FakeVerifyingClient()
+        results = self.run_concurrently(client)
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(results, [client.result] * 8)
+
+    def test_error_reaches_every_waiting_thread(self):
+        error = ConnectionError('noeud injoignable')
+        client = FakeVerifyingClient(error=error)
+        results = self.run_concurrently(client)
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(results, [error] * 8)
+
+    async def test_concurrent_tasks_share_one_call(self):
+        calls = []
+
+        async def verify():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return self.VALID
+
+        results = await asyncio.gather(*[
+            verification_cache.aget_or_verify('key', verify, lambda result: True) for _ in range(8)
+        ])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [self.VALID] * 8)
+
+    async def test_error_reaches_every_waiting_task(self):
+        calls = []
+
+        async def verify():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ConnectionError('noeud injoignable')
+
+        results = await asyncio.gather(
+            *[verification_cache.aget_or_verify('key', verify, lambda result: True) for _ in range(8)],
+            return_exceptions=True
+        )
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(result, ConnectionError) for result in results))
+
+class TransferReceiptTests(TestCase):
+    def setUp(self):
+        self.blockchain = BlockchainClient(Web3())
+        self.usdt = settings.USDT_CONTRACT_ADDRESS
+        self.company = '0x' + 'ab' * 20
+
+    def usdt_log(self, to_address, value, **kwargs):
+        return {'address': self.usdt, **transfer_log('0x' + '00' * 32, 0, to_address, value, **kwargs)}
+
+    def test_decode_transfer_log_reads_fixed_offsets(self):
+        log = transfer_log('0x' + '00' * 32, 0, '0x' + 'AB' * 20, 123_456_789, from_address='0x' + '12' * 20)
+        self.assertEqual(decode_transfer_log(log), {
+            'from_address': '0x' + '12' * 20,
+            'to_address': '0x' + 'ab' * 20,
+            'value': 123_456_789,
+        })
+
+        approval = dict(log, topics=[Web3.keccak(text='Approval(address,address,uint256)')] + log['topics'][1:])
+        self.assertIsNone(decode_transfer_log(approval))
+
+    def test_transfer_from_and_multiple_logs_are_summed_for_the_recipient(self):
+        # transferFrom via un contrat tiers : le Transfer part du propriétaire des fonds
+        receipt = {'status': 1, 'logs': [
+            {**self.usdt_log(self.company, 9_000_000), 'address': '0x' + '55' * 20},
+            self.usdt_log('0x' + '44' * 20, 1_000_000),
+            self.usdt_log(self.company, 2_500_000, from_address='0x' + '66' * 20),
+            self.usdt_log(self.company, 500_000),
+        ]}
+        result = self.blockchain.parse_receipt(receipt, Web3.to_checksum_address(self.company))
+        self.assertTrue(result['valid'])
+        self.assertEqual(result['amount'], Decimal('3'))
+        self.assertEqual(result['to_address'], Web3.to_checksum_address(self.company))
+
+        self.assertEqual(self.blockchain.parse_receipt(receipt)['amount'], Decimal('1'))
+
+    def test_invalid_receipts(self):
+        self.assertFalse(self.blockchain.parse_receipt(None, self.company)['valid'])
+        failed = {'status': 0, 'logs': [self.usdt_log(self.company, 1)]}
+        self.assertEqual(self.blockchain.parse_receipt(failed, self.company)['error'], 'La transaction a échoué')
+        other = {'status': 1, 'logs': [self.usdt_log('0x' + '44' * 20, 1)]}
+        self.assertFalse(self.blockchain.parse_receipt(other, self.company)['valid'])
+
+    def test_verify_transactions_batches_receipts_and_reports_item_errors(self):
+        hashes = ['0x' + digit * 64 for digit in '1234']
+        raw_receipt = {'status': '0x1', 'logs': [self.usdt_log(self.company, 4_000_000)]}
+        responses = [
+            [{'jsonrpc': '2.0', 'id': 0, 'result': raw_receipt},
+             {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32000, 'message': 'header not found'}}],
+            [{'jsonrpc': '2.0', 'id': 2, 'result': None},
+             {'jsonrpc': '2.0', 'id': 3, 'result': dict(raw_receipt, status='0x0')}],
+        ]
+        with mock.patch.object(self.blockchain.w3.provider, 'make_batch_request', side_effect=responses) as batch:
+            results = self.blockchain.verify_transactions(hashes, self.company, batch_size=2)
+
+        self.assertEqual(batch.call_count, 2)
+        self.assertEqual(batch.call_args_list[1].args[0], [
+            ('eth_getTransactionReceipt', [hashes[2]]), ('eth_getTransactionReceipt', [hashes[3]])
+        ])
+        self.assertEqual(results[hashes[0]]['amount'], Decimal('4'))
+        self.assertEqual(results[hashes[1]], {'valid': False, 'error': 'header not found'})
+        self.assertEqual(results[hashes[2]]['error'], 'Transaction introuvable')
+        self.assertEqual(results[hashes[3]]['error'], 'La transaction a échoué')
+
+def fake_tx_hash(nonce, gas_price=1):
+    return f'0x{nonce:032x}{gas_price:032x}'
+
+class FakeWithdrawalChain:
+    """Noeud simulé : mempool, reçus et nonce confirmé du wallet de la compagnie"""
+
+    def __init__(self):
+        self.w3 = mock.Mock(**{'eth.gas_price': 1})
+        self.mempool = {}
+        self.receipts = {}
+        self.confirmed_nonce = 0
+        self.send_error = None
+        self.reaches_node = True
+
+    def sign_usdt_transfer(self, to_address, amount, nonce, gas_price=None):
+        return fake_tx_hash(nonce, gas_price), f'0xsigned{nonce}:{gas_price}'
+
+    def send_raw_transaction(self, signed_transaction):
+        nonce, gas_price = map(int, signed_transaction.removeprefix('0xsigned').split(':'))
+        if self.reaches_node:
+            self.mempool[fake_tx_hash(nonce, gas_price)] = signed_transaction
+        if self.send_error:
+            raise self.send_error
+
+    def mine(self, *tx_hashes):
+        """Mine les transactions données, ou tout le mempool"""
+        for tx_hash in tx_hashes or list(self.mempool):
+            self.receipts[tx_hash] = True
+            self.confirmed_nonce = max(self.confirmed_nonce, int(tx_hash[2:34], 16) + 1)
+        self.mempool = {}
+
+    def get_confirmed_nonce(self):
+        return self.confirmed_nonce
+
+    def get_transaction_status(self, tx_hash):
+        return self.receipts.get(tx_hash)
+
+    def is_transaction_known(self, tx_hash):
+        return tx_hash in self.mempool or tx_hash in self.receipts
+
+class WithdrawalBroadcastTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='hugo@example.com', email='hugo@example.com')
+        USDTWallet.objects.create(user=self.user)
+        self.investment = Investment.objects.create(
+            user=self.user, plan=InvestmentPlan.objects.get(level=1), amount_invested=Decimal('1000'),
+            status='ACTIVE', start_date=timezone.now(), accrued_earnings=Decimal('100')
+        )
+        self.chain = FakeWithdrawalChain()
+        self.nonce_manager = NonceManager('0x' + '11' * 20)
+        self.withdrawal = reserve_withdrawal(self.user, Decimal('10'), '0x' + '22' * 20)
+
+    def test_timeout_after_send_is_settled_from_the_receipt(self):
+        self.chain.send_error = TimeoutError('read timed out')
+        with self.assertLogs('investments.withdrawals', 'WARNING'):
+            self.assertEqual(broadcast_pending_withdrawals(self.chain, self.nonce_manager), 0)
+
+        self.withdrawal.refresh_from_db()
+        self.assertEqual(self.withdrawal.status, 'PROCESSING')
+        self.assertEqual(self.withdrawal.tx_hash, fake_tx_hash(0))
+        self.investment.refresh_from_db()
+        self.assertEqual(self.investment.total_withdrawn, Decimal('10'))
+
+        self.chain.mine()
+        self.assertEqual(confirm_broadcast_withdrawals(self.chain), 1)
+        self.withdrawal.refresh_from_db()
+        self.assertEqual(self.withdrawal.status, 'COMPLETED')
+        self.investment.refresh_from_db()
+        self.assertEqual(self.investment.total_withdrawn, Decimal('10'))
+
+    def test_lost_send_is_rebroadcast_and_refunded_only_once_nonce_is_consumed(self):
+        self.chain.send_error = ConnectionError('connection reset')
+        self.chain.reaches_node = False
+        with self.assertLogs('investments.withdrawals', 'WARNING'):
+            broadcast_pending_withdrawals(self.chain, self.nonce_manager)
+
+        self.chain.send_error = None
+        self.chain.reaches_node = True
+        self.assertEqual(confirm_broadcast_withdrawals(self.chain), 0)
+        self.withdrawal.refresh_from_db()
+        self.assertIn(self.withdrawal.tx_hash, self.chain.mempool)
+        self.assertEqual(self.withdrawal.status, 'PROCESSING')
+
+        # Le nonce est consommé par une autre transaction du wallet
+        self.chain.mempool = {}
+        self.chain.confirmed_nonce = 1
+        self.assertEqual(confirm_broadcast_withdrawals(self.chain), 1)
+        self.withdrawal.refresh_from_db()
+        self.assertEqual(self.withdrawal.status, 'FAILED')
+        self.investment.refresh_from_db()
+        self.assertEqual(self.investment.total_withdrawn, Decimal('0'))
+
+    def test_failed_signature_rolls_back_the_nonce(self):
+        with mock.patch.object(self.chain, 'sign_usdt_transfer', side_effect=ValueError('adresse invalide')):
+            with self.assertLogs('investments.withdrawals', 'WARNING'):
+                self.assertEqual(broadcast_pending_withdrawals(self.chain, self.nonce_manager), 0)
+
+        self.withdrawal.refresh_from_db()
+        self.assertEqual(self.withdrawal.status, 'FAILED')
+        self.assertIsNone(self.withdrawal.nonce)
+        self.assertEqual(self.nonce_manager.allocate(), 0)
+
+    def test_nonce_of_a_signed_withdrawal_is_not_a_gap(self):
+        self.assertEqual(broadcast_pending_withdrawals(self.chain, self.nonce_manager), 1)
+
+        self.chain.w3.eth.get_transaction_count.return_value = 0
+        self.nonce_manager.sync_with_chain(self.chain)
+        self.assertEqual(self.nonce_manager.allocate(), 1)
+
+    def age_withdrawal(self):
+        USDTTransaction.objects.filter(pk=self.withdrawal.pk).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+
+    def test_stuck_transfer_is_repriced_at_the_same_nonce(self):
+        broadcast_pending_withdrawals(self.chain, self.nonce_manager)
+        self.assertEqual(reprice_stuck_withdrawals(self.chain, timeout=60), 0)
+
+        self.age_withdrawal()
+        self.assertEqual(reprice_stuck_withdrawals(self.chain, timeout=60, bump_percent=15), 1)
+        self.withdrawal.refresh_from_db()
+        self.assertEqual(self.withdrawal.nonce, 0)
+        self.assertEqual(self.withdrawal.gas_price, 2)
+        self.assertEqual(self.withdrawal.tx_hash, fake_tx_hash(0, 2))
+        self.assertEqual(self.withdrawal.replaced_tx_hashes, [fake_tx_hash(0, 1)])
+        self.assertIn(fake_tx_hash(0, 2), self.chain.mempool)
+
+        self.chain.mine(fake_tx_hash(0, 2))
+        self.age_withdrawal()
+        self.assertEqual(reprice_stuck_withdrawals(self.chain, timeout=60), 0)
+        self.assertEqual(confirm_broadcast_withdrawals(self.chain), 1)
+        self.withdrawal.refresh_from_db()
+        self.assertEqual(self.withdrawal.status, 'COMPLETED')
+
+    def test_replaced_transfer_mined_first_completes_the_withdrawal(self):
+        broadcast_pending_withdrawals(self.chain, self.nonce_manager)
+        self.age_withdrawal()
+        reprice_stuck_withdrawals(self.chain, timeout=60)
+
+        self.chain.mine(fake_tx_hash(0, 1))
+        self.assertEqual(confirm_broadcast_withdrawals(self.chain), 1)
+        self.withdrawal.refresh_from_db()
+        self.assertEqual(self.withdrawal.status, 'COMPLETED')
+        self.assertEqual(self.withdrawal.tx_hash, fake_tx_hash(0, 1))
+        self.investment.refresh_from_db()
+        self.assertEqual(self.investment.total_withdrawn, Decimal('10'))
+
+class FakeAsyncBlockchainClient:
+    def __init__(self, amount):
+        self.amount = amount
+        self.calls = 0
+
+    async def verify_transaction(self, tx_hash, to_address=None):
+        self.calls += 1
+        return {'valid': True, 'amount': self.amount, 'to_address': to_address, 'error': None}
+
+class AsyncDepositViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='heidi@example.com', email='heidi@example.com')
+        self.wallet = USDTWallet.objects.create(user=self.user)
+        self.access = RefreshToken.for_user(self.user).access_token
+        self.client = AsyncClient()
+        cache.clear()
+
+    async def test_deposit_is_verified_once_and_replayed_on_retry(self):
+        fake_client = FakeAsyncBlockchainClient(Decimal('250'))
+        tx_hash = '0x' + 'cd' * 32
+        with mock.patch('investments.async_views.get_async_blockchain_client', return_value=fake_client):
+            responses = [
+                await self.client.post(
+                    '/api/async/transactions/deposit/',
+                    {'tx_hash': tx_hash},
+                    content_type='application/json',
+                    headers={'Authorization': f'Bearer {self.access}', 'Idempotency-Key': 'deposit-1'}
+                )
+                for _ in range(2)
+            ]
+
+        self.assertEqual([r.status_code for r in responses], [200, 200])
+        self.assertEqual(responses[0].json(), responses[1].json())
+        self.assertEqual(responses[1]['Idempotent-Replayed'], 'true')
+        self.assertEqual(fake_client.calls, 1)
+        balance = await USDTWallet.objects.filter(pk=self.wallet.pk).annotate(
+            ledger_balance=ledger_balance()
+        ).values_list('ledger_balance', flat=True).aget()
+        self.assertEqual(balance, Decimal('250'))
+
+@override_settings(REPLICA_DATABASE='replica')
+class PrimaryReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='grace@example.com', email='grace@example.com')
+        self.factory = APIRequestFactory()
+        cache.clear()
+
+    def request(self, method, status_code=200):
+        request = getattr(self.factory, method)('/api/transactions/')
+        request.user = self.user
+        token = start_replica_reads(request)
+        db = router.db_for_read(USDTTransaction)
+        end_replica_reads(request, Response(status=status_code), token)
+        return db
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        self.assertEqual(self.request('get'), 'replica')
+        self.assertEqual(router.db_for_read(USDTTransaction), 'default')
+
+        self.assertEqual(self.request('post', status_code=400), 'default')
+        self.assertEqual(self.request('get'), 'replica')
+
+        self.request('post', status_code=201)
+        self.assertEqual(self.request('get'), 'default')
+
+    def test_cached_responses_are_built_on_primary(self):
+        request = self.factory.get('/api/me/')
+        request.user = self.user
+        token = start_replica_reads(request)
+        self.assertEqual(router.db_for_read(USDTTransaction), 'replica')
+
+        data = usercache.get_or_set(self.user.pk, 'me', lambda: router.db_for_read(USDTTransaction))
+        self.assertEqual(data, 'default')
+        self.assertEqual(router.db_for_read(USDTTransaction), 'replica')
+        end_replica_reads(request, Response(), token)
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='erin@example.com', email='erin@example.com')
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+        cache.clear()
+        plan_catalog.get()
+
+    def test_authentication_does_not_query_once_user_is_cached(self):
+        self.client.get('/api/plans/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/plans/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_password_hash_is_not_cached(self):
+        self.user.set_password('correct horse battery staple')
+        self.user.save()
+        self.client.get('/api/plans/')
+
+        cached = cache.get(AUTH_USER_KEY.format(self.user.pk))
+        self.assertNotIn('password', cached)
+        self.assertNotIn(self.user.password, repr(cached))
+
+        # L'utilisateur reconstruit depuis le cache suffit aux vues, sans relire auth_user
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/profile/referrals/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if 'FROM "auth_user" WHERE' in query['sql']])
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        response = self.client.post('/api/logout/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.client.get('/api/plans/').status_code, 401)
+        response = APIClient().post('/api/token/refresh/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_revocation_filter_ignores_rotated_refresh_tokens(self):
+        for _ in range(3):
+            RefreshToken.for_user(self.user).blacklist()
+        self.client.post('/api/logout/')
+        self.assertEqual(RevokedAccessToken.objects.count(), 1)
+
+        revoked_tokens._bloom = None
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/plans/').status_code, 401)
+        self.assertFalse([query for query in queries if 'token_blacklist' in query['sql']])
+
+FULL_SCAN = re.compile(r'^SCAN\b')
+
+class QueryPlanAssertionsMixin:
+    """Vérifie à l'aide d'EXPLAIN QUERY PLAN qu'une requête s'appuie sur un index"""
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertNoFullScan(self, queryset):
+        plan = self.explain(queryset)
+        scans = [detail for detail in plan if FULL_SCAN.search(detail)]
+        self.assertFalse(
+            scans,
+            f"Parcours complet de table ou d'index dans le plan d'exécution : {plan}"
+        )
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN est spécifique à SQLite')
+class HotQueryPlanTests(QueryPlanAssertionsMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='bob@example.com', email='bob@example.com')
+
+    def test_full_scan_pattern(self):
+        self.assertTrue(FULL_SCAN.search('SCAN investments_usdttransaction'))
+        self.assertTrue(FULL_SCAN.search('SCAN auth_user USING COVERING INDEX auth_user_email_idx'))
+        self.assertFalse(FULL_SCAN.search('SEARCH auth_user USING INDEX auth_user_email_idx (email=?)'))
+
+    def test_transactions_by_user_and_type(self):
+        self.assertNoFullScan(
+            USDTTransaction.objects.filter(wallet__user=self.user, transaction_type='DEPOSIT')
+        )
+
+    def test_active_investment_by_user(self):
+        self.assertNoFullScan(Investment.objects.filter(user=self.user, status='ACTIVE'))
+
+    def test_user_by_email(self):
+        self.assertNoFullScan(User.objects.filter(email='bob@example.com'))
+
+    def test_referrals_of_profile(self):
+        self.assertNoFullScan(User.objects.filter(profile__referred_by=self.user.profile))
+        self.assertNoFullScan(UserProfile.objects.filter(referred_by=self.user.profile))
@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     InvestmentPlanViewSet,
     InvestmentViewSet,
@@ -7,6 +8,7 @@ from .views import (
     USDTTransactionViewSet,
     UserProfileViewSet,
     login_view,
+    logout_view,
     register_view,
     user_detail_view
 )
@@ -20,6 +22,11 @@ router.register(r'profile', UserProfileViewSet, basename='profile')
 urlpatterns = [
     path('register/', register_view, name='register'),
     path('login/', login_view, name='login'),
+    path('logout/', logout_view, name='logout'),
     path('me/', user_detail_view, name='user-detail'),
+    # Actions asynchrones, à utiliser sous ASGI
+    path('async/transactions/deposit/', async_views.deposit, name='async-deposit'),
+    path('async/wallet/check_balance/', async_views.check_balance, name='async-check-balance'),
+    path('async/my-investments/withdraw/', async_views.withdraw, name='async-withdraw'),
     path('', include(router.urls)),
 ]
@@ -0,0 +1,92 @@
+"""
+Cache des réponses par utilisateur (``/api/me/``, ``/api/profile/referrals/``).
+
+Chaque utilisateur possède un numéro de version stocké dans le cache ; les
+réponses sont rangées sous une clé qui l'inclut. Toute écriture qui modifie
+ces réponses (dépôt, investissement, upgrade, retrait, commission) incrémente
+la version de l'utilisateur et de son parrain : les anciennes entrées ne sont
+plus jamais lues et expirent d'elles-mêmes. Une version globale permet
+d'invalider tous les utilisateurs d'un coup (calcul des gains, plans).
+"""
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import UserProfile
+from .routers import primary_reads
+
+GLOBAL_VERSION_KEY = 'user-cache:version'
+USER_VERSION_KEY = 'user-cache:{}:version'
+
+
+def _new_version():
+    # Toujours supérieure aux versions précédentes, même après une éviction
+    return time.time_ns()
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def get_or_set(user_id, name, build, variant=''):
+    """
+    Retourne la réponse ``name`` de l'utilisateur depuis le cache, ou la
+    calcule avec ``build()`` et la stocke.
+
+    ``build()`` lit toujours la base principale : une réponse construite depuis
+    la réplique en retard serait rangée sous la version courante et servie
+    jusqu'à la prochaine écriture.
+    """
+    key = 'user-cache:{}:{}:{}:{}:{}'.format(
+        user_id,
+        name,
+        _get_version(GLOBAL_VERSION_KEY),
+        _get_version(USER_VERSION_KEY.format(user_id)),
+        variant
+    )
+    data = cache.get(key)
+    if data is None:
+        with primary_reads():
+            data = build()
+        cache.set(key, data, settings.USER_CACHE_TIMEOUT)
+    return data
+
+
+def _bump_users(user_ids):
+    # Le parrain affiche les dépôts et commissions de ses filleuls
+    referrer_ids = UserProfile.objects.filter(
+        user_id__in=user_ids,
+        referred_by__isnull=False
+    ).values_list('referred_by__user_id', flat=True)
+    for user_id in set(user_ids) | set(referrer_ids):
+        _bump_version(USER_VERSION_KEY.format(user_id))
+
+
+def invalidate_users(user_ids):
+    """
+    Invalide les réponses en cache des utilisateurs et de leurs parrains,
+    une fois la transaction en cours validée.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        transaction.on_commit(partial(_bump_users, user_ids))
+
+
+def invalidate_all():
+    """Invalide les réponses en cache de tous les utilisateurs"""
+    transaction.on_commit(partial(_bump_version, GLOBAL_VERSION_KEY))
@@ -0,0 +1,144 @@
+"""
+Cache des vérifications de transactions par tx_hash.
+
+Un résultat est définitif dès que le reçu de la transaction existe (succès ou
+échec) : il est alors conservé dans un cache LRU à durée de vie limitée. Les
+vérifications simultanées d'un même hash sont regroupées en un seul appel RPC
+(single-flight) ; les autres appelants attendent son résultat. Les vues
+asynchrones partagent le même cache, avec un regroupement par tâche asyncio.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class VerificationCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._results = OrderedDict()
+        self._in_flight = {}
+        self._async_in_flight = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return result
+
+    def _store(self, key, result):
+        self._results[key] = (time.monotonic() + self.ttl, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def get_or_verify(self, key, verify, is_final):
+        """
+        Retourne le résultat en cache pour ``key`` ou appelle ``verify()``.
+
+        Args:
+            key: Clé de cache
+            verify: Fonction effectuant la vérification
+            is_final: Prédicat indiquant si un résultat peut être mis en cache
+        """
+        with self._lock:
+            result = self._get(key)
+            if result is not None:
+                return result
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = {'done': threading.Event()}
+
+        if not leader:
+            flight['done'].wait()
+            if 'error' in flight:
+                raise flight['error']
+            return flight['result']
+
+        try:
+            result = verify()
+            flight['result'] = result
+            with self._lock:
+                if is_final(result):
+                    self._store(key, result)
+            return result
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight['done'].set()
+
+    async def aget_or_verify(self, key, verify, is_final):
+        """Variante asynchrone de ``get_or_verify`` : ``verify`` est une coroutine"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            result = self._get(key)
+            if result is not None:
+                return result
+            task = self._async_in_flight.get(key)
+            # Une tâche n'est partageable qu'au sein de sa boucle d'événements
+            if task is None or task.get_loop() is not loop:
+                task = self._async_in_flight[key] = loop.create_task(
+                    self._averify(key, verify, is_final)
+                )
+        # L'abandon d'un appelant n'annule pas la vérification des autres
+        return await asyncio.shield(task)
+
+    async def _averify(self, key, verify, is_final):
+        try:
+            result = await verify()
+            with self._lock:
+                if is_final(result):
+                    self._store(key, result)
+            return result
+        finally:
+            with self._lock:
+                if self._async_in_flight.get(key) is asyncio.current_task():
+                    del self._async_in_flight[key]
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+verification_cache = VerificationCache(
+    settings.VERIFICATION_CACHE_SIZE,
+    settings.VERIFICATION_CACHE_TTL
+)
+
+
+def is_final_verification(result):
+    """Un résultat est définitif s'il ne dépend plus de la confirmation de la transaction"""
+    return result['valid'] or result['error'] != 'Transaction introuvable'
+
+
+def verify_transaction(client, tx_hash, to_address=None):
+    """Vérifie une transaction via ``client`` en passant par le cache partagé"""
+    key = (tx_hash.lower(), to_address.lower() if to_address else None)
+    return verification_cache.get_or_verify(
+        key,
+        lambda: client.verify_transaction(tx_hash, to_address),
+        is_final_verification
+    )
+
+
+async def averify_transaction(client, tx_hash, to_address=None):
+    """Variante asynchrone de ``verify_transaction`` pour un client asynchrone"""
+    key = (tx_hash.lower(), to_address.lower() if to_address else None)
+    return await verification_cache.aget_or_verify(
+        key,
+        lambda: client.verify_transaction(tx_hash, to_address),
+        is_final_verification
+    )
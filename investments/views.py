@@ -3,7 +3,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.conf import settings
-from .models import InvestmentPlan, Investment, USDTWallet, USDTTransaction, UserProfile
+from .models import InvestmentPlan, Investment, USDTWallet, USDTTransaction, UserProfile, ReferralTreePath
 from .serializers import (
     InvestmentPlanSerializer, 
     InvestmentSerializer,
@@ -14,20 +14,87 @@ from .serializers import (
     RegisterSerializer,  # Importer le serializer d'enregistrement
     UserDetailSerializer,  # Importer le serializer des détails de l'utilisateur
     InvestmentUpgradeSerializer,  # Importer le serializer de mise à niveau d'investissement
-    ReferralProfileSerializer  # Importer le serializer de profil de parrainage
+    ReferralProfileSerializer,  # Importer le serializer de profil de parrainage
+    ReferralUserSerializer,
+    ProjectionSerializer,
+    PlanProjectionSerializer
 )
-from .blockchain import BlockchainClient
+from .pagination import ReferralPagination, HistoryCursorPagination
+from .catalog import plan_catalog
+from .earnings import project_earnings
+from . import usercache
+from .authentication import revoke_token
+from .idempotency import idempotent
+from .withdrawals import reserve_withdrawal, WithdrawalRejected
+from .routers import ReplicaReadMixin, read_from_replica, pin_to_primary
+from .blockchain import get_blockchain_client
+from .deposits import credit_deposits
+from .ledger import locked_balance
+from .exports import export_response, EXPORT_CONTENT_TYPES
+from .verification import verify_transaction
 from decimal import Decimal
-from django.db import transaction  # Importer transaction pour les opérations atomiques
+from django.db import transaction, IntegrityError  # Importer transaction pour les opérations atomiques
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
 from django.contrib.auth import authenticate
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.utils import timezone
+from django.utils.http import parse_etags
+from django.db.models import Q, Sum, Count, DecimalField
+from django.db.models.functions import Coalesce
+
+# Profondeur maximale explorée dans le réseau de parrainage
+DOWNLINE_MAX_DEPTH = 10
 
 # Create your views here.
 
-class InvestmentPlanViewSet(viewsets.ModelViewSet):
+def build_projection(amount, plan, params, elapsed_days=0):
+    """
+    Projection quotidienne des gains, tous les scénarios en un seul calcul.
+
+    Sans mise à niveau : le plan donné, ou chaque plan actif. Avec mise à
+    niveau au jour ``upgrade_day`` : chaque plan actif de niveau supérieur.
+    """
+    upgrade_day = params.get('upgrade_day')
+    if upgrade_day is None:
+        targets = [plan] if plan is not None else plan_catalog.active_plans()
+        daily_returns = [target.daily_return for target in targets]
+        upgrade_returns = None
+    else:
+        targets = [target for target in plan_catalog.active_plans() if target.level > plan.level]
+        daily_returns = [plan.daily_return] * len(targets)
+        upgrade_returns = [target.daily_return for target in targets]
+
+    if not targets:
+        raise serializers.ValidationError("Aucun plan disponible pour cette projection")
+
+    earnings, values = project_earnings(
+        amount,
+        daily_returns,
+        params['days'],
+        elapsed_days=elapsed_days,
+        upgrade_day=upgrade_day,
+        upgrade_returns=upgrade_returns,
+        additional_amount=params['additional_amount']
+    )
+    return {
+        'amount': str(amount),
+        'days': params['days'],
+        'upgrade_day': upgrade_day,
+        'additional_amount': str(params['additional_amount']),
+        'projections': [
+            {
+                'plan_id': target.id,
+                'plan_name': target.name,
+                'earnings': earnings[i].tolist(),
+                'value': values[i].tolist(),
+            }
+            for i, target in enumerate(targets)
+        ]
+    }
+
+class InvestmentPlanViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = InvestmentPlan.objects.all()
     serializer_class = InvestmentPlanSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -37,7 +104,38 @@ class InvestmentPlanViewSet(viewsets.ModelViewSet):
             return [permissions.IsAdminUser()]
         return [permissions.IsAuthenticated()]
 
-class USDTWalletViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        # Servi depuis le catalogue en cache, sans requête à la base
+        catalog = plan_catalog.get()
+        etag = catalog['etag']
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(catalog['data'], headers={'ETag': etag})
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            data = plan_catalog.get_data(int(kwargs[self.lookup_field]))
+        except ValueError:
+            data = None
+        if data is None:
+            return Response(
+                {'detail': 'Plan introuvable'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def projection(self, request):
+        """
+        Projection quotidienne d'un investissement hypothétique (?amount=, ?plan=, ?days=,
+        ?upgrade_day=, ?additional_amount=), comparée sur tous les plans
+        """
+        serializer = PlanProjectionSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        return Response(build_projection(params['amount'], params.get('plan'), params))
+
+class USDTWalletViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = USDTWalletSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -54,7 +152,7 @@ class USDTWalletViewSet(viewsets.ModelViewSet):
     def check_balance(self, request, pk=None):
         wallet = self.get_object()
         try:
-            blockchain_client = BlockchainClient()
+            blockchain_client = get_blockchain_client()
             blockchain_balance = blockchain_client.get_usdt_balance(wallet.address)
             return Response({
                 'blockchain_balance': str(blockchain_balance),
@@ -66,17 +164,47 @@ class USDTWalletViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class USDTTransactionViewSet(viewsets.ModelViewSet):
+class USDTTransactionViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = USDTTransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HistoryCursorPagination
 
     def get_queryset(self):
         return USDTTransaction.objects.filter(wallet__user=self.request.user)
 
+    @action(detail=True, methods=['get'], url_path='status')
+    def transaction_status(self, request, pk=None):
+        """
+        Statut d'une transaction, notamment pour suivre un retrait en cours
+        """
+        usdt_transaction = self.get_object()
+        return Response({
+            'transaction_id': usdt_transaction.id,
+            'transaction_type': usdt_transaction.transaction_type,
+            'status': usdt_transaction.status,
+            'tx_hash': usdt_transaction.tx_hash,
+            'updated_at': usdt_transaction.updated_at
+        })
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Historique complet en flux, au format CSV (par défaut) ou NDJSON
+        selon le paramètre ``export_format``
+        """
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_CONTENT_TYPES:
+            return Response(
+                {'error': f"Format d'export inconnu, formats acceptés : {', '.join(EXPORT_CONTENT_TYPES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return export_response(self.get_queryset(), export_format)
+
     @action(detail=False, methods=['post'])
+    @idempotent
     def deposit(self, request):
         wallet = get_object_or_404(USDTWallet, user=request.user)
-        tx_hash = request.data.get('tx_hash')
+        tx_hash = (request.data.get('tx_hash') or '').strip().lower()
 
         if not tx_hash:
             return Response(
@@ -86,8 +214,7 @@ class USDTTransactionViewSet(viewsets.ModelViewSet):
 
         try:
             # Vérifier la transaction sur la blockchain
-            blockchain_client = BlockchainClient()
-            tx_info = blockchain_client.verify_transaction(tx_hash)
+            tx_info = verify_transaction(get_blockchain_client(), tx_hash, settings.COMPANY_USDT_ADDRESS)
 
             if not tx_info['valid']:
                 return Response(
@@ -104,48 +231,16 @@ class USDTTransactionViewSet(viewsets.ModelViewSet):
 
             amount = Decimal(str(tx_info['amount']))
 
-            # Créer la transaction
-            with transaction.atomic():
-                # Créer la transaction de dépôt
-                usdt_transaction = USDTTransaction.objects.create(
-                    wallet=wallet,
-                    transaction_type='DEPOSIT',
-                    amount=amount,
-                    status='COMPLETED',
-                    tx_hash=tx_hash
+            # Créer la transaction de dépôt et créditer le portefeuille.
+            # Un hash déjà enregistré est rejeté par l'index unique sur tx_hash.
+            try:
+                usdt_transaction, = credit_deposits([(wallet, amount, tx_hash)])
+            except IntegrityError:
+                return Response(
+                    {'error': 'Cette transaction a déjà été enregistrée'},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
 
-                # Mettre à jour le solde du portefeuille
-                wallet.balance += amount
-                wallet.save()
-
-                # Gérer la commission de parrainage si l'utilisateur a été parrainé
-                try:
-                    profile = request.user.profile
-                    if profile.referred_by:
-                        # Calculer la commission (5% du dépôt)
-                        referral_bonus = amount * Decimal('0.05')
-                        
-                        # Créer une transaction pour la commission
-                        referrer_wallet = profile.referred_by.user.usdt_wallet
-                        USDTTransaction.objects.create(
-                            wallet=referrer_wallet,
-                            transaction_type='REFERRAL_BONUS',
-                            amount=referral_bonus,
-                            status='COMPLETED',
-                            description=f"Commission de parrainage pour le dépôt de {request.user.email}"
-                        )
-                        
-                        # Mettre à jour le solde du parrain
-                        referrer_wallet.balance += referral_bonus
-                        referrer_wallet.save()
-                        
-                        # Mettre à jour les gains totaux de parrainage
-                        profile.referred_by.total_referral_earnings += referral_bonus
-                        profile.referred_by.save()
-                except UserProfile.DoesNotExist:
-                    pass
-
             return Response(USDTTransactionSerializer(usdt_transaction).data)
 
         except Exception as e:
@@ -154,12 +249,19 @@ class USDTTransactionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-class InvestmentViewSet(viewsets.ModelViewSet):
+class InvestmentViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = InvestmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = HistoryCursorPagination
 
     def get_queryset(self):
-        return Investment.objects.filter(user=self.request.user)
+        return Investment.objects.filter(user=self.request.user).select_related(
+            'user', 'plan', 'usdt_transaction'
+        )
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         plan = serializer.validated_data['plan']
@@ -187,11 +289,13 @@ class InvestmentViewSet(viewsets.ModelViewSet):
             )
 
         wallet = get_object_or_404(USDTWallet, user=self.request.user)
-        
-        if wallet.balance < amount:
-            raise serializers.ValidationError("Solde USDT insuffisant")
 
         with transaction.atomic():
+            # Solde relu sous verrou dans la transaction du débit : deux
+            # investissements simultanés ne peuvent pas rendre le solde négatif
+            if locked_balance(wallet) < amount:
+                raise serializers.ValidationError("Solde USDT insuffisant")
+
             # Créer la transaction USDT
             usdt_transaction = USDTTransaction.objects.create(
                 wallet=wallet,
@@ -201,20 +305,22 @@ class InvestmentViewSet(viewsets.ModelViewSet):
                 description=f"Investissement dans le plan {plan.name}"
             )
 
-            # Mettre à jour le solde du portefeuille
-            wallet.balance -= amount
-            wallet.save()
+            # Débiter le portefeuille
+            wallet.record_entry(-amount, usdt_transaction)
 
             # Sauvegarder l'investissement
+            now = timezone.now()
             serializer.save(
                 user=self.request.user,
                 status='ACTIVE',
                 usdt_transaction=usdt_transaction,
                 current_value=amount,
-                start_date=timezone.now()
+                start_date=now,
+                last_earnings_update=now
             )
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def upgrade(self, request, pk=None):
         """
         Mettre à niveau un investissement vers un plan supérieur
@@ -236,8 +342,14 @@ class InvestmentViewSet(viewsets.ModelViewSet):
         with transaction.atomic():
             # Si un montant supplémentaire est fourni
             if additional_amount > 0:
+                # Le solde vérifié par le serializer est relu sous verrou
+                if locked_balance(wallet) < additional_amount:
+                    raise serializers.ValidationError(
+                        "Solde USDT insuffisant pour le montant supplémentaire"
+                    )
+
                 # Créer la transaction pour le montant supplémentaire
-                USDTTransaction.objects.create(
+                upgrade_transaction = USDTTransaction.objects.create(
                     wallet=wallet,
                     transaction_type='INVESTMENT_UPGRADE',
                     amount=additional_amount,
@@ -245,18 +357,21 @@ class InvestmentViewSet(viewsets.ModelViewSet):
                     description=f"Montant supplémentaire pour upgrade vers {new_plan.name}"
                 )
                 
-                # Mettre à jour le solde du portefeuille
-                wallet.balance -= additional_amount
-                wallet.save()
+                # Débiter le portefeuille
+                wallet.record_entry(-additional_amount, upgrade_transaction)
             
-            # Calculer les gains actuels
-            current_earnings = current_investment.calculate_earnings()
+            # Calculer les gains actuels : accrued_earnings date du dernier
+            # passage de accrue_earnings et les jours écoulés depuis seraient perdus
+            now = timezone.now()
+            current_earnings = current_investment.compute_current_earnings(now)
             
             # Mettre à jour l'investissement
             current_investment.plan = new_plan
             current_investment.amount_invested += additional_amount
             current_investment.current_value = current_investment.amount_invested + current_earnings
-            current_investment.start_date = timezone.now()  # Réinitialiser la date de début
+            current_investment.start_date = now  # Réinitialiser la date de début
+            current_investment.accrued_earnings = Decimal('0')
+            current_investment.last_earnings_update = current_investment.start_date
             current_investment.save()
             
             return Response({
@@ -265,6 +380,26 @@ class InvestmentViewSet(viewsets.ModelViewSet):
                 'investment': InvestmentSerializer(current_investment).data
             })
 
+    @action(detail=True, methods=['get'])
+    def projection(self, request, pk=None):
+        """
+        Projection quotidienne de la valeur de l'investissement, avec mise à niveau éventuelle
+        """
+        investment = self.get_object()
+        serializer = ProjectionSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        elapsed_days = 0
+        if investment.status == 'ACTIVE' and investment.start_date:
+            elapsed_days = max((timezone.now() - investment.start_date).days, 0)
+
+        return Response(build_projection(
+            investment.amount_invested,
+            investment.plan,
+            serializer.validated_data,
+            elapsed_days=elapsed_days
+        ))
+
     @action(detail=True, methods=['get'])
     def calculate_earnings(self, request, pk=None):
         investment = self.get_object()
@@ -288,6 +423,7 @@ class InvestmentViewSet(viewsets.ModelViewSet):
         return Response({'status': 'Investment cancelled'})
 
     @action(detail=False, methods=['post'], url_path='withdraw')
+    @idempotent
     def withdraw(self, request):
         """
         Retrait des bénéfices d'un investissement actif
@@ -296,66 +432,21 @@ class InvestmentViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Récupérer l'investissement actif de l'utilisateur
-        try:
-            investment = Investment.objects.get(
-                user=request.user,
-                status='ACTIVE'
-            )
-        except Investment.DoesNotExist:
-            return Response(
-                {'error': 'Aucun investissement actif trouvé'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
         amount = serializer.validated_data['amount']
         wallet_address = serializer.validated_data['wallet_address']
 
-        # Vérifier si le retrait est possible
-        can_withdraw, message = investment.can_withdraw(amount)
-        if not can_withdraw:
-            return Response(
-                {'error': message},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        blockchain_client = BlockchainClient()
-
-        # Transaction atomique pour le retrait
-        with transaction.atomic():
-            try:
-                # Effectuer le transfert USDT
-                tx_hash = blockchain_client.send_usdt(
-                    wallet_address,
-                    amount
-                )
-
-                # Créer la transaction USDT
-                withdrawal = USDTTransaction.objects.create(
-                    wallet=investment.user.usdtwallet,
-                    transaction_type='WITHDRAWAL',
-                    amount=amount,
-                    tx_hash=tx_hash,
-                    status='COMPLETED'
-                )
-
-                # Mettre à jour le montant total retiré
-                investment.total_withdrawn += amount
-                investment.save()
-
-                return Response({
-                    'message': f'Retrait de {amount} USDT effectué avec succès',
-                    'transaction_hash': tx_hash,
-                    'status': 'COMPLETED'
-                })
+        try:
+            withdrawal = reserve_withdrawal(request.user, amount, wallet_address)
+        except WithdrawalRejected as e:
+            return Response({'error': e.message}, status=e.status_code)
 
-            except Exception as e:
-                return Response(
-                    {'error': f'Erreur lors du retrait: {str(e)}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+        return Response({
+            'message': f'Retrait de {amount} USDT en cours de traitement',
+            'transaction_id': withdrawal.id,
+            'status': withdrawal.status
+        }, status=status.HTTP_202_ACCEPTED)
 
-class UserProfileViewSet(viewsets.GenericViewSet):
+class UserProfileViewSet(ReplicaReadMixin, viewsets.GenericViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ReferralProfileSerializer
 
@@ -369,14 +460,84 @@ class UserProfileViewSet(viewsets.GenericViewSet):
         """
         try:
             profile = request.user.profile
-            serializer = self.get_serializer(profile)
-            return Response(serializer.data)
         except UserProfile.DoesNotExist:
             return Response(
                 {'error': 'Profil utilisateur non trouvé'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        def build():
+            paginator = ReferralPagination()
+            referred_users = paginator.paginate_queryset(
+                ReferralUserSerializer.get_queryset(profile),
+                request,
+                view=self
+            )
+
+            data = self.get_serializer(profile).data
+            data.update(paginator.get_page_metadata())
+            data['referrals'] = ReferralUserSerializer(referred_users, many=True).data
+            return data
+
+        return Response(usercache.get_or_set(
+            request.user.pk,
+            'referrals',
+            build,
+            variant=request.query_params.urlencode()
+        ))
+
+    @action(detail=False, methods=['get'])
+    def downline(self, request):
+        """
+        Taille et volume de dépôts du réseau de l'utilisateur, niveau par niveau
+        """
+        try:
+            profile = request.user.profile
+        except UserProfile.DoesNotExist:
+            return Response(
+                {'error': 'Profil utilisateur non trouvé'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            max_depth = int(request.query_params.get('depth', DOWNLINE_MAX_DEPTH))
+        except ValueError:
+            return Response(
+                {'error': 'La profondeur doit être un entier'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_depth = max(1, min(max_depth, DOWNLINE_MAX_DEPTH))
+
+        deposits = Q(
+            descendant__user__usdt_wallet__transactions__transaction_type='DEPOSIT',
+            descendant__user__usdt_wallet__transactions__status='COMPLETED'
+        )
+        levels = list(
+            ReferralTreePath.objects
+            .filter(ancestor=profile, depth__lte=max_depth)
+            .values('depth')
+            .annotate(
+                members=Count('descendant', distinct=True),
+                volume=Coalesce(
+                    Sum('descendant__user__usdt_wallet__transactions__amount', filter=deposits),
+                    Decimal('0'),
+                    output_field=DecimalField()
+                )
+            )
+            .order_by('depth')
+        )
+
+        return Response({
+            'depth': max_depth,
+            'total_members': sum(level['members'] for level in levels),
+            'total_volume': str(sum((level['volume'] for level in levels), Decimal('0'))),
+            'levels': [{
+                'depth': level['depth'],
+                'members': level['members'],
+                'volume': str(level['volume'])
+            } for level in levels]
+        })
+
     @action(detail=False, methods=['get'])
     def referral_code(self, request):
         """
@@ -423,6 +584,24 @@ def login_view(request):
             'error': 'Email ou mot de passe incorrect'
         }, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_view(request):
+    """
+    Révoque le jeton d'accès courant et, s'il est fourni, le jeton de rafraîchissement
+    """
+    refresh = request.data.get('refresh')
+    if refresh:
+        try:
+            RefreshToken(refresh).blacklist()
+        except TokenError:
+            return Response({
+                'error': 'Jeton de rafraîchissement invalide'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    revoke_token(request.auth)
+    return Response({'message': 'Déconnexion réussie'})
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_view(request):
@@ -447,11 +626,17 @@ def register_view(request):
                         referrer_profile = UserProfile.objects.get(referral_code=referral_code)
                         profile.referred_by = referrer_profile
                         profile.save()
+
+                        # Indexer le filleul dans l'arbre de parrainage
+                        ReferralTreePath.objects.attach(profile, referrer_profile)
                     except UserProfile.DoesNotExist:
                         pass
 
                 # Générer le token JWT
                 refresh = RefreshToken.for_user(user)
+
+                # Les premières lectures du nouvel utilisateur se font sur la base principale
+                pin_to_primary(user.pk)
                 
                 return Response({
                     'status': 'success',
@@ -492,9 +677,13 @@ def register_view(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_from_replica
 def user_detail_view(request):
     """
     Retourne toutes les informations détaillées de l'utilisateur connecté
     """
-    serializer = UserDetailSerializer(request.user)
-    return Response(serializer.data)
+    def build():
+        user = UserDetailSerializer.get_queryset().get(pk=request.user.pk)
+        return UserDetailSerializer(user).data
+
+    return Response(usercache.get_or_set(request.user.pk, 'me', build))
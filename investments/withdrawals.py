@@ -0,0 +1,329 @@
+"""
+Traitement asynchrone des retraits.
+
+La vue ``withdraw`` se contente d'enregistrer une transaction PENDING et de
+réserver le montant sur l'investissement. Le worker ``process_withdrawals``
+diffuse ensuite les transferts puis suit leur confirmation :
+
+    PENDING -> PROCESSING (signée, tx_hash connu) -> COMPLETED | FAILED
+
+Un transfert resté trop longtemps sans être miné est re-signé au même nonce
+avec un prix du gas plus élevé (reprice_stuck_withdrawals).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Investment, USDTTransaction
+from .usercache import invalidate_users
+
+logger = logging.getLogger(__name__)
+
+
+class WithdrawalRejected(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def reserve_withdrawal(user, amount, to_address):
+    """
+    Enregistre une demande de retrait PENDING et réserve le montant sur
+    l'investissement actif, dans une transaction atomique courte. La
+    diffusion sur la blockchain est effectuée par le worker process_withdrawals.
+
+    Raises:
+        WithdrawalRejected: Aucun investissement actif ou montant non disponible
+    """
+    with transaction.atomic():
+        try:
+            investment = Investment.objects.select_for_update().get(
+                user=user,
+                status='ACTIVE'
+            )
+        except Investment.DoesNotExist:
+            raise WithdrawalRejected('Aucun investissement actif trouvé', 404)
+
+        # Vérifier si le retrait est possible
+        can_withdraw, message = investment.can_withdraw(amount)
+        if not can_withdraw:
+            raise WithdrawalRejected(message, 400)
+
+        withdrawal = USDTTransaction.objects.create(
+            wallet=user.usdt_wallet,
+            transaction_type='WITHDRAWAL',
+            amount=amount,
+            to_address=to_address,
+            investment=investment,
+            status='PENDING'
+        )
+
+        # Réserver le montant sur les bénéfices disponibles
+        investment.total_withdrawn += amount
+        investment.save(update_fields=['total_withdrawn', 'updated_at'])
+
+    return withdrawal
+
+
+def release_withdrawal(withdrawal, reason):
+    """Marque un retrait comme échoué et restitue le montant réservé"""
+    with transaction.atomic():
+        updated = USDTTransaction.objects.filter(
+            pk=withdrawal.pk
+        ).exclude(status='FAILED').update(
+            status='FAILED',
+            description=reason,
+            updated_at=timezone.now()
+        )
+        if updated and withdrawal.investment_id:
+            Investment.objects.filter(pk=withdrawal.investment_id).update(
+                total_withdrawn=F('total_withdrawn') - withdrawal.amount
+            )
+            invalidate_users([withdrawal.wallet.user_id])
+    withdrawal.status = 'FAILED'
+    withdrawal.description = reason
+
+
+def _send(client, withdrawal):
+    try:
+        client.send_raw_transaction(withdrawal.signed_transaction)
+    except Exception as e:
+        return e
+    return None
+
+
+def _claim(client, nonce_manager, withdrawal, gas_price):
+    """
+    Réclame, numérote et signe un retrait dans une seule transaction : un
+    retrait PROCESSING porte toujours son nonce et son hash, et un nonce
+    attribué n'apparaît jamais comme un trou à sync_with_chain.
+
+    Returns:
+        bool: False si un autre worker a réclamé le retrait
+    """
+    with transaction.atomic():
+        claimed_count = USDTTransaction.objects.filter(
+            pk=withdrawal.pk,
+            status='PENDING'
+        ).update(status='PROCESSING', updated_at=timezone.now())
+        if not claimed_count:
+            return False
+
+        withdrawal.nonce = nonce_manager.allocate()
+        withdrawal.gas_price = gas_price
+        withdrawal.tx_hash, withdrawal.signed_transaction = client.sign_usdt_transfer(
+            withdrawal.to_address,
+            withdrawal.amount,
+            withdrawal.nonce,
+            gas_price=gas_price
+        )
+        USDTTransaction.objects.filter(pk=withdrawal.pk).update(
+            nonce=withdrawal.nonce,
+            tx_hash=withdrawal.tx_hash,
+            signed_transaction=withdrawal.signed_transaction,
+            gas_price=gas_price,
+            updated_at=timezone.now()
+        )
+    return True
+
+
+def broadcast_pending_withdrawals(client, nonce_manager, limit=50, max_workers=1):
+    """
+    Diffuse les retraits en attente.
+
+    Chaque retrait est réclamé par une mise à jour conditionnelle
+    PENDING -> PROCESSING, de sorte que plusieurs workers ne diffusent
+    jamais deux fois la même transaction. Les nonces sont attribués
+    localement, ce qui permet de diffuser les transferts en parallèle.
+
+    Le transfert est signé et son hash enregistré avant l'envoi : un échec
+    de diffusion (délai dépassé, connexion coupée) ne prouve pas que le
+    noeud n'a pas reçu la transaction, le retrait reste donc PROCESSING
+    et confirm_broadcast_withdrawals le règle d'après la blockchain.
+
+    Returns:
+        int: Nombre de retraits diffusés
+    """
+    pending = list(USDTTransaction.objects.filter(
+        transaction_type='WITHDRAWAL',
+        status='PENDING'
+    ).order_by('created_at', 'pk')[:limit])
+    if not pending:
+        return 0
+
+    gas_price = client.w3.eth.gas_price
+
+    claimed = []
+    for withdrawal in pending:
+        try:
+            if not _claim(client, nonce_manager, withdrawal, gas_price):
+                continue
+        except Exception as e:
+            # La réclamation et le nonce ont été annulés : rien n'a été envoyé
+            logger.warning("Échec de signature du retrait %s: %s", withdrawal.pk, e)
+            release_withdrawal(withdrawal, str(e))
+            continue
+        claimed.append(withdrawal)
+
+    if not claimed:
+        return 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        errors = list(executor.map(lambda withdrawal: _send(client, withdrawal), claimed))
+
+    broadcast_count = 0
+    for withdrawal, error in zip(claimed, errors):
+        if error is not None:
+            logger.warning("Échec de diffusion du retrait %s: %s", withdrawal.pk, error)
+            continue
+        broadcast_count += 1
+
+    return broadcast_count
+
+
+def _find_receipt(client, withdrawal):
+    """
+    Transfert miné parmi la signature courante du retrait et celles qu'elle
+    a remplacées.
+
+    Returns:
+        tuple: (hash, True si réussi / False si échoué), ou (None, None)
+    """
+    for tx_hash in [withdrawal.tx_hash, *withdrawal.replaced_tx_hashes]:
+        succeeded = client.get_transaction_status(tx_hash)
+        if succeeded is not None:
+            return tx_hash, succeeded
+    return None, None
+
+
+def reprice_stuck_withdrawals(client, timeout, bump_percent=None, limit=50):
+    """
+    Remplace les retraits diffusés restés sans reçu plus de ``timeout``
+    secondes (prix du gas trop bas, par exemple) : tant qu'il n'est pas
+    miné, un tel transfert bloque tous les nonces suivants. Le transfert
+    est re-signé au même nonce avec un prix du gas augmenté d'au moins
+    ``bump_percent`` %, enregistré, puis rediffusé.
+
+    L'ancien hash est conservé dans ``replaced_tx_hashes`` : la transaction
+    remplacée peut encore être minée à la place de la nouvelle, et
+    confirm_broadcast_withdrawals la retrouve alors.
+
+    Returns:
+        int: Nombre de retraits re-signés
+    """
+    if bump_percent is None:
+        bump_percent = settings.WITHDRAWAL_GAS_BUMP_PERCENT
+
+    stale = list(USDTTransaction.objects.filter(
+        transaction_type='WITHDRAWAL',
+        status='PROCESSING',
+        nonce__isnull=False,
+        signed_transaction__isnull=False,
+        updated_at__lt=timezone.now() - timedelta(seconds=timeout)
+    ).order_by('nonce')[:limit])
+    if not stale:
+        return 0
+
+    confirmed_nonce = client.get_confirmed_nonce()
+    node_gas_price = client.w3.eth.gas_price
+
+    repriced_count = 0
+    for withdrawal in stale:
+        # Nonce consommé ou transfert miné : confirm_broadcast_withdrawals règle le retrait
+        if withdrawal.nonce < confirmed_nonce or _find_receipt(client, withdrawal)[0] is not None:
+            continue
+
+        # Les noeuds refusent un remplacement qui n'augmente pas assez le prix
+        reference = withdrawal.gas_price if withdrawal.gas_price is not None else node_gas_price
+        gas_price = max(node_gas_price, (reference * (100 + bump_percent) + 99) // 100)
+        try:
+            tx_hash, signed_transaction = client.sign_usdt_transfer(
+                withdrawal.to_address,
+                withdrawal.amount,
+                withdrawal.nonce,
+                gas_price=gas_price
+            )
+        except Exception as e:
+            logger.warning("Échec de signature du remplacement du retrait %s: %s", withdrawal.pk, e)
+            continue
+
+        replaced_tx_hashes = [*withdrawal.replaced_tx_hashes, withdrawal.tx_hash]
+        updated = USDTTransaction.objects.filter(
+            pk=withdrawal.pk,
+            status='PROCESSING',
+            tx_hash=withdrawal.tx_hash
+        ).update(
+            tx_hash=tx_hash,
+            signed_transaction=signed_transaction,
+            gas_price=gas_price,
+            replaced_tx_hashes=replaced_tx_hashes,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            continue
+        withdrawal.tx_hash = tx_hash
+        withdrawal.signed_transaction = signed_transaction
+        withdrawal.gas_price = gas_price
+        withdrawal.replaced_tx_hashes = replaced_tx_hashes
+        repriced_count += 1
+
+        error = _send(client, withdrawal)
+        if error is not None:
+            logger.warning("Échec de diffusion du remplacement du retrait %s: %s", withdrawal.pk, error)
+
+    return repriced_count
+
+
+def confirm_broadcast_withdrawals(client, limit=200):
+    """
+    Vérifie les reçus des retraits diffusés et met à jour leur statut.
+
+    Sans reçu, un retrait n'est restitué que lorsque son nonce a été
+    consommé par une autre transaction : jusque-là il peut encore être
+    miné, y compris sous une signature remplacée. Une transaction inconnue
+    du noeud (diffusion perdue) est rediffusée.
+
+    Returns:
+        int: Nombre de retraits finalisés (confirmés ou échoués)
+    """
+    in_flight = list(USDTTransaction.objects.filter(
+        transaction_type='WITHDRAWAL',
+        status='PROCESSING',
+        tx_hash__isnull=False
+    ).order_by('created_at', 'pk')[:limit])
+    if not in_flight:
+        return 0
+
+    # Lu avant les reçus : un nonce inférieur a été consommé dans un bloc
+    # déjà miné, dont le reçu serait visible s'il portait notre transaction
+    confirmed_nonce = client.get_confirmed_nonce()
+
+    finalized_count = 0
+    for withdrawal in in_flight:
+        tx_hash, succeeded = _find_receipt(client, withdrawal)
+        if succeeded is None:
+            if withdrawal.nonce is not None and withdrawal.nonce < confirmed_nonce:
+                release_withdrawal(withdrawal, 'Nonce consommé par une autre transaction')
+                finalized_count += 1
+            elif withdrawal.signed_transaction and not client.is_transaction_known(withdrawal.tx_hash):
+                error = _send(client, withdrawal)
+                if error is not None:
+                    logger.warning("Échec de rediffusion du retrait %s: %s", withdrawal.pk, error)
+            continue
+
+        if succeeded:
+            USDTTransaction.objects.filter(
+                pk=withdrawal.pk,
+                status='PROCESSING'
+            ).update(status='COMPLETED', tx_hash=tx_hash, updated_at=timezone.now())
+        else:
+            release_withdrawal(withdrawal, 'La transaction a échoué')
+        finalized_count += 1
+
+    return finalized_count